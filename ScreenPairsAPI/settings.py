@@ -16,6 +16,36 @@ SECRET_KEY = config("SECRET_KEY")
 TMDB_API_KEY = config("TMDB_API_KEY", default="")
 TMDB_BEARER_TOKEN = config("TMDB_BEARER_TOKEN", default="")
 
+# Client HTTP partagé pour TMDB (services/utils.py)
+TMDB_API_BASE_URL = config('TMDB_API_BASE_URL', default='https://api.themoviedb.org/3')
+TMDB_HTTP = {
+    'POOL_CONNECTIONS': 4,
+    'POOL_SIZE': config('TMDB_HTTP_POOL_SIZE', default=20, cast=int),
+    'CONNECT_TIMEOUT': config('TMDB_HTTP_CONNECT_TIMEOUT', default=3.05, cast=float),
+    'READ_TIMEOUT': config('TMDB_HTTP_READ_TIMEOUT', default=5, cast=float),
+    'RETRIES': config('TMDB_HTTP_RETRIES', default=2, cast=int),
+    'BACKOFF_FACTOR': 0.3,
+    'BACKOFF_JITTER': 0.3,
+    'BACKOFF_MAX': 10,
+}
+
+# Résilience face aux pannes TMDB (services/resilience.py)
+# Disjoncteur par point d'accès : ouvert après N échecs consécutifs, un essai après le délai (secondes).
+TMDB_CIRCUIT_FAILURE_THRESHOLD = config('TMDB_CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)
+TMDB_CIRCUIT_RESET_TIMEOUT = config('TMDB_CIRCUIT_RESET_TIMEOUT', default=30, cast=float)
+# Requêtes doublées : un GET plus lent que le p95 récent est relancé une fois, pour au plus 10 % des requêtes.
+TMDB_HEDGE_ENABLED = config('TMDB_HEDGE_ENABLED', default=True, cast=bool)
+TMDB_HEDGE_PERCENTILE = 0.95
+TMDB_HEDGE_MIN_SAMPLES = 20
+TMDB_HEDGE_MIN_DELAY = 0.05
+TMDB_HEDGE_MAX_RATIO = config('TMDB_HEDGE_MAX_RATIO', default=0.1, cast=float)
+TMDB_HEDGE_MAX_WORKERS = 32
+# Dernières valeurs connues des acteurs servies quand TMDB échoue après expiration du cache (pour les films, c'est
+# la fiche du stockage des films du cache des paires, cache_manager.get_movie).
+TMDB_STALE_TTL = 60 * 60 * 24 * 30
+# Une paire calculée avec des films manquants n'est fraîche que 60 s : on retente vite le calcul complet.
+PAIR_CACHE_DEGRADED_TTL = 60
+
 
 ALLOWED_HOSTS = []
 
@@ -35,6 +65,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.instrumentation_middleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -45,12 +76,123 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Cache à deux niveaux (services/tiered_cache.py) : LRU en mémoire du worker devant un cache partagé.
+# Le cache partagé est Redis si REDIS_URL est défini, sinon la table de cache en base (manage.py createcachetable).
+REDIS_URL = config('REDIS_URL', default='')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': '/tmp/django_cache',
-    }
+        'BACKEND': 'services.tiered_cache.TieredCache',
+        'OPTIONS': {
+            'SHARED_CACHE': 'shared',
+            'L1_MAX_ENTRIES': config('CACHE_L1_MAX_ENTRIES', default=5000, cast=int),
+            'L1_MAX_BYTES': config('CACHE_L1_MAX_BYTES', default=64 * 1024 * 1024, cast=int),
+            'L1_TTL': config('CACHE_L1_TTL', default=60, cast=int),
+            'INVALIDATION_POLL_INTERVAL': 1.0,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    },
+}
+
+# Cache des paires d'acteurs (services/cache_manager.py)
+PAIR_CACHE_BACKEND = 'services.pair_cache.SQLitePairCache'
+PAIR_CACHE_OPTIONS = {
+    'path': config('PAIR_CACHE_PATH', default=str(BASE_DIR / 'pair_cache.sqlite3')),
+    # Valeurs en msgpack, compressées avec zstd au-delà de 256 octets si zstandard est installé (pair_cache.PairCodec).
+    'codec': 'msgpack',
+    'compress_min_bytes': 256,
 }
+# Les entrées ne gardent que les IDs des films et les personnages ; chaque fiche film est stockée une seule fois.
+PAIR_CACHE_DEDUPLICATE_MOVIES = True
+PAIR_CACHE_SWEEP_INTERVAL = config('PAIR_CACHE_SWEEP_INTERVAL', default=300, cast=int)
+# Une paire expirée reste servie pendant PAIR_CACHE_STALE_TTL secondes, le temps d'un rafraîchissement en arrière-plan.
+PAIR_CACHE_STALE_WHILE_REVALIDATE = True
+PAIR_CACHE_STALE_TTL = 60 * 60 * 24
+# Recalcul incrémental d'une paire expirée : seules les filmographies sont revérifiées, et seules les fiches
+# des films nouvellement communs (ou plus vieilles que PAIR_MOVIE_DETAILS_MAX_AGE) sont redemandées à TMDB.
+PAIR_CACHE_INCREMENTAL_REFRESH = True
+PAIR_MOVIE_DETAILS_MAX_AGE = 60 * 60 * 24 * 7
+
+# Fiches ActorPair de /api/pairs/ (services/actor_pairs.py) : JSON gardé en mémoire du processus.
+ACTOR_PAIR_CACHE_TTL = 60
+ACTOR_PAIR_CACHE_MAX_ENTRIES = 10_000
+ACTOR_PAIR_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Préchauffage des paires populaires (services/warming.py) : toutes les PAIR_WARMING_INTERVAL secondes, les
+# PAIR_WARMING_TOP_N paires les plus demandées qui expirent dans moins de PAIR_WARMING_LEAD_TIME secondes sont
+# recalculées (au plus PAIR_WARMING_MAX_PER_CYCLE par passage), sur la voie batch du limiteur TMDB.
+PAIR_WARMING_ENABLED = config('PAIR_WARMING_ENABLED', default=True, cast=bool)
+PAIR_WARMING_INTERVAL = config('PAIR_WARMING_INTERVAL', default=300, cast=int)
+PAIR_WARMING_TOP_N = config('PAIR_WARMING_TOP_N', default=50, cast=int)
+PAIR_WARMING_MAX_PER_CYCLE = 10
+PAIR_WARMING_LEAD_TIME = 60 * 60
+# Demi-vie de la popularité d'une paire ; une paire d'ActorPair compte pour PAIR_WARMING_SEED_SCORE requête(s).
+PAIR_WARMING_HALF_LIFE = 60 * 60 * 6
+PAIR_WARMING_SEED_SCORE = 1.0
+PAIR_WARMING_TRACKED_MAX = 10_000
+
+# Regroupement des calculs identiques en cours (services/singleflight.py)
+TMDB_REQUEST_COALESCING = True
+SINGLEFLIGHT_SHARED_LOCK = config('SINGLEFLIGHT_SHARED_LOCK', default=False, cast=bool)
+SINGLEFLIGHT_LOCK_TIMEOUT = 30
+
+# Limite d'appels TMDB (services/rate_limit.py) : seau à jetons partagé par tous les processus
+# de la machine via TMDB_RATE_LIMIT_SHARED_PATH (vide = seau propre à chaque processus) ; None = pas de limite.
+TMDB_RATE_LIMIT = config('TMDB_RATE_LIMIT', default=40, cast=lambda v: float(v) if v else None)
+TMDB_RATE_BURST = config('TMDB_RATE_BURST', default=40, cast=float)
+TMDB_RATE_LIMIT_SHARED_PATH = config('TMDB_RATE_LIMIT_SHARED_PATH', default=str(BASE_DIR / 'tmdb_rate_limit.sqlite3'))
+# Part du burst réservée aux requêtes interactives ; la voie batch ne la consomme jamais.
+TMDB_RATE_BATCH_RESERVE = 0.25
+# Attente maximale d'un jeton par voie, en secondes (None = sans limite).
+TMDB_RATE_MAX_WAIT = {'interactive': 5, 'batch': None}
+
+# Cache de résolution des acteurs (services/tmdb.get_actor_info)
+ACTOR_INFO_CACHE_TTL = 60 * 60 * 24 * 7
+ACTOR_NOT_FOUND_CACHE_TTL = 60 * 60
+ACTOR_IMDB_CACHE_TTL = 60 * 60 * 24 * 90
+# Filmographies (services/tmdb.get_movies_by_actor) : gardées 30 jours, revalidées par ETag après 1 jour.
+ACTOR_CREDITS_CACHE_TTL = 60 * 60 * 24 * 30
+ACTOR_CREDITS_REVALIDATE_AFTER = 60 * 60 * 24
+
+# Autocomplétion : index local d'abord, TMDB si moins de AUTOCOMPLETE_MIN_LOCAL_RESULTS résultats
+AUTOCOMPLETE_MIN_LOCAL_RESULTS = 5
+AUTOCOMPLETE_CACHE_TTL = 60 * 60 * 24
+
+# Index local acteur <-> film (services/credits_index.py)
+CREDITS_INDEX_ENABLED = config('CREDITS_INDEX_ENABLED', default=True, cast=bool)
+CREDITS_INDEX_TTL = 60 * 60 * 24 * 7
+
+# Données TMDB locales (services/offline_index.py), importées par manage.py import_tmdb_dump :
+# 'remote' = TMDB seul, 'local_first' = index local puis TMDB, 'offline' = index local seul, aucun appel TMDB.
+TMDB_DATA_MODE = config('TMDB_DATA_MODE', default='remote')
+OFFLINE_INDEX_PATH = config('OFFLINE_INDEX_PATH', default=str(BASE_DIR / 'data' / 'tmdb_index.bin'))
+# Nombre maximal d'entrées de la table des noms parcourues par recherche (préfixes très courts).
+OFFLINE_INDEX_SEARCH_SCAN = 2000
+
+# Récupération concurrente des détails de films (services/concurrency.py)
+TMDB_MAX_IN_FLIGHT = config('TMDB_MAX_IN_FLIGHT', default=8, cast=int)
+COMMON_MOVIES_DEADLINE = config('COMMON_MOVIES_DEADLINE', default=15, cast=float)
+# Endpoint groupé POST /api/common-movies/batch/ (services/batch.py)
+COMMON_MOVIES_BATCH_MAX_PAIRS = config('COMMON_MOVIES_BATCH_MAX_PAIRS', default=50, cast=int)
+COMMON_MOVIES_BATCH_DEADLINE = config('COMMON_MOVIES_BATCH_DEADLINE', default=30, cast=float)
+# Films communs à plusieurs acteurs, GET /api/common-movies/group/?actor=...&actor=...
+COMMON_MOVIES_GROUP_MAX_ACTORS = config('COMMON_MOVIES_GROUP_MAX_ACTORS', default=8, cast=int)
+# Degrés de séparation, GET /api/separation/ (services/separation.py) : recherche bornée en films entre les deux
+# acteurs et en appels TMDB ; seuls les SEPARATION_CAST_LIMIT premiers rôles de chaque film relient les acteurs.
+SEPARATION_MAX_HOPS = config('SEPARATION_MAX_HOPS', default=6, cast=int)
+SEPARATION_MAX_UPSTREAM_CALLS = config('SEPARATION_MAX_UPSTREAM_CALLS', default=500, cast=int)
+SEPARATION_CAST_LIMIT = 30
+SEPARATION_SKIP_DOCUMENTARIES = True
+SEPARATION_CACHE_TTL = 60 * 60 * 24
+MOVIE_CAST_CACHE_TTL = 60 * 60 * 24 * 30
+# Réponses common-movies pré-sérialisées (services/responses.py) : orjson et brotli sont utilisés s'ils sont installés.
+COMMON_MOVIES_RESPONSE_CACHE_TTL = 60 * 60 * 24
+COMMON_MOVIES_COMPRESS_MIN_BYTES = config('COMMON_MOVIES_COMPRESS_MIN_BYTES', default=1024, cast=int)
 
 
 CORS_ALLOWED_ORIGINS = [
@@ -76,6 +218,16 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'ScreenPairsAPI.wsgi.application'
+ASGI_APPLICATION = 'ScreenPairsAPI.asgi.application'
+
+# Mesure par étape (services/instrumentation.py) : en-tête Server-Timing et histogrammes sur /metrics.
+SERVER_TIMING_ENABLED = config('SERVER_TIMING_ENABLED', default=True, cast=bool)
+# Profilage cProfile d'une fraction des requêtes synchrones (0 = désactivé), un fichier .prof par requête.
+REQUEST_PROFILING_SAMPLE_RATE = config('REQUEST_PROFILING_SAMPLE_RATE', default=0.0, cast=float)
+REQUEST_PROFILING_DIR = config('REQUEST_PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+
+# Sous uvicorn (ASGI), servir common-movies et actor-autocomplete par les vues async.
+API_ASYNC_VIEWS = config('API_ASYNC_VIEWS', default=False, cast=bool)
 
 
 # Database
@@ -93,6 +245,18 @@ DATABASES = {
         'PORT': config('POSTGRES_PORT', default='5432'),
     }
 }
+# Connexions réutilisées : pool psycopg 3 (Django 5.1+) partagé par les threads du worker si DB_POOL_MAX_SIZE > 0,
+# sinon une connexion persistante par thread, gardée DB_CONN_MAX_AGE secondes.
+DB_POOL_MAX_SIZE = config('DB_POOL_MAX_SIZE', default=20, cast=int)
+if DB_POOL_MAX_SIZE:
+    DATABASES['default']['OPTIONS'] = {'pool': {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': DB_POOL_MAX_SIZE,
+        'timeout': 10,
+    }}
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
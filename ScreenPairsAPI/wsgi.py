@@ -11,6 +11,10 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ScreenParisAPI.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ScreenPairsAPI.settings')
 
 application = get_wsgi_application()
+
+from services import warming  # noqa: E402 (après le chargement des applications)
+
+warming.start()
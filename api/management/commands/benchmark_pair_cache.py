@@ -0,0 +1,176 @@
+import hashlib
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from benchmarks.fake_tmdb import GENRES
+from benchmarks.scenarios import percentile
+from services import cache_manager, tmdb
+
+WORDS = (
+    'night', 'last', 'city', 'river', 'king', 'blood', 'dream', 'storm', 'love', 'war', 'shadow', 'house',
+    'road', 'summer', 'secret', 'lost', 'golden', 'winter', 'heart', 'fire', 'stranger', 'return', 'dark', 'wild',
+)
+FIRST_NAMES = ('Jimmy', 'Tommy', 'Henry', 'Karen', 'Paulie', 'Frankie', 'Ginger', 'Ace', 'Nicky', 'Vincent', 'Rose', 'Travis')
+LAST_NAMES = ('Conway', 'DeVito', 'Hill', 'Rothstein', 'Santoro', 'Cicero', 'McKenna', 'Bickle', 'Hanna', 'Lamotta')
+
+# (libellé, PAIR_CACHE_DEDUPLICATE_MOVIES, options du codec de SQLitePairCache) ; la première sert de référence.
+LAYOUTS = (
+    ('JSON, fiches copiées', False, {'codec': 'json', 'compress_min_bytes': None}),
+    ('msgpack, partagées', True, {'codec': 'msgpack', 'compress_min_bytes': None}),
+    ('msgpack+zstd, partagées', True, {'codec': 'msgpack', 'compress_min_bytes': 256}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai du stockage des paires : cache SQLite généré (fiches films copiées dans chaque entrée en JSON, "
+        "ou partagées entre les paires en msgpack, avec ou sans zstd), octets par entrée et latence de lecture "
+        "à froid (premier passage) et à chaud (même échantillon relu)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pairs', type=int, default=100_000)
+        parser.add_argument('--movies', type=int, default=20_000)
+        parser.add_argument('--mean-common', type=float, default=6, help="Nombre moyen de films communs par paire")
+        parser.add_argument('--max-common', type=int, default=60)
+        parser.add_argument('--reads', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        results = []
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for index, (label, deduplicate, codec_options) in enumerate(LAYOUTS):
+                path = os.path.join(tmp_dir, f'pairs-{index}.sqlite3')
+                results.append((label, self._run(path, deduplicate, codec_options, options)))
+
+        self.stdout.write(
+            f"{'stockage':<26}{'octets/paire':>14}{'fichier/paire':>15}{'écriture (s)':>14}"
+            f"{'froid p50/p95 (µs)':>20}{'chaud p50/p95 (µs)':>20}"
+        )
+        for label, stats in results:
+            cold = f"{stats['cold'][0] * 1e6:.0f}/{stats['cold'][1] * 1e6:.0f}"
+            warm = f"{stats['warm'][0] * 1e6:.0f}/{stats['warm'][1] * 1e6:.0f}"
+            self.stdout.write(
+                f"{label:<26}{stats['value_bytes']:>14.0f}{stats['file_bytes']:>15.0f}{stats['write_seconds']:>14.1f}"
+                f"{cold:>20}{warm:>20}"
+            )
+        baseline = results[0][1]
+        for label, stats in results[1:]:
+            self.stdout.write(self.style.SUCCESS(
+                f"{label} : {100 * (1 - stats['value_bytes'] / baseline['value_bytes']):.1f}% d'octets par paire en moins ; "
+                f"lecture p50 {100 * (stats['cold'][0] / baseline['cold'][0] - 1):+.1f}% à froid, "
+                f"{100 * (stats['warm'][0] / baseline['warm'][0] - 1):+.1f}% à chaud"
+            ))
+
+    def _run(self, path, deduplicate, codec_options, options):
+        overrides = override_settings(
+            PAIR_CACHE_BACKEND='services.pair_cache.SQLitePairCache',
+            PAIR_CACHE_OPTIONS={'path': path, **codec_options},
+            PAIR_CACHE_SWEEP_INTERVAL=0,
+            PAIR_CACHE_DEDUPLICATE_MOVIES=deduplicate,
+        )
+        with overrides:
+            cache_manager.reset_backend()
+            try:
+                keys = []
+                batch = []
+                start = time.perf_counter()
+                for cache_key, payload in self._generate(options):
+                    keys.append(cache_key)
+                    batch.append((cache_key, payload, None))
+                    if len(batch) == 1000:
+                        cache_manager.set_entries(batch)
+                        batch = []
+                cache_manager.set_entries(batch)
+                write_seconds = time.perf_counter() - start
+
+                with sqlite3.connect(path) as conn:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    value_bytes = sum(
+                        conn.execute(f"SELECT COALESCE(SUM(LENGTH(data)), 0) FROM {table}").fetchone()[0]
+                        for table in ('pair_cache', 'pair_cache_movies')
+                    )
+                conn.close()
+
+                # Backend neuf : ni connexion ni fiches films en mémoire avant le passage à froid.
+                cache_manager.reset_backend()
+                sample = random.Random(options['seed']).choices(keys, k=options['reads'])
+                cold = self._read(sample)
+                warm = self._read(sample)
+            finally:
+                cache_manager.reset_backend()
+
+        return {
+            'value_bytes': value_bytes / len(keys),
+            'file_bytes': os.path.getsize(path) / len(keys),
+            'write_seconds': write_seconds,
+            'cold': cold,
+            'warm': warm,
+        }
+
+    def _read(self, cache_keys):
+        timings = []
+        for cache_key in cache_keys:
+            start = time.perf_counter()
+            entry = cache_manager.get_entry(*cache_key.split('_'))
+            timings.append(time.perf_counter() - start)
+            if entry is None:
+                raise RuntimeError(f"Entrée introuvable pour la clé {cache_key}")
+        return percentile(timings, 50), percentile(timings, 95)
+
+    def _generate(self, options):
+        """Paires ``(cache_key, payload)`` au format de ``tmdb._build_pair_payload``, identiques d'une passe à l'autre."""
+        rng = random.Random(options['seed'])
+        movies = {movie_id: self._movie(rng, movie_id) for movie_id in range(1, options['movies'] + 1)}
+        movie_ids = list(movies)
+        # Popularité à longue traîne : quelques films reviennent dans beaucoup de paires.
+        cum_weights = list(accumulate(1 / (rank + 10) for rank in range(len(movie_ids))))
+
+        seen = set()
+        actor_count = max(1000, int((2 * options['pairs']) ** 0.5) * 4)
+        while len(seen) < options['pairs']:
+            actor1_id, actor2_id = sorted(rng.sample(range(10_000, 10_000 + actor_count), 2))
+            if (actor1_id, actor2_id) in seen:
+                continue
+            seen.add((actor1_id, actor2_id))
+
+            common = min(options['max_common'], 1 + int(rng.expovariate(1 / options['mean_common'])))
+            common_ids = sorted(set(rng.choices(movie_ids, cum_weights=cum_weights, k=common)))
+            fetch_args = [(movie_id, self._character(rng), self._character(rng)) for movie_id in common_ids]
+            details_list = [dict(movies[movie_id]) for movie_id in common_ids]
+            actor_infos = [self._actor(actor_id) for actor_id in (actor1_id, actor2_id)]
+            credit_versions = {str(info['id']): hashlib.md5(str(info['id']).encode()).hexdigest() for info in actor_infos}
+            deps = tmdb._pair_deps(credit_versions, fetch_args, details_list, {})
+            payload = tmdb._build_pair_payload(
+                f'Actor {actor1_id}', f'Actor {actor2_id}', *actor_infos, fetch_args, details_list, deps,
+            )
+            yield cache_manager._get_cache_key(actor1_id, actor2_id), payload
+
+    def _movie(self, rng, movie_id):
+        return {
+            'id': movie_id,
+            'imdb_url': f'https://www.imdb.com/title/tt{movie_id:07d}/',
+            'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 5))).title(),
+            'genres': [{'id': genre_id, 'name': name} for genre_id, name in rng.sample(GENRES, rng.randint(1, 3))],
+            'poster_path': f"/{hashlib.md5(str(movie_id).encode()).hexdigest()[:27]}.jpg",
+            'release_year': str(rng.randint(1930, 2025)),
+            'directors': [f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}' for _ in range(rng.choice((1, 1, 1, 2)))],
+        }
+
+    def _character(self, rng):
+        return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+    def _actor(self, actor_id):
+        digest = hashlib.md5(f'actor-{actor_id}'.encode()).hexdigest()
+        return {
+            'id': actor_id,
+            'image_path': f'https://image.tmdb.org/t/p/w500/{digest[:27]}.jpg',
+            'imdb_url': f'https://www.imdb.com/name/nm{actor_id:07d}/',
+        }
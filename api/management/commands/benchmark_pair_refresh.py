@@ -0,0 +1,142 @@
+import contextlib
+import hashlib
+import random
+from collections import Counter
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from services import cache_manager, tmdb
+
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+class SimulatedTMDB:
+    """
+    TMDB simulé pour le banc d'essai : filmographies aléatoires, ETags sur les
+    crédits (304 si inchangés) et compteur d'appels par type de ressource.
+    """
+
+    def __init__(self, rng, actors, movies, credits_per_actor):
+        self.filmographies = {
+            actor_id: set(rng.sample(range(1, movies + 1), credits_per_actor))
+            for actor_id in range(1000, 1000 + actors)
+        }
+        self.calls = Counter()
+
+    def _etag(self, actor_id):
+        return hashlib.md5(repr(sorted(self.filmographies[actor_id])).encode('utf-8')).hexdigest()
+
+    def request(self, url, headers=None, params=None, action_description='', **kwargs):
+        if '/search/person' in url:
+            self.calls['search'] += 1
+            actor_id = int(params['query'].split()[1])
+            return {'results': [{'id': actor_id, 'name': params['query'], 'profile_path': None}]}
+        if url.endswith('/external_ids'):
+            self.calls['external_ids'] += 1
+            return {'imdb_id': None}
+        self.calls['movie'] += 1
+        movie_id = int(url.rsplit('/', 1)[1])
+        return {'title': f'Film {movie_id}', 'release_date': '2000-01-01'}
+
+    def conditional_request(self, url, headers, etag=None, **kwargs):
+        self.calls['credits'] += 1
+        actor_id = int(url.split('/')[-2])
+        current_etag = self._etag(actor_id)
+        if etag == current_etag:
+            return None, current_etag
+        cast = [
+            {'id': movie_id, 'title': f'Film {movie_id}', 'character': f'Role {actor_id}'}
+            for movie_id in sorted(self.filmographies[actor_id])
+        ]
+        return {'cast': cast}, current_etag
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai du recalcul incrémental des paires : simule une journée de trafic après "
+        "l'expiration du cache et compte les appels TMDB, avec et sans PAIR_CACHE_INCREMENTAL_REFRESH."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--actors', type=int, default=60)
+        parser.add_argument('--movies', type=int, default=400)
+        parser.add_argument('--credits-per-actor', type=int, default=80)
+        parser.add_argument('--pairs', type=int, default=200)
+        parser.add_argument('--requests-per-hour', type=int, default=40)
+        parser.add_argument('--new-credits-per-day', type=int, default=6, help="Nouveaux rôles ajoutés pendant la journée")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        results = {}
+        for incremental in (False, True):
+            results[incremental] = self._simulate(incremental, options)
+
+        kinds = sorted(set(results[False]) | set(results[True]))
+        self.stdout.write(f"{'appels TMDB':<14}{'complet':>10}{'incrémental':>14}")
+        for kind in kinds:
+            self.stdout.write(f"{kind:<14}{results[False][kind]:>10}{results[True][kind]:>14}")
+        full, incremental = sum(results[False].values()), sum(results[True].values())
+        self.stdout.write(f"{'total':<14}{full:>10}{incremental:>14}")
+        reduction = 100 * (1 - incremental / full) if full else 0
+        self.stdout.write(self.style.SUCCESS(f"Réduction des appels TMDB sur la journée simulée : {reduction:.1f}%"))
+
+    def _simulate(self, incremental, options):
+        rng = random.Random(options['seed'])
+        upstream = SimulatedTMDB(rng, options['actors'], options['movies'], options['credits_per_actor'])
+        actor_ids = sorted(upstream.filmographies)
+        pairs = set()
+        while len(pairs) < min(options['pairs'], len(actor_ids) * (len(actor_ids) - 1) // 2):
+            pairs.add(tuple(sorted(rng.sample(actor_ids, 2))))
+        pairs = sorted(pairs)
+
+        clock = [1_700_000_000.0]
+        with self._environment(incremental, upstream, clock):
+            # Jour 0 : toutes les paires sont calculées une première fois.
+            for actor1_id, actor2_id in pairs:
+                tmdb.find_common_movies(f'Actor {actor1_id}', f'Actor {actor2_id}')
+            upstream.calls.clear()
+
+            # Jour 1 : toutes les entrées ont expiré, les filmographies évoluent peu.
+            clock[0] += DAY + HOUR
+            change_hours = Counter(rng.randrange(24) for _ in range(options['new_credits_per_day']))
+            for hour in range(24):
+                for _ in range(change_hours[hour]):
+                    upstream.filmographies[rng.choice(actor_ids)].add(rng.randint(1, options['movies']))
+                for _ in range(options['requests_per_hour']):
+                    actor1_id, actor2_id = rng.choice(pairs)
+                    tmdb.find_common_movies(f'Actor {actor1_id}', f'Actor {actor2_id}')
+                clock[0] += HOUR
+        return Counter(upstream.calls)
+
+    @contextlib.contextmanager
+    def _environment(self, incremental, upstream, clock):
+        overrides = override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'benchmark-pair-refresh',
+                'OPTIONS': {'MAX_ENTRIES': 100_000},
+            }},
+            PAIR_CACHE_BACKEND='services.pair_cache.InMemoryPairCache',
+            PAIR_CACHE_OPTIONS={},
+            PAIR_CACHE_SWEEP_INTERVAL=0,
+            PAIR_CACHE_STALE_WHILE_REVALIDATE=False,
+            PAIR_CACHE_INCREMENTAL_REFRESH=incremental,
+            SINGLEFLIGHT_SHARED_LOCK=False,
+            CREDITS_INDEX_ENABLED=False,
+        )
+        with overrides, \
+                mock.patch('time.time', lambda: clock[0]), \
+                mock.patch('services.tmdb.make_tmdb_request', side_effect=upstream.request), \
+                mock.patch('services.tmdb.make_conditional_tmdb_request', side_effect=upstream.conditional_request):
+            cache.clear()
+            cache_manager.reset_backend()
+            try:
+                yield
+            finally:
+                cache.clear()
+                cache_manager.reset_backend()
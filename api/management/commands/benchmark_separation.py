@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from benchmarks.fake_tmdb import FakeTMDBServer, build_catalog
+from services import rate_limit, separation, utils
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc d'essai des degrés de séparation : graphe de co-vedettes synthétique servi par le faux TMDB local, "
+        "recherche bidirectionnelle comparée à une recherche depuis un seul acteur (nœuds développés, appels, durée)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--actors', type=int, default=3000)
+        parser.add_argument('--movies', type=int, default=6000)
+        parser.add_argument('--min-credits', type=int, default=4)
+        parser.add_argument('--max-credits', type=int, default=12)
+        parser.add_argument('--searches', type=int, default=5)
+        parser.add_argument('--max-hops', type=int, default=6)
+        parser.add_argument('--latency', type=float, default=0.005, help="Latence du faux TMDB par appel, en secondes")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        catalog = build_catalog(
+            [], extra_actors=options['actors'], movies=options['movies'],
+            credits_per_actor=(options['min_credits'], options['max_credits']), seed=options['seed'],
+        )
+        rng = random.Random(options['seed'])
+        actor_ids = sorted(catalog['actors'])
+        searches = [tuple(rng.sample(actor_ids, 2)) for _ in range(options['searches'])]
+
+        with FakeTMDBServer(catalog, options['latency']) as server, override_settings(
+            TMDB_API_BASE_URL=server.base_url,
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'benchmark-separation',
+                'OPTIONS': {'MAX_ENTRIES': 1_000_000},
+            }},
+        ):
+            rate_limit.set_limiter(None)
+            utils.reset_session()
+            try:
+                totals = {mode: self._run(server, searches, options['max_hops'], mode) for mode in (False, True)}
+            finally:
+                rate_limit.reset_limiter()
+                utils.reset_session()
+
+        self.stdout.write(f"{'recherche':<16}{'trouvés':>9}{'acteurs':>10}{'films':>10}{'appels TMDB':>13}{'durée (s)':>11}")
+        for mode, label in ((False, 'un côté'), (True, 'bidirectionnelle')):
+            found, actors, movies, calls, elapsed = totals[mode]
+            self.stdout.write(f"{label:<16}{found:>9}{actors:>10}{movies:>10}{calls:>13}{elapsed:>11.2f}")
+
+    def _run(self, server, searches, max_hops, bidirectional):
+        found = actors = movies = calls = 0
+        elapsed = 0.0
+        for actor1_id, actor2_id in searches:
+            # Cache vide avant chaque recherche : on mesure le parcours, pas les recherches précédentes.
+            cache.clear()
+            server.reset_calls()
+            start = time.perf_counter()
+            result = separation.find_path(actor1_id, actor2_id, max_hops=max_hops, max_calls=10 ** 9, bidirectional=bidirectional)
+            elapsed += time.perf_counter() - start
+            found += result.status == separation.FOUND
+            actors += result.expanded_actors
+            movies += result.expanded_movies
+            calls += server.total_calls
+        return found, actors, movies, calls, elapsed
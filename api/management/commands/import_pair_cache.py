@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from services import cache_manager
+
+
+class Command(BaseCommand):
+    help = "Importe l'ancien cache JSON des paires (api_cache.json) dans le backend de cache configuré."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=str(cache_manager.CACHE_FILE_PATH))
+
+    def handle(self, *args, **options):
+        count = cache_manager.import_json_cache(options['path'])
+        self.stdout.write(self.style.SUCCESS(f"{count} entrée(s) importée(s) depuis {options['path']}"))
@@ -0,0 +1,260 @@
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+
+from api.models import ActorPair, PairMovie
+from services import credits_index, rate_limit
+from services.tmdb import get_actor_info, get_movies_by_actor, summarize_common_movies
+from services.utils import TMDBServiceError, get_http_stats, normalize_name
+
+
+def read_pairs(path):
+    """Paires (acteur1, acteur2) depuis un CSV (colonnes actor1,actor2, en-tête optionnel) ou un JSONL."""
+    pairs = []
+    with open(path, encoding='utf-8') as f:
+        if path.suffix == '.jsonl':
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    pairs.append((row['actor1'], row['actor2']))
+        else:
+            for row in csv.reader(f):
+                if len(row) < 2 or (not pairs and [c.strip().lower() for c in row[:2]] == ['actor1', 'actor2']):
+                    continue
+                pairs.append((row[0].strip(), row[1].strip()))
+
+    unique_pairs = {}
+    for actor1, actor2 in pairs:
+        unique_pairs.setdefault(frozenset((normalize_name(actor1), normalize_name(actor2))), (actor1, actor2))
+    return list(unique_pairs.values())
+
+
+class Checkpoint:
+    """État de reprise : acteurs résolus (nom normalisé -> infos ou None) et paires déjà écrites."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.actors = {}
+        self.done_pairs = set()
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, encoding='utf-8') as f:
+                state = json.load(f)
+            self.actors = state.get('actors', {})
+            self.done_pairs = set(state.get('done_pairs', []))
+
+    def save(self):
+        with self._lock:
+            state = {'actors': self.actors, 'done_pairs': sorted(self.done_pairs)}
+            tmp_path = self.path.with_name(self.path.name + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+class ThroughputReporter(threading.Thread):
+
+    def __init__(self, command, interval):
+        super().__init__(daemon=True)
+        self.command = command
+        self.interval = interval
+        self.pairs_done = 0
+        self.stage = 'démarrage'
+        self._stop_event = threading.Event()
+        self._started_at = time.monotonic()
+        self._start_calls = get_http_stats()['requests']
+
+    def line(self):
+        elapsed = max(time.monotonic() - self._started_at, 1e-9)
+        calls = get_http_stats()['requests'] - self._start_calls
+        limiter = rate_limit.get_stats()
+        tokens = f"{limiter['tokens']:.1f}" if limiter['tokens'] is not None else '∞'
+        return (
+            f"[{self.stage}] {self.pairs_done} paire(s) en {elapsed:.1f}s — "
+            f"{self.pairs_done / elapsed:.1f} paires/s, {calls} appels TMDB ({calls / elapsed:.1f}/s), "
+            f"jetons {tokens}, {limiter['waiting'][rate_limit.BATCH]} en attente"
+        )
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.command.stdout.write(self.line())
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def _in_worker(func, *args):
+    try:
+        return func(*args)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Ingestion en masse de paires d'acteurs (CSV ou JSONL) dans ActorPair : résolution et "
+        "filmographies en parallèle sous limite de débit TMDB, avec reprise sur point de contrôle."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Fichier .csv (actor1,actor2) ou .jsonl ({\"actor1\": ..., \"actor2\": ...})")
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--rate', type=float, default=30.0, help="Appels TMDB par seconde (0 = illimité)")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--checkpoint', help="Fichier de reprise (défaut: <path>.checkpoint.json)")
+        parser.add_argument('--report-interval', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f"Fichier introuvable: {path}")
+
+        pairs = read_pairs(path)
+        checkpoint = Checkpoint(options['checkpoint'] or f"{path}.checkpoint.json")
+        rate_limit.set_limiter(options['rate'] or None)
+        # Priorité aux vues : l'ingestion ne consomme pas la réserve interactive du seau partagé.
+        previous_lane = rate_limit.current_lane()
+        rate_limit.set_default_lane(rate_limit.BATCH)
+        workers = max(1, options['workers'])
+
+        reporter = ThroughputReporter(self, options['report_interval'])
+        reporter.pairs_done = len(checkpoint.done_pairs)
+        reporter.start()
+        try:
+            reporter.stage = 'résolution des acteurs'
+            self._resolve_actors(pairs, checkpoint, workers)
+
+            reporter.stage = 'filmographies'
+            failed_actors = self._index_credits(checkpoint, workers)
+
+            reporter.stage = 'écriture des paires'
+            self._write_pairs(pairs, checkpoint, options['batch_size'], reporter, failed_actors)
+        finally:
+            reporter.stop()
+            checkpoint.save()
+            rate_limit.set_default_lane(previous_lane)
+
+        self.stdout.write(self.style.SUCCESS(reporter.line()))
+
+    def _resolve_actors(self, pairs, checkpoint, workers):
+        names = {}
+        for pair in pairs:
+            for name in pair:
+                key = normalize_name(name)
+                if key not in checkpoint.actors:
+                    names.setdefault(key, name)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_in_worker, get_actor_info, name): key for key, name in names.items()}
+            for count, future in enumerate(as_completed(futures), start=1):
+                key = futures[future]
+                try:
+                    info = future.result()
+                except TMDBServiceError as e:
+                    # Non enregistré : l'acteur sera retenté à la prochaine exécution.
+                    self.stderr.write(f"Acteur non résolu ({names[key]}): {e}")
+                    continue
+                checkpoint.actors[key] = info and {'id': info['id'], 'name': info.get('name') or names[key], 'image_path': info.get('image_path')}
+                if count % 100 == 0:
+                    checkpoint.save()
+        checkpoint.save()
+
+    def _index_credits(self, checkpoint, workers):
+        """
+        Filmographies récupérées en parallèle, mais écrites dans l'index depuis le thread principal :
+        un seul écrivain à la fois (SQLite n'en accepte pas d'autre). Renvoie les IDs en échec.
+        """
+        actors = {info['id']: info for info in checkpoint.actors.values() if info}
+        failed = set()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_in_worker, get_movies_by_actor, actor_id): actor_id
+                for actor_id in sorted(credits_index.actors_needing_ingest(actors))
+            }
+            for future in as_completed(futures):
+                actor_id = futures[future]
+                info = actors[actor_id]
+                try:
+                    credits_index.ingest_credits(actor_id, future.result(), name=info['name'], profile_path=info['image_path'])
+                except (TMDBServiceError, DatabaseError) as e:
+                    # Paires de cet acteur non écrites : elles seront retentées à la prochaine exécution.
+                    self.stderr.write(f"Filmographie non indexée (acteur ID {actor_id}): {e}")
+                    failed.add(actor_id)
+        return failed
+
+    def _write_pairs(self, pairs, checkpoint, batch_size, reporter, failed_actors=frozenset()):
+        batch = []
+        batch_keys = []
+        pending_keys = set()
+        credits_cache = {}
+
+        def credits(actor_id):
+            if actor_id not in credits_cache:
+                credits_cache[actor_id] = credits_index.get_actor_credits(actor_id)
+            return credits_cache[actor_id]
+
+        for actor1, actor2 in pairs:
+            info1 = checkpoint.actors.get(normalize_name(actor1))
+            info2 = checkpoint.actors.get(normalize_name(actor2))
+            if not info1 or not info2 or info1['id'] == info2['id']:
+                continue
+            if info1['id'] in failed_actors or info2['id'] in failed_actors:
+                continue
+            # Une seule orientation par paire (plus petit ID en premier), pour ne pas créer (B, A) à côté de (A, B).
+            if info1['id'] > info2['id']:
+                (actor1, info1), (actor2, info2) = (actor2, info2), (actor1, info1)
+            pair_key = f"{info1['id']}_{info2['id']}"
+            # Deux alias peuvent désigner la même paire : un upsert Postgres ne touche pas deux fois la même ligne.
+            if pair_key in checkpoint.done_pairs or pair_key in pending_keys:
+                continue
+
+            movies = summarize_common_movies(credits(info1['id']), credits(info2['id']))
+            batch.append(ActorPair(
+                actor1_id=info1['id'],
+                actor2_id=info2['id'],
+                actor1_name=actor1,
+                actor2_name=actor2,
+                common_movies_count=len(movies),
+                common_movies=[
+                    {"id": m["id"], "title": m["title"], "release_date": m["release_date"]}
+                    for m in movies
+                ],
+            ))
+            batch_keys.append(pair_key)
+            pending_keys.add(pair_key)
+            if len(batch) >= batch_size:
+                self._flush(batch, batch_keys, checkpoint, reporter)
+                batch, batch_keys = [], []
+
+        if batch:
+            self._flush(batch, batch_keys, checkpoint, reporter)
+
+    def _flush(self, batch, batch_keys, checkpoint, reporter):
+        with transaction.atomic():
+            saved = ActorPair.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['actor1_id', 'actor2_id'],
+                update_fields=['actor1_name', 'actor2_name', 'common_movies_count', 'common_movies'],
+            )
+            if any(pair.pk is None for pair in saved):
+                # Base sans RETURNING sur les upserts : on relit les clés primaires.
+                pks = {
+                    (actor1_id, actor2_id): pk
+                    for pk, actor1_id, actor2_id in ActorPair.objects
+                    .filter(actor1_id__in={p.actor1_id for p in saved})
+                    .values_list('pk', 'actor1_id', 'actor2_id')
+                }
+                for pair in saved:
+                    pair.pk = pks.get((pair.actor1_id, pair.actor2_id))
+            PairMovie.replace_for_pairs(saved)
+        checkpoint.done_pairs.update(batch_keys)
+        checkpoint.save()
+        reporter.pairs_done = len(checkpoint.done_pairs)
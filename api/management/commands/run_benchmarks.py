@@ -0,0 +1,115 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from benchmarks.fake_tmdb import FakeTMDBServer, build_catalog
+from benchmarks.scenarios import SCENARIOS, compare_to_baseline
+from scripts.fetch_selected_pairs import ACTOR_PAIRS
+from services import cache_manager, rate_limit, utils
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+# Paramètres qui changent les chiffres : une référence n'est comparable qu'à paramètres égaux.
+RUN_PARAMETERS = ('latency', 'error_rate', 'concurrency', 'pairs', 'seed')
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks de bout en bout contre un faux serveur TMDB local (cache froid/chaud, ruée sur une paire, "
+        "frappe en autocomplétion, ingestion par scripts/fetch_selected_pairs.py), dans une base de test jetable. "
+        "Échoue si les résultats régressent par rapport à la référence enregistrée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help="Par défaut : tous")
+        parser.add_argument('--latency', type=float, default=0.02, help="Latence du faux TMDB par appel, en secondes")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Part des appels TMDB qui répondent 500")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--pairs', type=int, default=24, help="Paires générées pour les scénarios common-movies")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true', help="Enregistre ces résultats comme référence")
+        parser.add_argument('--tolerance', type=float, default=0.25)
+
+    def handle(self, *args, **options):
+        generated = [(f'Actor {2 * index:04d}', f'Actor {2 * index + 1:04d}') for index in range(options['pairs'])]
+        catalog = build_catalog(list(ACTOR_PAIRS) + generated, seed=options['seed'])
+        scenario_names = options['scenario'] or list(SCENARIOS)
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with FakeTMDBServer(catalog, options['latency'], options['error_rate'], options['seed']) as server:
+                summaries = self._run_scenarios(server, scenario_names, generated, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self._report(summaries)
+        self._check_baseline(summaries, options)
+
+    def _run_scenarios(self, server, scenario_names, pairs, options):
+        overrides = override_settings(
+            TMDB_API_BASE_URL=server.base_url,
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'benchmarks',
+                'OPTIONS': {'MAX_ENTRIES': 100_000},
+            }},
+            PAIR_CACHE_BACKEND='services.pair_cache.InMemoryPairCache',
+            PAIR_CACHE_OPTIONS={},
+            PAIR_CACHE_SWEEP_INTERVAL=0,
+            SINGLEFLIGHT_SHARED_LOCK=False,
+            REQUEST_PROFILING_SAMPLE_RATE=0,
+        )
+        summaries = {}
+        with overrides:
+            # Le faux serveur n'a pas de quota : seule l'application est mesurée.
+            rate_limit.set_limiter(None)
+            utils.reset_session()
+            try:
+                for name in scenario_names:
+                    self.stdout.write(f"Scénario {name}...")
+                    summaries[name] = SCENARIOS[name](server, pairs, options['concurrency']).summary()
+            finally:
+                rate_limit.reset_limiter()
+                utils.reset_session()
+                cache_manager.reset_backend()
+        return summaries
+
+    def _report(self, summaries):
+        columns = ('requests', 'errors', 'p50_ms', 'p95_ms', 'p99_ms', 'requests_per_second', 'upstream_per_request')
+        self.stdout.write(f"{'scénario':<20}" + ''.join(f"{column:>21}" for column in columns))
+        for name, summary in summaries.items():
+            self.stdout.write(f"{name:<20}" + ''.join(f"{summary[column]:>21}" for column in columns))
+
+    def _check_baseline(self, summaries, options):
+        path = Path(options['baseline'])
+        parameters = {key: options[key] for key in RUN_PARAMETERS}
+
+        if options['update_baseline']:
+            stored = json.loads(path.read_text(encoding='utf-8')) if path.exists() else {}
+            if stored.get('parameters') not in (None, parameters):
+                stored['scenarios'] = {}
+            stored = {'parameters': parameters, 'scenarios': {**stored.get('scenarios', {}), **summaries}}
+            path.write_text(json.dumps(stored, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f"Référence enregistrée dans {path}"))
+            return
+
+        if not path.exists():
+            self.stdout.write(self.style.WARNING(f"Pas de référence ({path}) : lancer avec --update-baseline pour en créer une."))
+            return
+        baseline = json.loads(path.read_text(encoding='utf-8'))
+        if baseline.get('parameters') != parameters:
+            self.stdout.write(self.style.WARNING(
+                f"Référence obtenue avec d'autres paramètres ({baseline.get('parameters')}) : comparaison ignorée."
+            ))
+            return
+
+        regressions = compare_to_baseline(summaries, baseline['scenarios'], options['tolerance'])
+        if regressions:
+            raise CommandError("Régressions par rapport à la référence :\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence."))
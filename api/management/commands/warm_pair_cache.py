@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from services import rate_limit, warming
+
+
+class Command(BaseCommand):
+    help = (
+        "Préchauffe le cache des paires avec les paires d'ActorPair absentes ou proches de l'expiration "
+        "(après un déploiement, ou par cron), sur la voie batch du limiteur TMDB."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help="Nombre maximal de paires recalculées (défaut: toutes)")
+
+    def handle(self, *args, **options):
+        seeded = warming.seed_from_actor_pairs()
+        previous_lane = rate_limit.current_lane()
+        rate_limit.set_default_lane(rate_limit.BATCH)
+        try:
+            limit = seeded if options['limit'] is None else options['limit']
+            warmed = warming.warm_once(limit=limit, top_n=seeded)
+        finally:
+            rate_limit.set_default_lane(previous_lane)
+        self.stdout.write(self.style.SUCCESS(f"{warmed} paire(s) recalculée(s) sur {seeded} suivie(s)"))
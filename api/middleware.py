@@ -0,0 +1,76 @@
+import cProfile
+import logging
+import random
+import time
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from services import instrumentation, resilience
+
+logger = logging.getLogger(__name__)
+
+
+def _finish(request, response, spans, elapsed, degraded):
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match else 'unmatched'
+    instrumentation.record('request', elapsed, view=view, status=str(response.status_code))
+    if getattr(settings, 'SERVER_TIMING_ENABLED', True):
+        response['Server-Timing'] = spans.server_timing()
+    if degraded:
+        # Réponse servie malgré une panne TMDB : données expirées (stale_*) ou films manquants.
+        response['X-Degraded'] = ', '.join(sorted(degraded))
+    return response
+
+
+def _should_profile():
+    rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+def _dump_profile(profiler, request):
+    directory = Path(getattr(settings, 'REQUEST_PROFILING_DIR', 'profiles'))
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = request.path.strip('/').replace('/', '_') or 'root'
+    path = directory / f"{time.strftime('%Y%m%d-%H%M%S')}-{slug}-{random.randrange(1 << 16):04x}.prof"
+    profiler.dump_stats(path)
+    logger.info(f"Profil de la requête {request.path} écrit dans {path}")
+
+
+@sync_and_async_middleware
+def instrumentation_middleware(get_response):
+    """
+    Relevé des spans de chaque requête : en-tête ``Server-Timing`` et
+    histogramme ``screenpairs_request_seconds`` ; en-tête ``X-Degraded`` si la
+    réponse a été dégradée par une panne TMDB (``services.resilience``). Une fraction
+    ``REQUEST_PROFILING_SAMPLE_RATE`` des requêtes synchrones est profilée
+    avec cProfile dans ``REQUEST_PROFILING_DIR`` (cProfile ne suit pas une
+    coroutine entre ses ``await`` : les vues async ne sont pas profilées).
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            spans, token = instrumentation.start_request()
+            try:
+                with resilience.track_degraded() as degraded:
+                    response = await get_response(request)
+            finally:
+                instrumentation.end_request(token)
+            return _finish(request, response, spans, time.perf_counter() - spans.started_at, degraded)
+        return middleware
+
+    def middleware(request):
+        spans, token = instrumentation.start_request()
+        profiler = cProfile.Profile() if _should_profile() else None
+        try:
+            with resilience.track_degraded() as degraded:
+                if profiler is None:
+                    response = get_response(request)
+                else:
+                    response = profiler.runcall(get_response, request)
+                    _dump_profile(profiler, request)
+        finally:
+            instrumentation.end_request(token)
+        return _finish(request, response, spans, time.perf_counter() - spans.started_at, degraded)
+    return middleware
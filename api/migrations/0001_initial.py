@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-17 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActorPair',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor1_id', models.IntegerField()),
+                ('actor2_id', models.IntegerField()),
+                ('actor1_name', models.CharField(max_length=255)),
+                ('actor2_name', models.CharField(max_length=255)),
+                ('common_movies_count', models.PositiveIntegerField()),
+                ('common_movies', models.JSONField(blank=True, null=True)),
+            ],
+            options={
+                'unique_together': {('actor1_id', 'actor2_id')},
+            },
+        ),
+    ]
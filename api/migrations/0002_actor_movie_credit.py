@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 16:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Actor',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('profile_path', models.CharField(blank=True, max_length=255, null=True)),
+                ('credits_ingested_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Movie',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(blank=True, max_length=500)),
+                ('release_date', models.DateField(blank=True, null=True)),
+                ('genre_ids', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Credit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('character', models.CharField(blank=True, max_length=500)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='api.actor')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='api.movie')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['movie', 'actor'], name='credit_movie_actor_idx')],
+                'unique_together': {('actor', 'movie')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-17 16:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_actor_movie_credit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PairMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_id', models.IntegerField(blank=True, null=True)),
+                ('title', models.CharField(max_length=500)),
+                ('release_date', models.DateField(blank=True, null=True)),
+                ('pair', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movies', to='api.actorpair')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['movie_id'], name='pairmovie_movie_id_idx'), models.Index(fields=['release_date'], name='pairmovie_release_date_idx')],
+            },
+        ),
+    ]
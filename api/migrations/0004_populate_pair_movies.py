@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-17 16:15
+
+from django.db import migrations
+from django.utils.dateparse import parse_date
+
+
+def _parse_release_date(value):
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def populate_pair_movies(apps, schema_editor):
+    ActorPair = apps.get_model('api', 'ActorPair')
+    PairMovie = apps.get_model('api', 'PairMovie')
+
+    batch = []
+    for pair in ActorPair.objects.exclude(common_movies=None).only('id', 'common_movies').iterator(chunk_size=500):
+        for movie in pair.common_movies or []:
+            batch.append(PairMovie(
+                pair_id=pair.id,
+                movie_id=movie.get('id'),
+                title=movie.get('title') or '',
+                release_date=_parse_release_date(movie.get('release_date')),
+            ))
+        if len(batch) >= 1000:
+            PairMovie.objects.bulk_create(batch)
+            batch = []
+    PairMovie.objects.bulk_create(batch)
+
+
+def clear_pair_movies(apps, schema_editor):
+    apps.get_model('api', 'PairMovie').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_pairmovie'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_pair_movies, clear_pair_movies),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 17:26
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_populate_pair_movies'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actorpair',
+            index=models.Index(django.db.models.functions.comparison.Least('actor1_id', 'actor2_id'), django.db.models.functions.comparison.Greatest('actor1_id', 'actor2_id'), name='actorpair_min_max_idx'),
+        ),
+    ]
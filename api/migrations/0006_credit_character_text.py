@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_actorpair_min_max_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='credit',
+            name='character',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.functions import Greatest, Least
+from django.utils.dateparse import parse_date
 
 class ActorPair(models.Model):
     actor1_id = models.IntegerField()
@@ -10,7 +12,93 @@ class ActorPair(models.Model):
 
     class Meta:
         unique_together = ('actor1_id', 'actor2_id')
+        indexes = [
+            # Recherche d'une paire dans un ordre ou l'autre (services/actor_pairs.py).
+            models.Index(Least('actor1_id', 'actor2_id'), Greatest('actor1_id', 'actor2_id'), name='actorpair_min_max_idx'),
+        ]
 
     def __str__(self):
         return f"{self.actor1_name} & {self.actor2_name} ({self.common_movies_count} films)"
 
+
+class PairMovie(models.Model):
+    """
+    Version normalisée de ``ActorPair.common_movies`` : une ligne par film commun,
+    indexée sur le film et la date de sortie pour filtrer les paires sans lire le JSON.
+    """
+    pair = models.ForeignKey(ActorPair, on_delete=models.CASCADE, related_name='movies')
+    # Absent des paires enregistrées avant que common_movies ne contienne l'ID TMDB.
+    movie_id = models.IntegerField(null=True, blank=True)
+    title = models.CharField(max_length=500)
+    release_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['movie_id'], name='pairmovie_movie_id_idx'),
+            models.Index(fields=['release_date'], name='pairmovie_release_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.release_date or 'N/A'})"
+
+    @staticmethod
+    def from_json(pair_id, movie):
+        release_date = movie.get('release_date') or None
+        try:
+            release_date = parse_date(release_date) if release_date else None
+        except ValueError:
+            release_date = None
+        return PairMovie(
+            pair_id=pair_id,
+            movie_id=movie.get('id'),
+            title=movie.get('title') or '',
+            release_date=release_date,
+        )
+
+    @classmethod
+    def replace_for_pairs(cls, pairs):
+        """Reconstruit les lignes PairMovie des paires données à partir de leur ``common_movies``."""
+        pair_ids = [pair.pk for pair in pairs]
+        cls.objects.filter(pair_id__in=pair_ids).delete()
+        cls.objects.bulk_create(
+            cls.from_json(pair.pk, movie)
+            for pair in pairs
+            for movie in (pair.common_movies or [])
+        )
+
+
+class Actor(models.Model):
+    # Clé primaire = ID de personne TMDB.
+    id = models.IntegerField(primary_key=True)
+    name = models.CharField(max_length=255, blank=True)
+    profile_path = models.CharField(max_length=255, null=True, blank=True)
+    credits_ingested_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return self.name or str(self.id)
+
+
+class Movie(models.Model):
+    # Clé primaire = ID de film TMDB.
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=500, blank=True)
+    release_date = models.DateField(null=True, blank=True)
+    genre_ids = models.JSONField(default=list, blank=True)
+
+    def __str__(self):
+        return self.title or str(self.id)
+
+
+class Credit(models.Model):
+    actor = models.ForeignKey(Actor, on_delete=models.CASCADE, related_name='credits')
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='credits')
+    # Rôles multiples joints par « / » (credits_index.ingest_credits) : pas de longueur maximale.
+    character = models.TextField(blank=True)
+
+    class Meta:
+        # (actor, movie) via la contrainte unique ; (movie, actor) pour la jointure inverse.
+        unique_together = ('actor', 'movie')
+        indexes = [models.Index(fields=['movie', 'actor'], name='credit_movie_actor_idx')]
+
+    def __str__(self):
+        return f"{self.actor_id} → {self.movie_id} ({self.character})"
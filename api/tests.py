@@ -1,3 +1,1444 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from asgiref.sync import sync_to_async
+
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from api.models import Actor, ActorPair, PairMovie
+from api.views import common_movies_async_view, common_movies_view
+from benchmarks.fake_tmdb import FakeTMDBServer, build_catalog
+from benchmarks.scenarios import compare_to_baseline, percentile
+from services import (
+    actor_pairs, autocomplete, cache_manager, credits_index, instrumentation, offline_index, rate_limit, resilience, separation, singleflight,
+    tmdb, tmdb_async, utils, warming,
+)
+from services.autocomplete import ActorPrefixIndex
+from services.pair_cache import PairCodec
+from services.tiered_cache import LRUStore
+from services.utils import (
+    TMDB_BASE_URL, TMDBCircuitOpenError, TMDBNotFoundError, TMDBServiceError, make_conditional_tmdb_request,
+)
+from services.utils import make_tmdb_request as make_tmdb_request_sync
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    PAIR_CACHE_BACKEND='services.pair_cache.InMemoryPairCache',
+    PAIR_CACHE_OPTIONS={},
+    PAIR_CACHE_SWEEP_INTERVAL=0,
+    TMDB_MAX_IN_FLIGHT=8,
+    COMMON_MOVIES_DEADLINE=5,
+    CREDITS_INDEX_ENABLED=False,
+)
+class ServiceTestCase(SimpleTestCase):
+    """Caches Django et cache des paires en mémoire, vidés avant chaque test."""
+
+    def setUp(self):
+        cache.clear()
+        cache_manager.reset_backend()
+        resilience.reset()
+
+
+# Filmographies par ID d'acteur ; les autres acteurs ont tous joué dans les films 10 à 17.
+FILMOGRAPHIES = {
+    100: [1, 2, 3, 4],
+    101: [2, 3, 4],
+    102: [4, 5],
+}
+
+
+def fake_tmdb_request(latency=0.2, failing_ids=()):
+    """Transport simulé : chaque appel movie/{id} prend ``latency`` secondes."""
+    def _request(url, headers=None, params=None, action_description='', **kwargs):
+        if '/search/person' in url:
+            name = params['query']
+            if name.startswith('Actor '):
+                return {'results': [{'id': int(name.split()[1]), 'name': name}]}
+            return {'results': [{'id': 1 if name == 'Robert De Niro' else 2, 'name': name, 'profile_path': None}]}
+        if url.endswith('/external_ids'):
+            return {'imdb_id': None}
+        if url.rsplit('/', 2)[1] == 'person':
+            actor_id = int(url.rsplit('/', 1)[1])
+            return {'id': actor_id, 'name': f'Actor {actor_id}', 'profile_path': f'/{actor_id}.jpg'}
+        if url.endswith('/movie_credits'):
+            actor_id = int(url.split('/')[-2])
+            movie_ids = FILMOGRAPHIES.get(actor_id, range(10, 18))
+            return {'cast': [{'id': movie_id, 'title': f'Film {movie_id}', 'character': f'Role {actor_id}'} for movie_id in movie_ids]}
+        if url.endswith('/credits'):
+            movie_id = int(url.split('/')[-2])
+            cast = [actor_id for actor_id, movie_ids in FILMOGRAPHIES.items() if movie_id in movie_ids]
+            return {'cast': [{'id': actor_id, 'name': f'Actor {actor_id}', 'order': order} for order, actor_id in enumerate(cast)]}
+        movie_id = int(url.rsplit('/', 1)[1])
+        time.sleep(latency)
+        if movie_id in failing_ids:
+            raise TMDBServiceError(f"HTTP 500 pour le film {movie_id}")
+        return {'title': f'Film {movie_id}', 'release_date': '1990-01-01'}
+    return _request
+
+
+@contextlib.contextmanager
+def patch_tmdb(side_effect=None, return_value=None):
+    """Remplace les appels TMDB de ``services.tmdb`` ; les GET conditionnels passent par le même mock, sans ETag."""
+    with mock.patch('services.tmdb.make_tmdb_request', side_effect=side_effect, return_value=return_value) as request:
+        def conditional(url, headers, etag=None, **kwargs):
+            return request(url=url, headers=headers, **kwargs), None
+        with mock.patch('services.tmdb.make_conditional_tmdb_request', side_effect=conditional):
+            yield request
+
+
+@contextlib.contextmanager
+def patch_async_tmdb(side_effect):
+    with mock.patch('services.tmdb_async.async_make_tmdb_request', side_effect=side_effect) as request:
+        async def conditional(url, headers, etag=None, **kwargs):
+            return await request(url=url, headers=headers, **kwargs), None
+        with mock.patch('services.tmdb_async.async_make_conditional_tmdb_request', side_effect=conditional):
+            yield request
+
+
+def fake_async_tmdb_request(latency=0.2, failing_ids=()):
+    sync_request = fake_tmdb_request(latency=0, failing_ids=failing_ids)
+
+    async def _request(url, headers=None, params=None, action_description='', **kwargs):
+        if '/movie/' in url and not url.endswith('/movie_credits'):
+            await asyncio.sleep(latency)
+        return sync_request(url, headers=headers, params=params)
+    return _request
+
+
+class FindCommonMoviesConcurrencyTests(ServiceTestCase):
+
+    def test_movie_details_are_fetched_concurrently(self):
+        with patch_tmdb(fake_tmdb_request(latency=0.2)):
+            start = time.monotonic()
+            movies, _, _ = tmdb.find_common_movies('Robert De Niro', 'Joe Pesci')
+            elapsed = time.monotonic() - start
+
+        # 8 films à 0.2s chacun : 1.6s en série, ~0.2s en parallèle.
+        self.assertEqual(len(movies), 8)
+        self.assertLess(elapsed, 0.8)
+
+    def test_results_keep_order_and_skip_failures(self):
+        with patch_tmdb(fake_tmdb_request(latency=0.01, failing_ids={12})):
+            movies, _, _ = tmdb.find_common_movies('Robert De Niro', 'Joe Pesci')
+
+        self.assertEqual([movie['id'] for movie in movies], [10, 11, 13, 14, 15, 16, 17])
+
+    def test_deadline_drops_slow_calls(self):
+        with self.settings(COMMON_MOVIES_DEADLINE=0.1):
+            with patch_tmdb(fake_tmdb_request(latency=0.5)):
+                start = time.monotonic()
+                movies, _, _ = tmdb.find_common_movies('Robert De Niro', 'Joe Pesci')
+                elapsed = time.monotonic() - start
+
+        self.assertEqual(movies, [])
+        self.assertLess(elapsed, 0.4)
+
+
+class CommonMoviesBatchTests(ServiceTestCase):
+
+    def _post(self, pairs):
+        return self.client.post('/api/common-movies/batch/', {'pairs': pairs}, content_type='application/json')
+
+    def test_shared_actors_and_movies_are_fetched_once(self):
+        pairs = [
+            {'actor1': 'Actor 100', 'actor2': 'Actor 101'},
+            {'actor1': 'Actor 102', 'actor2': 'Actor 100'},
+            {'actor1': 'Actor 101', 'actor2': 'Actor 102'},
+        ]
+        with patch_tmdb(fake_tmdb_request(latency=0)) as request:
+            response = self._post(pairs)
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        results = {line['index']: [movie['id'] for movie in line['results']] for line in lines}
+        self.assertEqual(results, {0: [2, 3, 4], 1: [4], 2: [4]})
+        urls = [call.kwargs['url'] for call in request.call_args_list]
+        self.assertEqual(sum('/search/person' in url for url in urls), 3)
+        self.assertEqual(sum(url.endswith('/movie_credits') for url in urls), 3)
+        self.assertEqual(sorted(url.rsplit('/', 1)[1] for url in urls if '/movie/' in url), ['2', '3', '4'])
+
+    def test_batch_size_is_capped(self):
+        with self.settings(COMMON_MOVIES_BATCH_MAX_PAIRS=1):
+            response = self._post([{'actor1': 'Actor 100', 'actor2': 'Actor 101'}] * 2)
+        self.assertEqual(response.status_code, 400)
+
+
+class CommonMoviesGroupTests(ServiceTestCase):
+
+    def _get(self, *names, **params):
+        return self.client.get('/api/common-movies/group/', {'actor': list(names), **params})
+
+    def test_sorted_intersection_starts_from_the_smallest_set(self):
+        self.assertEqual(tmdb.intersect_sorted([[1, 2, 3, 4, 9], [2, 4, 9], [4, 9, 10]]), [4, 9])
+        self.assertEqual(tmdb.intersect_sorted([[1, 2], [3, 4], [1, 2, 3]]), [])
+        self.assertEqual(tmdb.intersect_sorted([[5, 5, 6], [5, 6]]), [5, 6])
+
+    def test_details_are_fetched_for_the_final_intersection_only(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)) as request:
+            response = self._get('Actor 100', 'Actor 101', 'Actor 102', fields='title')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'id': 4, 'title': 'Film 4'}])
+        self.assertEqual([actor['id'] for actor in response.json()['actors']], [100, 101, 102])
+        movie_urls = [call.kwargs['url'] for call in request.call_args_list if '/movie/' in call.kwargs['url']]
+        self.assertEqual(movie_urls, ['https://api.themoviedb.org/3/movie/4'])
+
+    def test_cache_key_ignores_actor_order(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            movies, _ = tmdb.get_group_common_movies(['Actor 100', 'Actor 101', 'Actor 102'])
+        with patch_tmdb(fake_tmdb_request(latency=0)) as request:
+            reordered, _ = tmdb.get_group_common_movies(['Actor 102', 'Actor 100', 'Actor 101'])
+
+        self.assertEqual(reordered, movies)
+        self.assertEqual(movies[0]['characters'], {'Actor 100': 'Role 100', 'Actor 101': 'Role 101', 'Actor 102': 'Role 102'})
+        self.assertFalse(any('/movie' in call.kwargs['url'] for call in request.call_args_list))
+        self.assertEqual(cache_manager._get_cache_key(102, 100, 101), '100_101_102')
+
+    def test_two_actors_share_the_pair_cache(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            tmdb.find_common_movies('Actor 100', 'Actor 101')
+            response = self._get('Actor 101', 'Actor 100')
+
+        self.assertEqual([movie['id'] for movie in response.json()['results']], [2, 3, 4])
+
+    def test_actor_count_is_bounded(self):
+        self.assertEqual(self._get('Actor 100', ' actor 100 ').status_code, 400)
+        with self.settings(COMMON_MOVIES_GROUP_MAX_ACTORS=2):
+            self.assertEqual(self._get('Actor 100', 'Actor 101', 'Actor 102').status_code, 400)
+
+
+# Graphe acteur -> films pour les degrés de séparation : 1 -10- 2 -12- 3 -13- 4, 9 isolé.
+SEPARATION_GRAPH = {1: [10, 11], 2: [10, 12], 3: [12, 13], 4: [13], 5: [11], 9: [99]}
+
+
+@contextlib.contextmanager
+def patch_separation_graph():
+    def movies_by_actor(actor_id):
+        return [{'id': movie_id, 'title': f'Film {movie_id}', 'genre_ids': []} for movie_id in SEPARATION_GRAPH[actor_id]]
+
+    def movie_cast(movie_id):
+        return [(actor_id, f'Actor {actor_id}') for actor_id, movie_ids in SEPARATION_GRAPH.items() if movie_id in movie_ids]
+
+    with mock.patch('services.tmdb.get_movies_by_actor', side_effect=movies_by_actor), \
+            mock.patch('services.tmdb.get_movie_cast', side_effect=movie_cast) as cast:
+        yield cast
+
+
+class SeparationTests(ServiceTestCase):
+
+    def test_bidirectional_search_finds_the_shortest_chain_with_fewer_expansions(self):
+        with patch_separation_graph():
+            result = separation.find_path(1, 4)
+            one_sided = separation.find_path(1, 4, bidirectional=False)
+
+        self.assertEqual(result.status, separation.FOUND)
+        self.assertEqual(result.degrees, 3)
+        self.assertEqual([node['id'] for node in result.path], [1, 10, 2, 12, 3, 13, 4])
+        self.assertEqual(result.path[1], {'type': 'movie', 'id': 10, 'title': 'Film 10'})
+        self.assertEqual(one_sided.degrees, 3)
+        self.assertLess(result.expanded_actors, one_sided.expanded_actors)
+
+    def test_search_stops_at_hop_and_call_budgets(self):
+        with patch_separation_graph():
+            self.assertEqual(separation.find_path(1, 4, max_hops=2).status, separation.HOP_LIMIT)
+            self.assertEqual(separation.find_path(1, 9).status, separation.NOT_CONNECTED)
+            self.assertEqual(separation.find_path(1, 4, max_calls=2).status, separation.CALL_BUDGET)
+
+    def test_endpoint_caches_paths_in_either_order(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            response = self.client.get('/api/separation/', {'actor1': 'Actor 102', 'actor2': 'Actor 100'})
+        with patch_tmdb(fake_tmdb_request(latency=0)) as request:
+            reversed_response = self.client.get('/api/separation/', {'actor1': 'Actor 100', 'actor2': 'Actor 102'})
+
+        self.assertEqual(response.json()['degrees'], 1)
+        self.assertEqual([node['id'] for node in response.json()['path']], [102, 4, 100])
+        self.assertEqual([node['id'] for node in reversed_response.json()['path']], [100, 4, 102])
+        self.assertFalse(any('credits' in call.kwargs['url'] for call in request.call_args_list))
+        self.assertEqual(self.client.get('/api/separation/', {'actor1': 'A', 'actor2': 'B', 'max_hops': 0}).status_code, 400)
+
+
+class ActorInfoCacheTests(ServiceTestCase):
+
+    def test_normalized_names_share_one_resolution(self):
+        with patch_tmdb(fake_tmdb_request()) as request:
+            first = tmdb.get_actor_info('Robert De Niro')
+            second = tmdb.get_actor_info('  robert   DE NIRÓ ')
+
+        self.assertEqual(first, second)
+        self.assertEqual(request.call_count, 2)
+
+    def test_unknown_names_are_negatively_cached(self):
+        with patch_tmdb(return_value={'results': []}) as request:
+            self.assertIsNone(tmdb.get_actor_info('Nobody Atall'))
+            self.assertIsNone(tmdb.get_actor_info('nobody atall'))
+
+        self.assertEqual(request.call_count, 1)
+
+    def test_warm_pair_makes_no_tmdb_calls(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            cold_movies, _, _ = tmdb.find_common_movies('Robert De Niro', 'Joe Pesci')
+        with patch_tmdb() as request:
+            warm_movies, _, _ = tmdb.find_common_movies('Robert De Niro', 'Joe Pesci')
+
+        self.assertEqual(warm_movies, cold_movies)
+        request.assert_not_called()
+
+
+class ActorCreditsCacheTests(ServiceTestCase):
+
+    CREDITS = {'cast': [
+        {'id': 7, 'title': 'Film 7', 'release_date': '2001-05-04', 'character': 'Role', 'genre_ids': [99], 'overview': '...'},
+        {'id': 3, 'title': 'Film 3', 'release_date': '', 'character': None},
+    ]}
+
+    def test_credits_are_cached_trimmed_and_revalidated_by_etag(self):
+        with mock.patch('services.tmdb.make_conditional_tmdb_request', return_value=(self.CREDITS, '"v1"')) as request:
+            first = tmdb.get_movies_by_actor(42)
+            self.assertEqual(tmdb.get_movies_by_actor(42), first)
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual([movie['id'] for movie in first], [3, 7])
+        self.assertEqual(set(first[1]), {'id', 'title', 'release_date', 'character', 'genre_ids'})
+
+        with self.settings(ACTOR_CREDITS_REVALIDATE_AFTER=0):
+            with mock.patch('services.tmdb.make_conditional_tmdb_request', return_value=(None, '"v1"')) as request:
+                revalidated = tmdb.get_movies_by_actor(42)
+
+        self.assertEqual(request.call_args.kwargs['etag'], '"v1"')
+        self.assertEqual(revalidated, first)
+
+    def test_not_modified_response_skips_the_body(self):
+        response = mock.Mock(status_code=304)
+        session = mock.Mock(request=mock.Mock(return_value=response))
+        with mock.patch('services.utils.get_session', return_value=session), mock.patch('services.rate_limit.get_limiter', return_value=None):
+            data, etag = make_conditional_tmdb_request('https://example.org/credits', {}, etag='"v1"')
+
+        self.assertEqual((data, etag), (None, '"v1"'))
+        self.assertEqual(session.request.call_args.kwargs['headers']['If-None-Match'], '"v1"')
+        response.json.assert_not_called()
+
+
+class IncrementalPairRefreshTests(ServiceTestCase):
+
+    def _expire_pair(self, actor1_id, actor2_id):
+        key = cache_manager._get_cache_key(actor1_id, actor2_id)
+        data, _ = cache_manager.get_backend().get(key)
+        cache_manager.get_backend().set(key, data, stored_at=time.time() - 3 * 24 * 60 * 60)
+
+    def test_expired_pair_only_fetches_newly_common_movies(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            movies, _, _ = tmdb.find_common_movies('Actor 100', 'Actor 101')
+        self.assertEqual([movie['id'] for movie in movies], [2, 3, 4])
+
+        self._expire_pair(100, 101)
+        filmographies = {**FILMOGRAPHIES, 100: [1, 2, 3, 4, 6], 101: [2, 3, 4, 6]}
+        with mock.patch.dict(FILMOGRAPHIES, filmographies), self.settings(ACTOR_CREDITS_REVALIDATE_AFTER=0):
+            with patch_tmdb(fake_tmdb_request(latency=0)) as request:
+                movies, _, _ = tmdb.find_common_movies('Actor 100', 'Actor 101')
+
+        self.assertEqual([movie['id'] for movie in movies], [2, 3, 4, 6])
+        movie_urls = [call.kwargs['url'] for call in request.call_args_list if '/movie/' in call.kwargs['url']]
+        self.assertEqual(movie_urls, ['https://api.themoviedb.org/3/movie/6'])
+
+    def test_unchanged_credits_reuse_the_whole_pair(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            tmdb.find_common_movies('Actor 100', 'Actor 101')
+        self._expire_pair(100, 101)
+
+        with patch_tmdb() as request:
+            movies, _, _ = tmdb.find_common_movies('Actor 100', 'Actor 101')
+
+        request.assert_not_called()
+        self.assertEqual([movie['id'] for movie in movies], [2, 3, 4])
+
+    def test_reversed_request_keeps_each_actor_role(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            tmdb.find_common_movies('Actor 101', 'Actor 100')
+        self._expire_pair(100, 101)
+
+        with patch_tmdb() as request:
+            movies, _, _ = tmdb.find_common_movies('Actor 100', 'Actor 101')
+
+        request.assert_not_called()
+        self.assertEqual({movie['id']: movie['characters'] for movie in movies}, {
+            movie_id: {'Actor 100': 'Role 100', 'Actor 101': 'Role 101'} for movie_id in (2, 3, 4)
+        })
+        self.assertEqual(cache_manager.get_any(100, 101)['deps']['actors'], [100, 101])
+
+    async def test_async_reversed_request_keeps_each_actor_role(self):
+        with patch_async_tmdb(fake_async_tmdb_request(latency=0)):
+            await tmdb_async.find_common_movies('Actor 101', 'Actor 100')
+        await sync_to_async(self._expire_pair)(100, 101)
+
+        with patch_async_tmdb(fake_async_tmdb_request(latency=0)) as request:
+            movies, _, _ = await tmdb_async.find_common_movies('Actor 100', 'Actor 101')
+
+        self.assertFalse([c for c in request.call_args_list if '/movie/' in c.kwargs['url']])
+        self.assertEqual({movie['id']: movie['characters'] for movie in movies}, {
+            movie_id: {'Actor 100': 'Role 100', 'Actor 101': 'Role 101'} for movie_id in (2, 3, 4)
+        })
+
+
+class PairCacheStorageTests(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = f"{tmp_dir.name}/pairs.sqlite3"
+        overrides = self.settings(PAIR_CACHE_BACKEND='services.pair_cache.SQLitePairCache', PAIR_CACHE_OPTIONS={'path': self.path})
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(cache_manager.reset_backend)
+        cache_manager.reset_backend()
+
+    def test_movies_shared_by_pairs_are_stored_once_and_resolved_on_read(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            computed, _, _ = tmdb.find_common_movies('Actor 100', 'Actor 101')
+            tmdb.find_common_movies('Actor 100', 'Actor 102')
+
+        with contextlib.closing(sqlite3.connect(self.path)) as conn:
+            movie_ids = [row[0] for row in conn.execute("SELECT movie_id FROM pair_cache_movies ORDER BY movie_id")]
+        stored, _ = cache_manager.get_backend().get('100_101')
+        self.assertEqual(movie_ids, [2, 3, 4])
+        self.assertNotIn('results', stored)
+        self.assertEqual((stored['character_names'], stored['movie_refs'][0]), (['Actor 100', 'Actor 101'], [2, 'Role 100', 'Role 101']))
+        # Les rôles ne sont stockés que dans movie_refs, les dépendances ne gardent que les IDs des films.
+        self.assertEqual(set(stored['deps']), {'actors', 'credits', 'movies'})
+        self.assertEqual(set(stored['deps']['movies']), {'2', '3', '4'})
+        self.assertEqual(cache_manager.get_from_cache(100, 101)['results'], computed)
+
+    def _payload(self, *movie_ids):
+        return {'results': [{'id': movie_id, 'title': f'Film {movie_id}', 'characters': {'A': 'a', 'B': 'b'}} for movie_id in movie_ids]}
+
+    def test_sweep_removes_expired_entries_and_movies_no_longer_referenced(self):
+        expired_at = time.time() - cache_manager.CACHE_DURATION.total_seconds() - 10
+        cache_manager.set_entries([('1_2', self._payload(7, 8), expired_at), ('3_4', self._payload(8, 9), None)])
+
+        with self.settings(PAIR_CACHE_STALE_TTL=0):
+            self.assertEqual(cache_manager.sweep_expired(), 1)
+
+        self.assertIsNone(cache_manager.get_any(1, 2))
+        self.assertEqual(cache_manager.get_any(3, 4), self._payload(8, 9))
+        # Le film 8 était réécrit par l'entrée récente : seul le film 7 part avec l'entrée expirée.
+        self.assertEqual(set(cache_manager.get_backend().get_movies([7, 8, 9])), {8, 9})
+
+    def test_legacy_json_cache_import_keeps_original_timestamps(self):
+        recent = datetime.now(timezone.utc).replace(microsecond=0)
+        legacy = {
+            '1_2': {**self._payload(7), 'timestamp': '2020-01-01T00:00:00Z'},
+            '3_4': {**self._payload(8), 'timestamp': recent.isoformat()},
+        }
+        json_path = Path(self.path).with_name('api_cache.json')
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(legacy, f)
+
+        self.assertEqual(cache_manager.import_json_cache(json_path), 2)
+
+        self.assertEqual(cache_manager.get_stored_at(1, 2), datetime(2020, 1, 1, tzinfo=timezone.utc).timestamp())
+        self.assertEqual(cache_manager.get_stored_at(3, 4), recent.timestamp())
+        self.assertIsNone(cache_manager.get_from_cache(1, 2))
+        self.assertEqual(cache_manager.get_any(1, 2), self._payload(7))
+        self.assertEqual(cache_manager.get_from_cache(3, 4), self._payload(8))
+
+    def test_concurrent_readers_and_writers(self):
+        errors = []
+        incomplete = []
+
+        def write(worker):
+            try:
+                for index in range(50):
+                    # Films partagés entre les écrivains : chacun réécrit les mêmes fiches.
+                    cache_manager.set_entry((worker, 1000 + index), self._payload(index % 10, 100 + index))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                cache_manager.get_backend().close()
+
+        def read(worker):
+            try:
+                for index in range(200):
+                    entry = cache_manager.get_any(index % 4, 1000 + index % 50)
+                    if entry is not None and len(entry['results']) != 2:
+                        incomplete.append(entry)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                cache_manager.get_backend().close()
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        threads += [threading.Thread(target=read, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(incomplete, [])
+        # Fiches réécrites par les autres écrivains : l'entrée porte aussi un movies_version.
+        for worker in range(4):
+            for index in range(50):
+                self.assertEqual(
+                    cache_manager.get_any(worker, 1000 + index)['results'], self._payload(index % 10, 100 + index)['results']
+                )
+
+    def test_text_data_column_of_older_files_is_migrated_to_blob(self):
+        with contextlib.closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute("CREATE TABLE pair_cache (key TEXT PRIMARY KEY, data TEXT NOT NULL, stored_at REAL NOT NULL)")
+            conn.execute(
+                "INSERT INTO pair_cache (key, data, stored_at) VALUES (?, ?, ?)",
+                ('1_2', json.dumps({'results': [{'id': 99}]}), 123.0),
+            )
+
+        backend = cache_manager.get_backend()
+        with contextlib.closing(sqlite3.connect(self.path)) as conn:
+            columns = {column[1]: column[2] for column in conn.execute("PRAGMA table_info(pair_cache)")}
+        self.assertEqual(columns['data'], 'BLOB')
+        self.assertEqual(backend.get('1_2'), ({'results': [{'id': 99}]}, 123.0))
+
+    def test_legacy_json_rows_and_other_encodings_stay_readable(self):
+        backend = cache_manager.get_backend()
+        with contextlib.closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "INSERT INTO pair_cache (key, data, stored_at) VALUES (?, ?, ?)",
+                ('1_2', json.dumps({'results': [{'id': 99}]}), time.time()),
+            )
+        self.assertEqual(cache_manager.get_from_cache(1, 2), {'results': [{'id': 99}]})
+
+        value = {'results': [{'id': movie_id, 'title': f'Film {movie_id}'} for movie_id in range(50)]}
+        for codec in (PairCodec('json', compress_min_bytes=None), PairCodec('msgpack', compress_min_bytes=None), PairCodec()):
+            self.assertEqual(backend.codec.decode(codec.encode(value)), value)
+        with self.assertRaises(ValueError):
+            backend.codec.decode(b'X???')
+
+
+class PairWarmingTests(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        warming.reset_popularity()
+
+    def test_popularity_decays_over_time(self):
+        popularity = warming.PairPopularity(half_life=60, max_pairs=10)
+        for _ in range(4):
+            popularity.record(100, 'Actor 100', 101, 'Actor 101', now=0)
+        popularity.record(100, 'Actor 100', 102, 'Actor 102', now=120)
+        popularity.record(100, 'Actor 100', 102, 'Actor 102', now=120)
+
+        top = popularity.top(2, now=120)
+        self.assertEqual([(actor1_id, actor2_id) for _, actor1_id, _, actor2_id, _ in top], [(100, 102), (100, 101)])
+        self.assertAlmostEqual(top[1][0], 1.0)
+
+    def test_popular_pairs_are_recomputed_shortly_before_expiry(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            tmdb.find_common_movies('Actor 100', 'Actor 101')
+        cache.delete('internal_movie_2_details')
+        stored_at = cache_manager.get_stored_at(100, 101)
+
+        self.assertEqual(warming.warm_once(), 0)
+        almost_expired = stored_at + cache_manager.CACHE_DURATION.total_seconds() - 60
+        with mock.patch('services.rate_limit.lane', wraps=rate_limit.lane) as lane, patch_tmdb() as request:
+            self.assertEqual(warming.warm_once(now=almost_expired), 1)
+
+        # Filmographies et fiches encore valables : le recalcul ne coûte aucun appel TMDB.
+        request.assert_not_called()
+        lane.assert_called_once_with(rate_limit.BATCH)
+        self.assertGreater(cache_manager.get_stored_at(100, 101), stored_at)
+        self.assertEqual(cache.get('internal_movie_2_details')['title'], 'Film 2')
+
+    def test_actor_pairs_seed_the_warmer(self):
+        rows = [(100, 'Actor 100', 102, 'Actor 102')]
+        with mock.patch('api.models.ActorPair.objects.values_list', return_value=rows):
+            self.assertEqual(warming.seed_from_actor_pairs(), 1)
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            self.assertEqual(warming.warm_once(), 1)
+
+        self.assertEqual(cache_manager.get_from_cache(100, 102)['results'][0]['id'], 4)
+
+    def test_one_worker_warms_per_interval_from_shared_popularity(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            tmdb.find_common_movies('Actor 100', 'Actor 101')
+        cache_manager.get_backend().delete('100_101')
+
+        rows = [(100, 'Actor 100', 102, 'Actor 102')]
+        with mock.patch('api.models.ActorPair.objects.values_list', return_value=rows) as seed:
+            with patch_tmdb(fake_tmdb_request(latency=0)):
+                self.assertEqual(warming.run_cycle(interval=60), 2)
+            # Autre worker, même intervalle : il publie ses requêtes sans préchauffer ni recompter ActorPair.
+            warming.get_popularity().record(100, 'Actor 100', 102, 'Actor 102')
+            with patch_tmdb() as request:
+                self.assertEqual(warming.run_cycle(interval=60), 0)
+
+        request.assert_not_called()
+        seed.assert_called_once()
+        self.assertEqual(len(warming.get_popularity()), 0)
+        top = warming.get_shared_popularity().top(2)
+        self.assertEqual([(actor1_id, actor2_id) for _, actor1_id, _, actor2_id, _ in top], [(100, 102), (100, 101)])
+        self.assertAlmostEqual(top[0][0], 2.0, places=3)
+
+
+class AsyncCommonMoviesTests(ServiceTestCase):
+
+    async def test_async_find_common_movies_runs_calls_concurrently(self):
+        with patch_async_tmdb(fake_async_tmdb_request(latency=0.2, failing_ids={12})):
+            start = time.monotonic()
+            movies, actor1_info, _ = await tmdb_async.find_common_movies('Robert De Niro', 'Joe Pesci')
+            elapsed = time.monotonic() - start
+
+        self.assertEqual([movie['id'] for movie in movies], [10, 11, 13, 14, 15, 16, 17])
+        self.assertEqual(actor1_info['id'], 1)
+        self.assertLess(elapsed, 0.8)
+
+    async def test_async_view_matches_sync_payload(self):
+        request = RequestFactory().get('/api/common-movies/', {'actor1': 'Robert De Niro', 'actor2': 'Joe Pesci'})
+        with patch_async_tmdb(fake_async_tmdb_request(latency=0)):
+            response = await common_movies_async_view(request)
+
+        payload = json.loads(response.content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(payload['results']), 8)
+        self.assertEqual(set(payload), {'results', 'actor1_image', 'actor2_image', 'actor1_imdb', 'actor2_imdb'})
+
+
+class CommonMoviesResponseTests(ServiceTestCase):
+
+    def _get(self, **headers):
+        params = headers.pop('params', {})
+        request = RequestFactory().get(
+            '/api/common-movies/', {'actor1': 'Robert De Niro', 'actor2': 'Joe Pesci', **params}, headers=headers
+        )
+        return common_movies_view(request)
+
+    def test_cached_pair_is_served_from_serialized_bytes_with_etag(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            first = self._get()
+            with mock.patch('services.responses.dumps') as dumps:
+                second = self._get()
+
+        dumps.assert_not_called()
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(len(json.loads(first.content)['results']), 8)
+
+    def test_shared_movie_update_changes_body_and_etag(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            first = self._get()
+            # Une autre paire réécrit la fiche partagée du film 10, sans recalculer celle-ci.
+            details = {**cache_manager.get_movie(10), 'title': 'Titre corrigé'}
+            cache_manager.get_backend().set_movies([(10, details, time.time() + 1)])
+            second = self._get()
+
+        titles = {movie['id']: movie['title'] for movie in json.loads(second.content)['results']}
+        self.assertEqual(titles[10], 'Titre corrigé')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_actor_image_change_changes_body_and_etag(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            first = self._get()
+            cache_key = tmdb._actor_info_cache_key('Robert De Niro')
+            cache.set(cache_key, {**cache.get(cache_key), 'image_path': '/nouvelle.jpg'})
+            second = self._get()
+
+        self.assertEqual(json.loads(second.content)['actor1_image'], '/nouvelle.jpg')
+        self.assertNotEqual(first['ETag'], second['ETag'])
+
+    def test_matching_if_none_match_returns_304(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            etag = self._get()['ETag']
+            response = self._get(if_none_match=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_fields_parameter_selects_movie_fields(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            response = self._get(params={'fields': 'title'})
+            invalid = self._get(params={'fields': 'title,budget'})
+
+        movie = json.loads(response.content)['results'][0]
+        self.assertEqual(set(movie), {'id', 'title'})
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_large_responses_are_gzipped(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)), self.settings(COMMON_MOVIES_COMPRESS_MIN_BYTES=100):
+            plain = self._get()
+            compressed = self._get(accept_encoding='gzip')
+
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+
+
+class SingleFlightTests(ServiceTestCase):
+
+    def test_concurrent_misses_compute_the_pair_once(self):
+        results = []
+        with patch_tmdb(fake_tmdb_request(latency=0.1)) as request:
+            threads = [
+                threading.Thread(target=lambda: results.append(tmdb.find_common_movies('Robert De Niro', 'Joe Pesci')[0]))
+                for _ in range(10)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        movie_urls = [c.kwargs['url'] for c in request.call_args_list if '/movie/' in c.kwargs['url']]
+        self.assertEqual(len(movie_urls), len(set(movie_urls)))
+        self.assertEqual([len(movies) for movies in results], [8] * 10)
+
+    @override_settings(PAIR_CACHE_STALE_WHILE_REVALIDATE=True, PAIR_CACHE_STALE_TTL=3600)
+    def test_stale_entry_is_served_while_one_refresh_runs(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            actor1_info = tmdb.get_actor_info('Robert De Niro')
+            actor2_info = tmdb.get_actor_info('Joe Pesci')
+        expired_at = time.time() - cache_manager.CACHE_DURATION.total_seconds() - 60
+        cache_manager.get_backend().set('1_2', {'results': [{'id': 99}]}, stored_at=expired_at)
+
+        with patch_tmdb(fake_tmdb_request(latency=0.2)):
+            movies, _, _ = tmdb.find_common_movies('Robert De Niro', 'Joe Pesci')
+            self.assertEqual(movies, [{'id': 99}])
+            tmdb.find_common_movies('Robert De Niro', 'Joe Pesci')
+            self.assertTrue(tmdb._pair_flight.in_flight('1_2'))
+            refreshed = singleflight_wait(lambda: cache_manager.get_from_cache(actor1_info['id'], actor2_info['id']))
+
+        self.assertEqual(len(refreshed['results']), 8)
+
+    def test_background_refresh_is_registered_before_its_thread_starts(self):
+        flight = singleflight.SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def refresh():
+            calls.append(1)
+            release.wait(2)
+            return 'ok'
+
+        with mock.patch.object(threading.Thread, 'start', autospec=True, side_effect=threading.Thread.start) as start:
+            self.assertTrue(flight.do_in_background('k', refresh))
+            # Clé déjà réservée à la sortie de l'appel : un second appelant ne lance rien.
+            self.assertTrue(flight.in_flight('k'))
+            self.assertFalse(flight.do_in_background('k', refresh))
+            self.assertEqual(start.call_count, 1)
+
+            # Un appel synchrone rejoint le rafraîchissement en cours.
+            waiter = threading.Thread(target=lambda: calls.append(flight.do('k', refresh)))
+            waiter.start()
+            release.set()
+            waiter.join(2)
+
+        self.assertEqual(calls, [1, 'ok'])
+        self.assertFalse(flight.in_flight('k'))
+
+
+def singleflight_wait(fetch, timeout=2):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = fetch()
+        if value:
+            return value
+        time.sleep(0.02)
+    return None
+
+
+class InstrumentationTests(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        instrumentation.registry.reset()
+
+    def _get(self):
+        return self.client.get('/api/common-movies/', {'actor1': 'Robert De Niro', 'actor2': 'Joe Pesci'})
+
+    def test_server_timing_reports_stages_with_cache_tags(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            cold = self._get()['Server-Timing']
+            warm = self._get()['Server-Timing']
+
+        self.assertIn('pair_cache;desc="cache=miss"', cold)
+        self.assertIn('movie_details;desc="cache=miss"', cold)
+        self.assertIn('credits;desc="cache=miss x2"', cold)
+        self.assertIn('actor_info;desc="cache=hit x2"', warm)
+        self.assertIn('pair_cache;desc="cache=hit"', warm)
+        self.assertNotIn('tmdb_request', warm)
+
+    def test_metrics_endpoint_exposes_histograms(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            self._get()
+        with mock.patch('services.utils.get_session') as get_session:
+            get_session.return_value.request.return_value.json.return_value = {'imdb_id': None}
+            make_tmdb_request_sync('https://api.themoviedb.org/3/person/42/external_ids', {})
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn('# TYPE screenpairs_pair_cache_seconds histogram', body)
+        self.assertIn('screenpairs_pair_cache_seconds_count{cache="miss"} 1', body)
+        self.assertIn('screenpairs_tmdb_request_seconds_count{endpoint="person/external_ids",outcome="ok"} 1', body)
+        self.assertIn('screenpairs_request_seconds_count{status="200",view="common-movies"} 1', body)
+        self.assertIn('screenpairs_tmdb_rate_waiting{lane="batch"} 0', body)
+
+    def test_sampled_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.settings(REQUEST_PROFILING_SAMPLE_RATE=1.0, REQUEST_PROFILING_DIR=directory):
+                with patch_tmdb(fake_tmdb_request(latency=0)):
+                    self._get()
+            profiles = list(Path(directory).glob('*.prof'))
+
+        self.assertEqual(len(profiles), 1)
+
+
+class ActorAutocompleteTests(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.index = ActorPrefixIndex()
+        self.get_index = autocomplete.get_index
+        patcher = mock.patch('services.autocomplete.get_index', return_value=self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefix_index_folds_accents_and_matches_last_names(self):
+        self.index.add(1, 'Robert De Niro', popularity=10)
+        self.index.add(2, 'Penélope Cruz', popularity=30)
+        self.index.add(3, 'Robert Downey Jr.', popularity=50)
+
+        self.assertEqual([actor['id'] for actor in self.index.search('rob')], [3, 1])
+        self.assertEqual([actor['id'] for actor in self.index.search('PENELO')], [2])
+        self.assertEqual([actor['id'] for actor in self.index.search('niro')], [1])
+
+    def test_short_prefixes_answer_from_the_most_popular_actors(self):
+        index = ActorPrefixIndex(short_prefix_top=3)
+        for actor_id in range(10):
+            index.add(actor_id, f'Robert Actor{actor_id}', popularity=actor_id)
+        index.add(4, 'Robert Actor4', popularity=100)
+        index.add(9, 'Zoe Actor9', popularity=9)
+
+        self.assertEqual([actor['id'] for actor in index.search('r', limit=2)], [4, 8])
+        self.assertEqual([actor['id'] for actor in index.search('z')], [9])
+        self.assertEqual([actor['id'] for actor in index.search('rob', limit=3)], [4, 8, 7])
+
+    def test_failed_seed_is_retried_instead_of_marking_the_index_seeded(self):
+        autocomplete.reset_index()
+        self.addCleanup(autocomplete.reset_index)
+        with mock.patch('services.autocomplete.seed_from_actor_pairs', side_effect=[None, 2]) as seed:
+            self.get_index()
+            self.assertFalse(autocomplete.is_seeded())
+            self.get_index()
+            with mock.patch('services.autocomplete.SEED_RETRY_INTERVAL', 0):
+                self.get_index()
+            self.get_index(seed=False)
+
+        self.assertTrue(autocomplete.is_seeded())
+        self.assertEqual(seed.call_count, 2)
+
+    @override_settings(AUTOCOMPLETE_MIN_LOCAL_RESULTS=1)
+    def test_local_results_skip_tmdb(self):
+        self.index.add(1, 'Robert De Niro', popularity=10)
+        with patch_tmdb() as request:
+            results = tmdb.search_actors('robert de')
+
+        self.assertEqual([actor['name'] for actor in results], ['Robert De Niro'])
+        request.assert_not_called()
+
+    def test_tmdb_fallback_is_cached_per_prefix_and_indexed(self):
+        tmdb_response = {'results': [{'id': 7, 'name': 'Meg Ryan', 'popularity': 20}]}
+        with patch_tmdb(return_value=tmdb_response) as request:
+            first = tmdb.search_actors('Meg R')
+            second = tmdb.search_actors(' meg r ')
+
+        self.assertEqual(first, second)
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual([actor['id'] for actor in self.index.search('ryan')], [7])
+
+
+class BenchmarkToolsTests(SimpleTestCase):
+
+    def test_fake_tmdb_server_serves_search_and_revalidates_credits(self):
+        catalog = build_catalog([('Anna One', 'Bob Two')], extra_actors=5, movies=100)
+        with FakeTMDBServer(catalog) as server, self.settings(TMDB_API_BASE_URL=server.base_url), \
+                mock.patch('services.rate_limit.get_limiter', return_value=None):
+            results = make_tmdb_request_sync(f'{TMDB_BASE_URL}/search/person', {}, params={'query': 'anna one'})['results']
+            url = f"{TMDB_BASE_URL}/person/{results[0]['id']}/movie_credits"
+            credits, etag = make_conditional_tmdb_request(url, {})
+            revalidated = make_conditional_tmdb_request(url, {}, etag=etag)
+
+            self.assertEqual(server.calls, {'search/person': 1, 'person/movie_credits': 2})
+        self.assertEqual([actor['name'] for actor in results], ['Anna One'])
+        self.assertEqual({movie['id'] for movie in credits['cast']}, set(catalog['credits'][results[0]['id']]))
+        self.assertEqual(revalidated, (None, etag))
+
+    def test_percentile_uses_nearest_rank(self):
+        values = [0.5, 0.1, 0.4, 0.2, 0.3]
+        self.assertEqual(percentile(values, 50), 0.3)
+        self.assertEqual(percentile(values, 99), 0.5)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_compare_to_baseline_flags_only_regressions_beyond_tolerance(self):
+        baseline = {'cold_cache': {'p95_ms': 100.0, 'requests_per_second': 50.0, 'upstream_per_request': 2.0}}
+        close = {'cold_cache': {'p95_ms': 120.0, 'requests_per_second': 40.0, 'upstream_per_request': 2.4}}
+        worse = {'cold_cache': {'p95_ms': 200.0, 'requests_per_second': 20.0, 'upstream_per_request': 3.0}}
+
+        self.assertEqual(compare_to_baseline(close, baseline), [])
+        self.assertEqual(len(compare_to_baseline(worse, baseline)), 3)
+        self.assertEqual(compare_to_baseline({'batch_ingestion': worse['cold_cache']}, baseline), [])
+
+
+TIERED_CACHES = {
+    'default': {'BACKEND': 'services.tiered_cache.TieredCache', 'LOCATION': 'worker-a', 'OPTIONS': {'INVALIDATION_POLL_INTERVAL': 0}},
+    'worker_b': {'BACKEND': 'services.tiered_cache.TieredCache', 'LOCATION': 'worker-b', 'OPTIONS': {'INVALIDATION_POLL_INTERVAL': 0}},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tiered-tests'},
+}
+
+
+@override_settings(CACHES=TIERED_CACHES)
+class TieredCacheTests(SimpleTestCase):
+    """Deux ``TieredCache`` de LOCATION différentes simulent deux workers partageant le même L2."""
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['worker_b'].clear()
+        self.worker_a = caches['default']
+        self.worker_b = caches['worker_b']
+
+    def test_second_read_is_served_from_l1(self):
+        before = self.worker_b.stats()
+        self.worker_a.set('movie', {'title': 'Film 1'})
+        self.assertEqual(self.worker_b.get('movie'), {'title': 'Film 1'})
+        self.assertEqual(self.worker_b.get('movie'), {'title': 'Film 1'})
+
+        after = self.worker_b.stats()
+        self.assertEqual(after['l1']['hits'] - before['l1']['hits'], 1)
+        self.assertEqual(after['l2']['hits'] - before['l2']['hits'], 1)
+
+    def test_writes_from_one_worker_invalidate_the_others(self):
+        self.worker_a.set('movie', 'v1')
+        self.assertEqual(self.worker_b.get('movie'), 'v1')
+
+        self.worker_a.set('movie', 'v2')
+        self.assertEqual(self.worker_b.get('movie'), 'v2')
+
+        self.worker_a.delete('movie')
+        self.assertIsNone(self.worker_b.get('movie'))
+
+    def test_lru_is_bounded(self):
+        store = LRUStore(max_entries=2)
+        for key in ('a', 'b', 'c'):
+            store.set(key, b'x', expires_at=time.time() + 60)
+
+        self.assertIsNone(store.get('a', time.time()))
+        self.assertEqual(store.stats()['l1']['evictions'], 1)
+
+
+class RateLimitTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.path = f"{self.tmp_dir.name}/bucket.sqlite3"
+
+    def test_shared_bucket_is_shared_between_instances(self):
+        worker_a = rate_limit.SharedTokenBucket(self.path, rate=1, burst=2)
+        worker_b = rate_limit.SharedTokenBucket(self.path, rate=1, burst=2)
+
+        self.assertEqual(worker_a.try_acquire(), 0)
+        self.assertEqual(worker_b.try_acquire(), 0)
+        self.assertGreater(worker_a.try_acquire(), 0)
+
+    def test_batch_lane_leaves_reserve_to_interactive_requests(self):
+        with self.settings(TMDB_RATE_LIMIT_SHARED_PATH=self.path, TMDB_RATE_BATCH_RESERVE=0.5,
+                           TMDB_RATE_MAX_WAIT={'interactive': 0.05, 'batch': 0.05}):
+            rate_limit.set_limiter(0.1, burst=2)
+            self.addCleanup(rate_limit.set_limiter, None)
+
+            rate_limit.acquire(rate_limit.BATCH)
+            with self.assertRaises(rate_limit.RateLimitTimeout):
+                rate_limit.acquire(rate_limit.BATCH)
+            rate_limit.acquire(rate_limit.INTERACTIVE)
+
+            stats = rate_limit.get_stats()
+        self.assertEqual(stats['waiting'], {'interactive': 0, 'batch': 0})
+        self.assertGreaterEqual(stats['timeouts']['batch'], 1)
+
+    def test_async_acquire_reads_the_shared_bucket_off_the_event_loop(self):
+        with self.settings(TMDB_RATE_LIMIT_SHARED_PATH=self.path):
+            rate_limit.set_limiter(10, burst=5)
+            self.addCleanup(rate_limit.set_limiter, None)
+            threads = []
+            try_acquire = rate_limit.SharedTokenBucket.try_acquire
+
+            def recording_try_acquire(bucket, *args, **kwargs):
+                threads.append(threading.current_thread())
+                return try_acquire(bucket, *args, **kwargs)
+
+            async def acquire_both():
+                await rate_limit.async_acquire()
+                return await rate_limit.async_try_acquire()
+
+            with mock.patch.object(rate_limit.SharedTokenBucket, 'try_acquire', recording_try_acquire):
+                self.assertTrue(asyncio.run(acquire_both()))
+            metrics = rate_limit.render_prometheus()
+
+        self.assertEqual(len(threads), 2)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertIn('screenpairs_tmdb_rate_waiting{lane="interactive"} 0', metrics)
+        self.assertRegex(metrics, r'screenpairs_tmdb_rate_tokens 3(\.\d+)?\n')
+
+
+class HTTPSessionTests(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        utils.reset_session()
+        self.addCleanup(utils.reset_session)
+        rate_limit.set_limiter(None)
+        self.addCleanup(rate_limit.reset_limiter)
+
+    def test_session_adapter_retries_transient_errors_and_honours_retry_after(self):
+        http_settings = {'RETRIES': 3, 'BACKOFF_FACTOR': 0.5, 'POOL_SIZE': 7}
+        with self.settings(TMDB_HTTP=http_settings), mock.patch('services.utils.TMDBAdapter', wraps=utils.TMDBAdapter) as adapter:
+            session = utils.get_session()
+
+        adapter.assert_called_once()
+        kwargs = adapter.call_args.kwargs
+        retry = kwargs['max_retries']
+        self.assertEqual(kwargs['pool_maxsize'], 7)
+        self.assertIsInstance(retry, utils.RateLimitedRetry)
+        self.assertEqual((retry.total, retry.status, retry.backoff_factor), (3, 3, 0.5))
+        self.assertEqual(set(retry.status_forcelist), {429, 500, 502, 503, 504})
+        self.assertEqual(retry.allowed_methods, frozenset({'GET', 'HEAD'}))
+        self.assertTrue(retry.respect_retry_after_header)
+        self.assertFalse(retry.raise_on_status)
+        self.assertIsInstance(session.get_adapter('https://api.themoviedb.org/3/'), utils.TMDBAdapter)
+
+        # Une réponse 429 avec Retry-After : attente demandée par TMDB, puis un jeton pour la nouvelle tentative.
+        response = mock.Mock(status=429, headers={'Retry-After': '2'})
+        with mock.patch('urllib3.util.retry.time.sleep') as sleep, mock.patch('services.rate_limit.acquire') as acquire:
+            retry.sleep(response)
+        sleep.assert_called_once_with(2.0)
+        acquire.assert_called_once_with()
+
+    def test_final_429_penalizes_the_rate_limiter(self):
+        response = mock.Mock(status_code=429, headers={'Retry-After': '3'})
+        response.raise_for_status.side_effect = requests.HTTPError(response=response)
+        session = mock.Mock(request=mock.Mock(return_value=response))
+        with mock.patch('services.utils.get_session', return_value=session), \
+                mock.patch('services.rate_limit.penalize') as penalize:
+            with self.assertRaises(TMDBServiceError):
+                make_tmdb_request_sync('https://api.themoviedb.org/3/person/42', {})
+
+        penalize.assert_called_once_with(3.0)
+        config = utils.get_http_config()
+        self.assertEqual(utils._retry_delay(mock.Mock(headers={'Retry-After': '4'}), 0, config), 4.0)
+        self.assertEqual(utils._retry_delay(mock.Mock(headers={'Retry-After': '600'}), 0, config), config['BACKOFF_MAX'])
+
+    def test_pool_counters_show_reused_connections(self):
+        catalog = build_catalog([('Anna One', 'Bob Two')], extra_actors=5, movies=100)
+        with FakeTMDBServer(catalog) as server, self.settings(TMDB_API_BASE_URL=server.base_url):
+            for name in ('anna one', 'bob two', 'anna one'):
+                make_tmdb_request_sync(f'{TMDB_BASE_URL}/search/person', {}, params={'query': name})
+            stats = utils.get_http_stats()
+
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual((stats['new_connections'], stats['reused_connections']), (1, 2))
+
+    @skipUnless(hasattr(os, 'fork'), "os.fork indisponible")
+    def test_forked_child_builds_its_own_session(self):
+        parent_session = utils.get_session()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(read_end)
+                fresh = utils._session is None and utils.get_session() is not parent_session
+                os.write(write_end, b'1' if fresh else b'0')
+            finally:
+                os._exit(0)
+        os.close(write_end)
+        with os.fdopen(read_end, 'rb') as pipe:
+            result = pipe.read()
+        os.waitpid(pid, 0)
+
+        self.assertEqual(result, b'1')
+        self.assertIs(utils.get_session(), parent_session)
+
+
+class OfflineIndexTests(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.addCleanup(offline_index.reset_index)
+        files = {
+            'persons': [
+                {'id': 1, 'name': 'Robert De Niro', 'popularity': 50, 'profile_path': '/rdn.jpg', 'imdb_id': 'nm0000134'},
+                {'id': 2, 'name': 'Joe Pesci', 'popularity': 30},
+                {'id': 3, 'name': 'Robert Deniro', 'popularity': 1},
+            ],
+            'movies': [
+                {'id': 10, 'title': 'Goodfellas', 'release_date': '1990-09-12', 'genres': [{'id': 80, 'name': 'Crime'}],
+                 'imdb_id': 'tt0099685', 'directors': ['Martin Scorsese']},
+                {'id': 11, 'title': 'Casino', 'release_date': '1995-11-22', 'genre_ids': [80]},
+                {'id': 12, 'title': 'Heat', 'release_date': '1995-12-15'},
+            ],
+            'credits': [
+                {'person_id': 2, 'movie_id': 10, 'character': 'Tommy', 'order': 2},
+                {'person_id': 1, 'movie_id': 10, 'character': 'Jimmy', 'order': 1},
+                {'person_id': 1, 'movie_id': 11, 'character': 'Ace', 'order': 0},
+                {'person_id': 1, 'movie_id': 11, 'character': 'Narrator', 'order': 5},
+                {'person_id': 2, 'movie_id': 11, 'character': 'Nicky', 'order': 1},
+                {'person_id': 1, 'movie_id': 12, 'character': 'McCauley', 'order': 0},
+                {'person_id': 99, 'movie_id': 12, 'character': 'Unknown', 'order': 1},
+            ],
+        }
+        paths = []
+        for name, rows in files.items():
+            path = f"{self.tmp_dir.name}/{name}.jsonl.gz"
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                f.writelines(json.dumps(row) + '\n' for row in rows)
+            paths.append(path)
+        self.index_path = f"{self.tmp_dir.name}/index.bin"
+        call_command('import_tmdb_dump', *paths, output=self.index_path, stdout=io.StringIO())
+
+    def test_offline_mode_answers_from_the_index_without_tmdb(self):
+        with self.settings(TMDB_DATA_MODE='offline', OFFLINE_INDEX_PATH=self.index_path, CREDITS_INDEX_ENABLED=True):
+            with patch_tmdb() as request:
+                movies, actor1_info, _ = tmdb.find_common_movies('robert de niro', 'Joe Pesci')
+                self.assertIsNone(tmdb.get_actor_info('Al Pacino'))
+                suggestions = tmdb.search_actors('robert de')
+                cast = tmdb.get_movie_cast(11)
+            with self.assertRaises(TMDBServiceError):
+                make_tmdb_request_sync(url=f"{TMDB_BASE_URL}/search/person", headers={})
+
+        request.assert_not_called()
+        self.assertEqual(actor1_info['imdb_url'], 'https://www.imdb.com/name/nm0000134/')
+        self.assertEqual([movie['title'] for movie in movies], ['Goodfellas', 'Casino'])
+        self.assertEqual(movies[0]['directors'], ['Martin Scorsese'])
+        self.assertEqual(movies[1]['characters'], {'robert de niro': 'Ace / Narrator', 'Joe Pesci': 'Nicky'})
+        self.assertEqual([actor['id'] for actor in suggestions], [1, 3])
+        self.assertEqual(cast, [(1, 'Robert De Niro'), (2, 'Joe Pesci')])
+
+    def test_local_first_falls_back_to_tmdb_for_unknown_actors(self):
+        with self.settings(TMDB_DATA_MODE='local_first', OFFLINE_INDEX_PATH=self.index_path):
+            with patch_tmdb(fake_tmdb_request(latency=0)) as request:
+                local_info = tmdb.get_actor_info('Robert De Niro')
+                remote_info = tmdb.get_actor_info('Actor 100')
+
+        self.assertEqual(local_info['id'], 1)
+        self.assertEqual(remote_info['id'], 100)
+        queries = [(call.kwargs.get('params') or {}).get('query') for call in request.call_args_list]
+        self.assertEqual([query for query in queries if query], ['Actor 100'])
+
+    def test_missing_index_or_remote_mode_leaves_tmdb_in_charge(self):
+        for mode, path in (('remote', self.index_path), ('local_first', f"{self.tmp_dir.name}/missing.bin")):
+            offline_index.reset_index()
+            with self.settings(TMDB_DATA_MODE=mode, OFFLINE_INDEX_PATH=path):
+                self.assertIsNone(offline_index.get_index())
+                with patch_tmdb(fake_tmdb_request(latency=0)):
+                    self.assertEqual(tmdb.get_actor_info('Actor 101')['id'], 101)
+
+
+class ResilienceTests(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        catalog = build_catalog([('Anna One', 'Bob Two')], extra_actors=5, movies=100)
+        self.server = FakeTMDBServer(catalog).start()
+        self.addCleanup(self.server.stop)
+        overrides = self.settings(
+            TMDB_API_BASE_URL=self.server.base_url, TMDB_HTTP={'RETRIES': 0},
+            TMDB_CIRCUIT_FAILURE_THRESHOLD=3, TMDB_HEDGE_MIN_SAMPLES=3, TMDB_HEDGE_MAX_RATIO=1,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        rate_limit.set_limiter(None)
+        self.addCleanup(rate_limit.reset_limiter)
+        utils.reset_session()
+        self.addCleanup(utils.reset_session)
+
+    def _search(self, name='anna one'):
+        return make_tmdb_request_sync(f'{TMDB_BASE_URL}/search/person', {}, params={'query': name})
+
+    def test_open_circuit_fails_fast_without_calling_tmdb(self):
+        self.server.inject('search/person', status=500)
+        for _ in range(3):
+            with self.assertRaises(TMDBServiceError):
+                self._search()
+        with self.assertRaises(TMDBCircuitOpenError):
+            self._search()
+
+        self.assertEqual(self.server.calls['search/person'], 3)
+        self.assertEqual(resilience.get_stats()['circuits'], {'search/person': resilience.OPEN})
+
+        # Après le délai, un appel d'essai réussi referme le disjoncteur.
+        self.server.clear_faults()
+        resilience.get_breaker('search/person').reset_timeout = 0
+        self.assertEqual(self._search()['results'][0]['name'], 'Anna One')
+        self.assertEqual(resilience.get_stats()['circuits'], {})
+
+    def test_slow_request_is_hedged_and_the_hedge_wins(self):
+        for _ in range(3):
+            self._search()
+        self.server.inject('search/person', delay=1.0, times=1)
+
+        start = time.perf_counter()
+        results = self._search()['results']
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(results[0]['name'], 'Anna One')
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(self.server.calls['search/person'], 5)
+        self.assertEqual(resilience.get_stats()['hedge_wins'], 1)
+
+    def test_urllib3_retries_take_a_rate_limit_token(self):
+        with self.settings(TMDB_HTTP={'RETRIES': 1, 'BACKOFF_FACTOR': 0, 'BACKOFF_JITTER': 0}):
+            utils.reset_session()
+            rate_limit.set_limiter(1000)
+            acquired = rate_limit.get_stats()['acquired'][rate_limit.INTERACTIVE]
+            self.server.inject('search/person', status=503, times=1)
+
+            self.assertEqual(self._search()['results'][0]['name'], 'Anna One')
+
+        self.assertEqual(self.server.calls['search/person'], 2)
+        self.assertEqual(rate_limit.get_stats()['acquired'][rate_limit.INTERACTIVE] - acquired, 2)
+
+    def test_primary_request_runs_on_the_calling_thread(self):
+        threads = []
+
+        def send():
+            threads.append(threading.current_thread())
+            return 'ok'
+
+        with mock.patch.object(resilience, '_get_executor') as get_executor:
+            for _ in range(5):
+                self.assertEqual(resilience.hedged('movie', send), 'ok')
+
+        # Réponses rapides : aucun doublon, donc rien ne passe par le pool.
+        self.assertEqual(threads, [threading.current_thread()] * 5)
+        get_executor.assert_not_called()
+
+    def test_last_known_movie_is_served_when_tmdb_fails(self):
+        movie_id = next(iter(self.server.catalog['movies']))
+        fresh = tmdb.fetch_common_movie_details(movie_id, 'A', 'B')
+        # La fiche de secours est celle du stockage des films, écrite avec la paire qui la référence.
+        cache_manager.set_entry((1, 2), {'results': [fresh]})
+        cache.delete(f"internal_movie_{movie_id}_details")
+        self.server.inject('movie', status=503)
+
+        with resilience.track_degraded() as degraded:
+            stale = tmdb.fetch_common_movie_details(movie_id, 'C', 'D')
+
+        self.assertEqual(stale['title'], fresh['title'])
+        self.assertEqual(stale['characters'], {'actor1_dynamic': 'C', 'actor2_dynamic': 'D'})
+        self.assertEqual(degraded, {'stale_movie'})
+
+    def test_expired_pair_is_served_with_degraded_header_when_computation_fails(self):
+        params = {'actor1': 'Anna One', 'actor2': 'Bob Two'}
+        first = self.client.get('/api/common-movies/', params)
+        self.assertNotIn('X-Degraded', first)
+
+        expired = mock.Mock(time=mock.Mock(return_value=time.time() + 10 ** 8))
+        with mock.patch('services.cache_manager.time', expired), \
+                mock.patch('services.tmdb._compute_pair', side_effect=TMDBServiceError('TMDB indisponible')):
+            stale = self.client.get('/api/common-movies/', params)
+
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(stale['X-Degraded'], 'stale_pair')
+        self.assertEqual(json.loads(stale.content)['results'], json.loads(first.content)['results'])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CREDITS_INDEX_TTL=3600)
+class CreditsIndexTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_common_movies_of_indexed_actors_need_no_tmdb_calls(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)) as request:
+            credits_index.ensure_actor_indexed(100, 'Actor 100')
+            credits_index.ensure_actor_indexed(101, 'Actor 101')
+        self.assertEqual(request.call_count, 2)
+
+        with patch_tmdb() as request:
+            fetch_args = credits_index.common_movie_fetch_args({'id': 101}, {'id': 100})
+
+        request.assert_not_called()
+        self.assertEqual(fetch_args, [(2, 'Role 101', 'Role 100'), (3, 'Role 101', 'Role 100'), (4, 'Role 101', 'Role 100')])
+
+    def test_top_costars_rank_by_shared_movies(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            for actor_id in FILMOGRAPHIES:
+                credits_index.ensure_actor_indexed(actor_id, f'Actor {actor_id}')
+
+        costars = credits_index.top_costars(100)
+
+        self.assertEqual([(c['id'], c['shared_movies']) for c in costars], [(101, 3), (102, 1)])
+
+    def test_costars_endpoint_ingests_on_first_request(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            credits_index.ensure_actor_indexed(101, 'Actor 101')
+            response = self.client.get('/api/actors/100/costars/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['id'], 101)
+        # Acteur demandé par son seul ID : son nom vient de la fiche TMDB, pas d'un nom vide.
+        self.assertEqual(response.json()['actor'], {'id': 100, 'name': 'Actor 100', 'profile_path': '/100.jpg'})
+        self.assertEqual(credits_index.top_costars(101)[0]['name'], 'Actor 100')
+
+    def test_costars_endpoint_names_actors_indexed_without_a_name(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            credits_index.ingest_credits(100, tmdb.get_movies_by_actor(100))
+            response = self.client.get('/api/actors/100/costars/')
+
+        self.assertEqual(response.json()['actor']['name'], 'Actor 100')
+        self.assertEqual(Actor.objects.get(id=100).name, 'Actor 100')
+
+    def test_costars_endpoint_maps_tmdb_errors(self):
+        not_found = TMDBNotFoundError("TMDB API returned HTTP error 404")
+        with patch_tmdb(side_effect=not_found):
+            self.assertEqual(self.client.get('/api/actors/999/costars/').status_code, 404)
+        with patch_tmdb(side_effect=TMDBServiceError("TMDB API returned HTTP error 503")):
+            self.assertEqual(self.client.get('/api/actors/999/costars/').status_code, 502)
+
+    def test_all_roles_of_a_movie_are_kept(self):
+        roles = [{'id': 1, 'title': 'Film 1', 'character': f'Role {index} ' + 'x' * 200} for index in range(5)]
+        credits_index.ingest_credits(100, roles)
+
+        self.assertEqual(credits_index.get_actor_credits(100)[0]['character'].count(' / '), 4)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IngestPairsCommandTests(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.csv_path = f"{self.tmp_dir.name}/pairs.csv"
+        with open(self.csv_path, 'w', encoding='utf-8') as f:
+            f.write("actor1,actor2\nActor 100,Actor 101\nActor 101,Actor 100\nActor 102,Actor 100\n")
+
+    def _run(self, batch_size=1):
+        call_command(
+            'ingest_pairs', self.csv_path, workers=4, rate=0, batch_size=batch_size, report_interval=60, stdout=io.StringIO(),
+        )
+
+    def test_pairs_are_deduplicated_and_upserted(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            self._run()
+
+        pairs = {(p.actor1_id, p.actor2_id): p for p in ActorPair.objects.all()}
+        self.assertEqual(set(pairs), {(100, 101), (100, 102)})
+        self.assertEqual(pairs[(100, 101)].common_movies_count, 3)
+        self.assertEqual(pairs[(100, 102)].common_movies, [{'id': 4, 'title': 'Film 4', 'release_date': ''}])
+        self.assertEqual(
+            sorted(PairMovie.objects.filter(pair=pairs[(100, 101)]).values_list('movie_id', flat=True)), [2, 3, 4]
+        )
+
+    def test_second_run_resumes_from_checkpoint(self):
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            self._run()
+        with patch_tmdb() as request:
+            self._run()
+
+        request.assert_not_called()
+        self.assertEqual(ActorPair.objects.count(), 2)
+
+    def test_aliases_of_the_same_pair_are_written_once_per_batch(self):
+        # « Actor 0101 » et « Actor 0100 » désignent les mêmes acteurs que « Actor 101 » et « Actor 100 ».
+        with open(self.csv_path, 'w', encoding='utf-8') as f:
+            f.write("Actor 100,Actor 101\nActor 0101,Actor 100\nActor 100,Actor 0100\n")
+
+        with patch_tmdb(fake_tmdb_request(latency=0)):
+            self._run(batch_size=10)
+
+        self.assertEqual(list(ActorPair.objects.values_list('actor1_id', 'actor2_id')), [(100, 101)])
+
+
+class ActorPairListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        pairs = []
+        for index, movies in enumerate([
+            [{'id': 1, 'title': 'Film 1', 'release_date': '1995-06-01'}],
+            [{'id': 1, 'title': 'Film 1', 'release_date': '1995-06-01'}, {'id': 2, 'title': 'Film 2', 'release_date': '2004-02-10'}],
+            [{'id': 3, 'title': 'Film 3', 'release_date': ''}],
+        ]):
+            pairs.append(ActorPair.objects.create(
+                actor1_id=index, actor2_id=100 + index, actor1_name=f'Actor {index}', actor2_name=f'Actor {100 + index}',
+                common_movies_count=len(movies), common_movies=movies,
+            ))
+        PairMovie.replace_for_pairs(pairs)
+        cls.pairs = pairs
+
+    def setUp(self):
+        actor_pairs.reset_cache()
+
+    def _ids(self, **params):
+        response = self.client.get('/api/pairs/', params)
+        self.assertEqual(response.status_code, 200)
+        return [pair['id'] for pair in response.json()['results']]
+
+    def test_filters_use_pair_movies_without_duplicating_pairs(self):
+        self.assertEqual(self._ids(movie_id=1), [self.pairs[0].id, self.pairs[1].id])
+        self.assertEqual(self._ids(released_after='2000-01-01'), [self.pairs[1].id])
+        self.assertEqual(self._ids(released_before='2010-01-01', min_count=2), [self.pairs[1].id])
+
+    def test_cursor_pagination_walks_all_pairs(self):
+        seen = []
+        response = self.client.get('/api/pairs/', {'page_size': 2})
+        while True:
+            data = response.json()
+            seen += [pair['id'] for pair in data['results']]
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+
+        self.assertEqual(seen, [pair.id for pair in self.pairs])
+
+    def test_invalid_filter_is_rejected(self):
+        self.assertEqual(self.client.get('/api/pairs/', {'released_after': 'hier'}).status_code, 400)
+
+    def test_list_costs_one_query_whatever_the_page_size(self):
+        for page_size in (1, 3):
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/pairs/', {'page_size': page_size, 'movie_id': 1})
+            self.assertEqual(response.status_code, 200)
+
+    def test_detail_and_lookup_are_read_through_cached(self):
+        pair = self.pairs[1]
+        with self.assertNumQueries(1):
+            first = self.client.get(f'/api/pairs/{pair.id}/')
+        with self.assertNumQueries(0):
+            second = self.client.get(f'/api/pairs/{pair.id}/')
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first.json()['common_movies_count'], 2)
+
+        with self.assertNumQueries(1):
+            by_actors = self.client.get(f'/api/pairs/actors/{pair.actor2_id}/{pair.actor1_id}/')
+        with self.assertNumQueries(0):
+            same_order = self.client.get(f'/api/pairs/actors/{pair.actor1_id}/{pair.actor2_id}/')
+        self.assertEqual(by_actors.json()['id'], pair.id)
+        self.assertEqual(same_order.json()['id'], pair.id)
+
+    def test_unknown_pair_is_not_found(self):
+        self.assertEqual(self.client.get('/api/pairs/999999/').status_code, 404)
+        self.assertEqual(self.client.get('/api/pairs/actors/1/2/').status_code, 404)
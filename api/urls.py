@@ -1,7 +1,29 @@
+from django.conf import settings
 from django.urls import path
-from .views import common_movies_view, actor_autocomplete
+from .views import (
+    common_movies_view, actor_autocomplete, actor_costars_view, actor_pairs_view,
+    actor_pair_detail_view, actor_pair_lookup_view, separation_view,
+    common_movies_batch_view, common_movies_group_view,
+    common_movies_async_view, actor_autocomplete_async,
+)
 
-urlpatterns = [
-    path('common-movies/', common_movies_view, name='common-movies'),
-    path('actor-autocomplete/', actor_autocomplete, name='actor-autocomplete'),
-]
\ No newline at end of file
+if getattr(settings, 'API_ASYNC_VIEWS', False):
+    urlpatterns = [
+        path('common-movies/', common_movies_async_view, name='common-movies'),
+        path('actor-autocomplete/', actor_autocomplete_async, name='actor-autocomplete'),
+    ]
+else:
+    urlpatterns = [
+        path('common-movies/', common_movies_view, name='common-movies'),
+        path('actor-autocomplete/', actor_autocomplete, name='actor-autocomplete'),
+    ]
+
+urlpatterns += [
+    path('common-movies/batch/', common_movies_batch_view, name='common-movies-batch'),
+    path('common-movies/group/', common_movies_group_view, name='common-movies-group'),
+    path('actors/<int:actor_id>/costars/', actor_costars_view, name='actor-costars'),
+    path('separation/', separation_view, name='separation'),
+    path('pairs/', actor_pairs_view, name='actor-pairs'),
+    path('pairs/<int:pair_id>/', actor_pair_detail_view, name='actor-pair-detail'),
+    path('pairs/actors/<int:actor1_id>/<int:actor2_id>/', actor_pair_lookup_view, name='actor-pair-lookup'),
+]
@@ -1,6 +1,29 @@
+from asgiref.sync import sync_to_async
+from django.db.models import Exists, OuterRef
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 from rest_framework.decorators import api_view
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
-from services.tmdb import find_common_movies, search_actors
+from api.models import ActorPair, PairMovie
+from services import actor_pairs, batch, credits_index, instrumentation, rate_limit, responses, separation, tmdb_async
+from services.utils import TMDBNotFoundError, TMDBServiceError, normalize_name
+from services.tmdb import get_actor_info, get_common_movies_payload, get_group_common_movies, search_actors
+
+MISSING_ACTORS_ERROR = 'Les deux noms d’acteurs doivent être fournis.'
+
+
+def _common_movies_payload(movies, actor1_info, actor2_info):
+    return {
+        'results': movies,
+        'actor1_image': actor1_info.get('image_path'),
+        'actor2_image': actor2_info.get('image_path'),
+        'actor1_imdb': actor1_info.get('imdb_url'),
+        'actor2_imdb': actor2_info.get('imdb_url'),
+    }
+
 
 @api_view(['GET'])
 def actor_autocomplete(request):
@@ -15,14 +38,227 @@ def common_movies_view(request):
     actor2 = request.GET.get('actor2')
 
     if not actor1 or not actor2:
-        return Response({'error': 'Les deux noms d’acteurs doivent être fournis.'}, status=400)
+        return Response({'error': MISSING_ACTORS_ERROR}, status=400)
+    try:
+        fields = responses.parse_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    payload, actor1_info, actor2_info = get_common_movies_payload(actor1, actor2)
+
+    # Corps déjà sérialisé (et compressé) depuis le cache, 304 si l'ETag du client correspond.
+    return responses.common_movies_response(request, payload, actor1_info, actor2_info, fields)
 
-    movies, actor1_info, actor2_info = find_common_movies(actor1, actor2)
 
+@api_view(['GET'])
+def common_movies_group_view(request):
+    """
+    Films communs à tous les acteurs ``?actor=A&actor=B&actor=C`` (de 2 à
+    ``COMMON_MOVIES_GROUP_MAX_ACTORS`` noms distincts). ``fields`` comme pour common-movies.
+    """
+    names = {}
+    for name in request.GET.getlist('actor'):
+        if name.strip():
+            names.setdefault(normalize_name(name), name)
+    max_actors = getattr(settings, 'COMMON_MOVIES_GROUP_MAX_ACTORS', 8)
+    if not 2 <= len(names) <= max_actors:
+        return Response({'error': f'Entre 2 et {max_actors} noms d’acteurs distincts doivent être fournis.'}, status=400)
+    try:
+        fields = responses.parse_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
+    movies, actors = get_group_common_movies(list(names.values()))
     return Response({
-        'results': movies,
-        'actor1_image': actor1_info.get('image_path'),
-        'actor2_image': actor2_info.get('image_path'),
-        'actor1_imdb': actor1_info.get('imdb_url'),
-        'actor2_imdb': actor2_info.get('imdb_url'),
-    })
\ No newline at end of file
+        'results': responses.select_fields(movies, fields),
+        'actors': [
+            {'query': name, 'id': info.get('id'), 'image': info.get('image_path'), 'imdb': info.get('imdb_url')}
+            for name, info in actors
+        ],
+    })
+
+
+@api_view(['POST'])
+def common_movies_batch_view(request):
+    """
+    Films communs pour plusieurs paires : ``{"pairs": [{"actor1": ..., "actor2": ...}, ...]}``.
+    Réponse NDJSON, une ligne par paire dès qu'elle est prête (``index`` = position dans la requête).
+    """
+    pairs = request.data.get('pairs') if isinstance(request.data, dict) else None
+    if not isinstance(pairs, list) or not pairs:
+        return Response({'error': 'Le champ pairs doit être une liste non vide.'}, status=400)
+
+    max_pairs = getattr(settings, 'COMMON_MOVIES_BATCH_MAX_PAIRS', 50)
+    if len(pairs) > max_pairs:
+        return Response({'error': f'Au plus {max_pairs} paires par requête.'}, status=400)
+
+    actor_pairs = []
+    for pair in pairs:
+        actor1 = pair.get('actor1') if isinstance(pair, dict) else None
+        actor2 = pair.get('actor2') if isinstance(pair, dict) else None
+        if not actor1 or not actor2 or not isinstance(actor1, str) or not isinstance(actor2, str):
+            return Response({'error': MISSING_ACTORS_ERROR}, status=400)
+        actor_pairs.append((actor1, actor2))
+
+    def lines():
+        for result in batch.iter_common_movies(actor_pairs, deadline=getattr(settings, 'COMMON_MOVIES_BATCH_DEADLINE', None)):
+            line = {
+                'index': result.index,
+                'actor1': result.actor1,
+                'actor2': result.actor2,
+                'complete': result.complete,
+                **_common_movies_payload(result.movies, result.actor1_info, result.actor2_info),
+            }
+            yield responses.dumps(line) + b'\n'
+
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
+@api_view(['GET'])
+def separation_view(request):
+    """
+    Plus courte chaîne acteur – film – acteur entre ``actor1`` et ``actor2``, en
+    au plus ``max_hops`` films (``SEPARATION_MAX_HOPS`` au maximum). ``status``
+    vaut ``found``, ``not_connected``, ``hop_limit`` ou ``call_budget``.
+    """
+    actor1 = request.GET.get('actor1')
+    actor2 = request.GET.get('actor2')
+    if not actor1 or not actor2:
+        return Response({'error': MISSING_ACTORS_ERROR}, status=400)
+    hop_limit = getattr(settings, 'SEPARATION_MAX_HOPS', 6)
+    try:
+        max_hops = int(request.GET.get('max_hops', hop_limit))
+    except ValueError:
+        return Response({'error': 'Le paramètre max_hops doit être un entier.'}, status=400)
+    if not 1 <= max_hops <= hop_limit:
+        return Response({'error': f'Le paramètre max_hops doit être compris entre 1 et {hop_limit}.'}, status=400)
+
+    actor1_info = get_actor_info(actor1)
+    actor2_info = get_actor_info(actor2)
+    if not actor1_info or not actor2_info:
+        return Response({'error': 'Acteur introuvable.'}, status=404)
+    return Response(separation.get_separation(actor1_info, actor2_info, max_hops=max_hops))
+
+
+@api_view(['GET'])
+def actor_costars_view(request, actor_id):
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 100)
+    except ValueError:
+        return Response({'error': 'Le paramètre limit doit être un entier.'}, status=400)
+
+    try:
+        actor = credits_index.ensure_actor_indexed(actor_id)
+    except TMDBNotFoundError:
+        return Response({'error': 'Acteur introuvable.'}, status=404)
+    except TMDBServiceError:
+        return Response({'error': 'Filmographie indisponible, TMDB ne répond pas.'}, status=502)
+    return Response({
+        'actor': {'id': actor.id, 'name': actor.name, 'profile_path': actor.profile_path},
+        'results': credits_index.top_costars(actor_id, limit=limit),
+    })
+
+
+class ActorPairPagination(CursorPagination):
+    # Pagination par curseur (WHERE id > ...) plutôt que par OFFSET : coût constant quelle que soit la page.
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+@api_view(['GET'])
+def actor_pairs_view(request):
+    """
+    Paires enregistrées, filtrables par film commun (``movie_id``), date de sortie
+    d'un film commun (``released_after`` / ``released_before``, AAAA-MM-JJ) et
+    nombre minimal de films communs (``min_count``).
+    """
+    pairs = ActorPair.objects.all()
+    movies = PairMovie.objects.filter(pair_id=OuterRef('pk'))
+    has_movie_filter = False
+
+    try:
+        if 'movie_id' in request.GET:
+            movies = movies.filter(movie_id=int(request.GET['movie_id']))
+            has_movie_filter = True
+        if 'min_count' in request.GET:
+            pairs = pairs.filter(common_movies_count__gte=int(request.GET['min_count']))
+    except ValueError:
+        return Response({'error': 'Les paramètres movie_id et min_count doivent être des entiers.'}, status=400)
+
+    for param, lookup in (('released_after', 'release_date__gte'), ('released_before', 'release_date__lte')):
+        if param in request.GET:
+            try:
+                value = parse_date(request.GET[param])
+            except ValueError:
+                value = None
+            if value is None:
+                return Response({'error': f'Le paramètre {param} doit être une date AAAA-MM-JJ.'}, status=400)
+            movies = movies.filter(**{lookup: value})
+            has_movie_filter = True
+
+    if has_movie_filter:
+        # EXISTS plutôt qu'une jointure : une paire n'apparaît qu'une fois même si plusieurs films correspondent.
+        pairs = pairs.filter(Exists(movies))
+
+    paginator = ActorPairPagination()
+    page = paginator.paginate_queryset(pairs, request)
+    # Une seule requête SQL par page : la réponse ne lit que les colonnes d'ActorPair.
+    return paginator.get_paginated_response([actor_pairs.pair_payload(pair) for pair in page])
+
+
+def _pair_response(body):
+    if body is None:
+        return Response({'error': 'Paire introuvable.'}, status=404)
+    return HttpResponse(body, content_type='application/json')
+
+
+@api_view(['GET'])
+def actor_pair_detail_view(request, pair_id):
+    return _pair_response(actor_pairs.get_pair_body(pair_id))
+
+
+@api_view(['GET'])
+def actor_pair_lookup_view(request, actor1_id, actor2_id):
+    """Paire des deux acteurs (IDs TMDB), dans un ordre ou l'autre."""
+    return _pair_response(actor_pairs.get_pair_body_by_actors(actor1_id, actor2_id))
+
+
+def metrics_view(request):
+    """Histogrammes de latence du processus et état du limiteur TMDB au format texte Prometheus."""
+    body = instrumentation.render_prometheus() + rate_limit.render_prometheus()
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Vues asynchrones (ASGI). DRF ne gère pas les vues async : on renvoie des JsonResponse Django.
+
+JSON_DUMPS_PARAMS = {'ensure_ascii': False}
+
+
+async def actor_autocomplete_async(request):
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    query = request.GET.get('query', '')
+    results = await tmdb_async.search_actors(query)
+    return JsonResponse({'results': results}, json_dumps_params=JSON_DUMPS_PARAMS)
+
+
+async def common_movies_async_view(request):
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+    actor1 = request.GET.get('actor1')
+    actor2 = request.GET.get('actor2')
+
+    if not actor1 or not actor2:
+        return JsonResponse({'error': MISSING_ACTORS_ERROR}, status=400, json_dumps_params=JSON_DUMPS_PARAMS)
+    try:
+        fields = responses.parse_fields(request.GET.get('fields'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400, json_dumps_params=JSON_DUMPS_PARAMS)
+
+    payload, actor1_info, actor2_info = await tmdb_async.get_common_movies_payload(actor1, actor2)
+
+    return await sync_to_async(responses.common_movies_response, thread_sensitive=False)(
+        request, payload, actor1_info, actor2_info, fields
+    )
@@ -0,0 +1,229 @@
+"""
+Faux serveur TMDB pour les benchmarks : sert ``search/person``, ``person/{id}``,
+``person/{id}/external_ids``, ``person/{id}/movie_credits`` (avec ETag et 304),
+``movie/{id}`` et ``movie/{id}/credits`` depuis un catalogue généré de façon déterministe, avec une
+latence et un taux d'erreurs 500 configurables. ``inject`` ajoute des pannes
+ciblées par point d'accès (lenteur, code d'erreur) pour exercer
+``services.resilience``.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from services.utils import normalize_name
+
+GENRES = [(28, 'Action'), (35, 'Comedy'), (18, 'Drama'), (80, 'Crime'), (10749, 'Romance'), (878, 'Science Fiction')]
+
+
+def build_catalog(pairs, extra_actors=300, movies=3000, credits_per_actor=(15, 60), shared_per_pair=(4, 12), seed=0):
+    """
+    Catalogue ``{'actors': ..., 'credits': ..., 'movies': ...}`` : les acteurs de
+    ``pairs`` (qui partagent chacun entre ``shared_per_pair`` films) plus
+    ``extra_actors`` acteurs « Actor NNNN » aux filmographies aléatoires.
+    """
+    rng = random.Random(seed)
+    names = sorted({name for pair in pairs for name in pair})
+    names += [name for name in (f'Actor {index:04d}' for index in range(extra_actors)) if name not in names]
+    actors = {
+        1000 + index: {'id': 1000 + index, 'name': name, 'profile_path': f'/{1000 + index}.jpg', 'popularity': round(rng.uniform(1, 100), 2)}
+        for index, name in enumerate(names)
+    }
+    ids_by_name = {actor['name']: actor_id for actor_id, actor in actors.items()}
+    credits = {actor_id: set(rng.sample(range(1, movies + 1), rng.randint(*credits_per_actor))) for actor_id in actors}
+    for actor1, actor2 in pairs:
+        shared = rng.sample(range(1, movies + 1), rng.randint(*shared_per_pair))
+        credits[ids_by_name[actor1]].update(shared)
+        credits[ids_by_name[actor2]].update(shared)
+
+    movie_catalog = {
+        movie_id: {
+            'title': f'Film {movie_id}',
+            'release_date': f'{rng.randint(1950, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'genres': [{'id': genre_id, 'name': name} for genre_id, name in rng.sample(GENRES, 2)],
+            'director': f'Director {rng.randint(1, 400)}',
+        }
+        for movie_id in range(1, movies + 1)
+    }
+    return {'actors': actors, 'credits': {actor_id: sorted(ids) for actor_id, ids in credits.items()}, 'movies': movie_catalog}
+
+
+class FakeTMDBServer:
+    """Serveur HTTP local dans un thread ; ``base_url`` remplace ``https://api.themoviedb.org/3``."""
+
+    def __init__(self, catalog, latency=0.0, error_rate=0.0, seed=0):
+        self.catalog = catalog
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._search_index = [(normalize_name(actor['name']), actor) for actor in catalog['actors'].values()]
+        self._faults = {}
+        self._casts = {}
+        for actor_id, movie_ids in sorted(catalog['credits'].items()):
+            for movie_id in movie_ids:
+                self._casts.setdefault(movie_id, []).append(actor_id)
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f'http://{host}:{port}/3'
+
+    @property
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+    def reset_calls(self):
+        with self._lock:
+            self.calls.clear()
+
+    def inject(self, endpoint, delay=0.0, status=None, times=None):
+        """
+        Panne sur ``endpoint`` (ex. ``'movie'``, ``'search/person'``) : ``delay``
+        secondes de plus et/ou réponse ``status``, pour les ``times`` prochains
+        appels (tous si ``None``).
+        """
+        with self._lock:
+            self._faults[endpoint] = {'delay': delay, 'status': status, 'times': times}
+
+    def clear_faults(self):
+        with self._lock:
+            self._faults.clear()
+
+    def _take_fault(self, endpoint):
+        fault = self._faults.get(endpoint)
+        if fault is None:
+            return None
+        if fault['times'] is not None:
+            fault['times'] -= 1
+            if fault['times'] <= 0:
+                del self._faults[endpoint]
+        return fault
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='fake-tmdb', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handle(self, handler):
+        url = urlsplit(handler.path)
+        parts = [part for part in url.path.split('/') if part][1:]
+        endpoint = '/'.join(part for part in parts if not part.isdigit())
+        with self._lock:
+            self.calls[endpoint] += 1
+            failed = self._rng.random() < self.error_rate
+            fault = self._take_fault(endpoint)
+        if self.latency:
+            time.sleep(self.latency)
+        if fault is not None:
+            if fault['delay']:
+                time.sleep(fault['delay'])
+            if fault['status'] is not None:
+                return self._send(handler, fault['status'], {'status_message': 'Injected fault'})
+        if failed:
+            return self._send(handler, 500, {'status_message': 'Internal error (simulated)'})
+
+        query = parse_qs(url.query)
+        if parts[:2] == ['search', 'person']:
+            return self._send(handler, 200, self._search(query.get('query', [''])[0]))
+        if len(parts) in (2, 3) and parts[0] == 'person' and parts[1].isdigit():
+            actor_id = int(parts[1])
+            if actor_id not in self.catalog['actors']:
+                return self._send(handler, 404, {'status_message': 'Not found'})
+            if len(parts) == 2:
+                return self._send(handler, 200, self.catalog['actors'][actor_id])
+            if parts[2] == 'external_ids':
+                return self._send(handler, 200, {'imdb_id': f'nm{actor_id:07d}'})
+            if parts[2] == 'movie_credits':
+                return self._send_credits(handler, actor_id)
+        if len(parts) >= 2 and parts[0] == 'movie' and parts[1].isdigit() and int(parts[1]) in self.catalog['movies']:
+            if len(parts) == 2:
+                return self._send(handler, 200, self._movie(int(parts[1])))
+            if parts[2:] == ['credits']:
+                return self._send(handler, 200, self._movie_credits(int(parts[1])))
+        return self._send(handler, 404, {'status_message': 'Not found'})
+
+    def _search(self, query):
+        needle = normalize_name(query)
+        matches = [actor for name, actor in self._search_index if needle and needle in name]
+        matches.sort(key=lambda actor: actor['popularity'], reverse=True)
+        return {'page': 1, 'results': matches[:20], 'total_results': len(matches)}
+
+    def _send_credits(self, handler, actor_id):
+        movie_ids = self.catalog['credits'][actor_id]
+        etag = '"' + hashlib.md5(repr(movie_ids).encode('utf-8')).hexdigest() + '"'
+        if handler.headers.get('If-None-Match') == etag:
+            return self._send(handler, 304, None, {'ETag': etag})
+        cast = []
+        for movie_id in movie_ids:
+            movie = self.catalog['movies'][movie_id]
+            cast.append({
+                'id': movie_id, 'title': movie['title'], 'release_date': movie['release_date'],
+                'character': f'Role {actor_id}-{movie_id}', 'genre_ids': [genre['id'] for genre in movie['genres']],
+            })
+        return self._send(handler, 200, {'id': actor_id, 'cast': cast}, {'ETag': etag})
+
+    def _movie(self, movie_id):
+        movie = self.catalog['movies'][movie_id]
+        return {
+            'id': movie_id, 'title': movie['title'], 'release_date': movie['release_date'], 'genres': movie['genres'],
+            'poster_path': f'/poster{movie_id}.jpg',
+            'credits': {'crew': [{'job': 'Director', 'name': movie['director']}]},
+            'external_ids': {'imdb_id': f'tt{movie_id:07d}'},
+        }
+
+    def _movie_credits(self, movie_id):
+        cast = [
+            {'id': actor_id, 'name': self.catalog['actors'][actor_id]['name'], 'character': f'Role {actor_id}-{movie_id}', 'order': order}
+            for order, actor_id in enumerate(self._casts.get(movie_id, []))
+        ]
+        return {'id': movie_id, 'cast': cast}
+
+    def _send(self, handler, status, data, headers=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        handler.send_response(status)
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        if status != 304:
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(body)))
+        try:
+            handler.end_headers()
+            if body:
+                handler.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti : requête principale coupée par son doublon (resilience.hedged).
+            pass
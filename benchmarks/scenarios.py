@@ -0,0 +1,185 @@
+"""
+Scénarios de charge exécutés contre l'application en processus (client de test
+Django, donc middlewares compris) et le faux serveur TMDB.
+
+Chaque scénario renvoie un ``ScenarioResult`` ; ``summary()`` en donne les
+p50/p95/p99 en millisecondes, le débit et le nombre d'appels TMDB par requête,
+que ``compare_to_baseline`` confronte à une référence enregistrée.
+"""
+import contextlib
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import Client
+
+from api.models import Actor, ActorPair, Movie
+from services import autocomplete, cache_manager
+
+
+class ScenarioResult:
+    __slots__ = ('name', 'latencies', 'elapsed', 'upstream_calls', 'errors')
+
+    def __init__(self, name, latencies, elapsed, upstream_calls, errors=0):
+        self.name = name
+        self.latencies = latencies
+        self.elapsed = elapsed
+        self.upstream_calls = upstream_calls
+        self.errors = errors
+
+    def summary(self):
+        requests = len(self.latencies)
+        return {
+            'requests': requests,
+            'errors': self.errors,
+            'p50_ms': round(percentile(self.latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(self.latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(self.latencies, 99) * 1000, 2),
+            'requests_per_second': round(requests / self.elapsed, 2) if self.elapsed else 0.0,
+            'upstream_per_request': round(self.upstream_calls / requests, 3) if requests else 0.0,
+        }
+
+
+def percentile(values, q):
+    """Percentile par rang le plus proche (``q`` entre 0 et 100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+def reset_state():
+    """Caches vides et base de test sans acteurs indexés ni paires : le prochain scénario part à froid."""
+    cache.clear()
+    cache_manager.reset_backend()
+    Actor.objects.all().delete()
+    Movie.objects.all().delete()
+    ActorPair.objects.all().delete()
+    autocomplete.reset_index()
+
+
+_clients = threading.local()
+
+
+def _client():
+    client = getattr(_clients, 'client', None)
+    if client is None:
+        client = _clients.client = Client()
+    return client
+
+
+def _timed_get(path, params):
+    start = time.perf_counter()
+    response = _client().get(path, params)
+    return time.perf_counter() - start, response.status_code >= 400
+
+
+def _in_worker(task):
+    try:
+        return task()
+    finally:
+        connections.close_all()
+
+
+def _run(name, server, tasks, concurrency):
+    """Exécute ``tasks`` (fonctions sans argument renvoyant une liste de ``(durée, en_erreur)``)."""
+    server.reset_calls()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = [sample for samples in executor.map(_in_worker, tasks) for sample in samples]
+    elapsed = time.perf_counter() - start
+    return ScenarioResult(
+        name, [duration for duration, _ in samples], elapsed, server.total_calls,
+        errors=sum(1 for _, failed in samples if failed),
+    )
+
+
+def _common_movies_task(actor1, actor2):
+    return lambda: [_timed_get('/api/common-movies/', {'actor1': actor1, 'actor2': actor2})]
+
+
+def cold_cache(server, pairs, concurrency, **options):
+    reset_state()
+    return _run('cold_cache', server, [_common_movies_task(*pair) for pair in pairs], concurrency)
+
+
+def warm_cache(server, pairs, concurrency, repeat=5, **options):
+    # Suppose cold_cache exécuté juste avant ; sinon la première passe réchauffe le cache.
+    tasks = [_common_movies_task(*pair) for _ in range(repeat) for pair in pairs]
+    return _run('warm_cache', server, tasks, concurrency)
+
+
+def hot_pair_stampede(server, pairs, concurrency, repeat=5, **options):
+    """Toutes les requêtes visent la même paire, à froid, lâchées en même temps."""
+    reset_state()
+    actor1, actor2 = pairs[0]
+    barrier = threading.Barrier(concurrency)
+
+    def task():
+        barrier.wait()
+        return [_timed_get('/api/common-movies/', {'actor1': actor1, 'actor2': actor2}) for _ in range(repeat)]
+
+    return _run('hot_pair_stampede', server, [task] * concurrency, concurrency)
+
+
+def autocomplete_typing(server, pairs, concurrency, **options):
+    """Chaque utilisateur tape un nom lettre par lettre ; une requête d'autocomplétion par frappe."""
+    reset_state()
+    names = sorted({name for pair in pairs for name in pair})[:concurrency * 2]
+
+    def typing(name):
+        return lambda: [_timed_get('/api/actor-autocomplete/', {'query': name[:length]}) for length in range(2, len(name) + 1)]
+
+    return _run('autocomplete_typing', server, [typing(name) for name in names], concurrency)
+
+
+def batch_ingestion(server, pairs, concurrency, **options):
+    """``scripts/fetch_selected_pairs.run()`` de bout en bout ; les écritures sont annulées à la fin."""
+    from scripts import fetch_selected_pairs
+
+    reset_state()
+    server.reset_calls()
+    start = time.perf_counter()
+    with transaction.atomic(), contextlib.redirect_stdout(io.StringIO()):
+        fetch_selected_pairs.run()
+        transaction.set_rollback(True)
+    elapsed = time.perf_counter() - start
+    # Une « requête » par paire ingérée : la latence par paire est la durée moyenne.
+    count = len(fetch_selected_pairs.ACTOR_PAIRS)
+    return ScenarioResult('batch_ingestion', [elapsed / count] * count, elapsed, server.total_calls)
+
+
+SCENARIOS = {
+    'cold_cache': cold_cache,
+    'warm_cache': warm_cache,
+    'hot_pair_stampede': hot_pair_stampede,
+    'autocomplete_typing': autocomplete_typing,
+    'batch_ingestion': batch_ingestion,
+}
+
+
+def compare_to_baseline(summaries, baseline, tolerance=0.25):
+    """
+    Régressions de ``summaries`` par rapport à ``baseline`` (même format) :
+    p95 ou appels TMDB par requête plus élevés, ou débit plus faible, au-delà
+    de ``tolerance``. Les scénarios absents de la référence sont ignorés.
+    """
+    regressions = []
+    for name, summary in summaries.items():
+        reference = baseline.get(name)
+        if not reference:
+            continue
+        # Marges absolues : quelques millisecondes ou un appel sur cent ne sont pas une régression.
+        if summary['p95_ms'] > reference['p95_ms'] * (1 + tolerance) + 5:
+            regressions.append(f"{name}: p95 {summary['p95_ms']} ms > {reference['p95_ms']} ms")
+        if summary['requests_per_second'] < reference['requests_per_second'] * (1 - tolerance):
+            regressions.append(f"{name}: {summary['requests_per_second']} req/s < {reference['requests_per_second']} req/s")
+        if summary['upstream_per_request'] > reference['upstream_per_request'] * (1 + tolerance) + 0.01:
+            regressions.append(
+                f"{name}: {summary['upstream_per_request']} appels TMDB/requête > {reference['upstream_per_request']}"
+            )
+    return regressions
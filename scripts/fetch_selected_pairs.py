@@ -5,8 +5,9 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ScreenPairsAPI.settings")
 django.setup()
 
 import logging
-from api.models import ActorPair
-from services.tmdb import get_actor_info, get_movies_by_actor
+from api.models import ActorPair, PairMovie
+from services import rate_limit
+from services.tmdb import get_actor_info, get_movies_by_actor, summarize_common_movies
 
 logger = logging.getLogger(__name__)
 
@@ -19,27 +20,6 @@ ACTOR_PAIRS = [
     ("Emma Stone", "Ryan Gosling"),
 ]
 
-DOCUMENTARY_GENRE_ID = 99
-
-def fetch_common_movies(actor1, actor2, movies1, movies2):
-    ids1 = {m['id']: m for m in movies1}
-    ids2 = {m['id']: m for m in movies2}
-    common_ids = set(ids1.keys()) & set(ids2.keys())
-
-    common_movies = []
-    for mid in common_ids:
-        movie = ids1[mid]
-        genre_ids = movie.get("genre_ids", [])
-        if "title" not in movie:
-            continue
-        common_movies.append({
-            "id": mid,
-            "title": movie["title"],
-            "release_date": movie.get("release_date", ""),
-            "is_documentary": DOCUMENTARY_GENRE_ID in genre_ids,
-        })
-    return sorted(common_movies, key=lambda m: m["release_date"] or "9999")
-
 def run():
     actor_infos = {}
     actor_movies = {}
@@ -57,9 +37,9 @@ def run():
             logger.warning(f"Paire ignorée : {actor1} / {actor2}")
             continue
 
-        movies = fetch_common_movies(actor1, actor2, actor_movies[actor1], actor_movies[actor2])
+        movies = summarize_common_movies(actor_movies[actor1], actor_movies[actor2])
 
-        ActorPair.objects.update_or_create(
+        pair, _ = ActorPair.objects.update_or_create(
             actor1_id=actor_infos[actor1]["id"],
             actor2_id=actor_infos[actor2]["id"],
             defaults={
@@ -67,11 +47,12 @@ def run():
                 "actor2_name": actor2,
                 "common_movies_count": len(movies),
                 "common_movies": [
-                    {"title": m["title"], "release_date": m["release_date"]}
+                    {"id": m["id"], "title": m["title"], "release_date": m["release_date"]}
                     for m in movies
                 ],
             },
         )
+        PairMovie.replace_for_pairs([pair])
 
         print(f"{actor1} & {actor2} → {len(movies)} films communs :")
         for m in movies:
@@ -79,4 +60,6 @@ def run():
         print()
 
 if __name__ == "__main__":
+    # Travail de fond : passe après les requêtes des vues dans le seau TMDB partagé.
+    rate_limit.set_default_lane(rate_limit.BATCH)
     run()
@@ -0,0 +1,86 @@
+"""
+Lecture des paires enregistrées (``ActorPair``) pour ``/api/pairs/``.
+
+Une paire se retrouve par son ID ou par ses deux acteurs, dans un ordre ou
+l'autre, via l'index ``actorpair_min_max_idx`` sur (plus petit ID, plus grand
+ID). Les fiches lues passent par un LRU du processus qui garde leur JSON déjà
+sérialisé pendant ``ACTOR_PAIR_CACHE_TTL`` secondes : une paire chaude ne coûte
+ni requête SQL ni sérialisation. Les paires sont écrites par d'autres processus
+(``ingest_pairs``, ``fetch_selected_pairs.py``) : pas d'invalidation, la durée
+de vie borne le retard.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.functions import Greatest, Least
+
+from api.models import ActorPair
+
+from .responses import dumps
+from .tiered_cache import LRUStore
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LRUStore(
+                    getattr(settings, 'ACTOR_PAIR_CACHE_MAX_ENTRIES', 10_000),
+                    getattr(settings, 'ACTOR_PAIR_CACHE_MAX_BYTES', 32 * 1024 * 1024),
+                )
+    return _store
+
+
+def reset_cache():
+    global _store
+    with _store_lock:
+        _store = None
+
+
+def pair_payload(pair):
+    return {
+        'id': pair.id,
+        'actor1_id': pair.actor1_id,
+        'actor1_name': pair.actor1_name,
+        'actor2_id': pair.actor2_id,
+        'actor2_name': pair.actor2_name,
+        'common_movies_count': pair.common_movies_count,
+        'common_movies': pair.common_movies or [],
+    }
+
+
+def pairs_for_actors(actor1_id, actor2_id):
+    """Paires des deux acteurs quel que soit l'ordre enregistré (filtre sur les expressions de l'index)."""
+    return ActorPair.objects.annotate(
+        min_actor_id=Least('actor1_id', 'actor2_id'),
+        max_actor_id=Greatest('actor1_id', 'actor2_id'),
+    ).filter(min_actor_id=min(actor1_id, actor2_id), max_actor_id=max(actor1_id, actor2_id))
+
+
+def _read_through(key, load):
+    """JSON de la paire depuis le LRU, sinon ``load()`` (une requête SQL) ; ``None`` si elle n'existe pas."""
+    store = _get_store()
+    now = time.monotonic()
+    body = store.get(key, now)
+    if body is None:
+        pair = load()
+        if pair is None:
+            return None
+        body = dumps(pair_payload(pair))
+        store.set(key, body, now + getattr(settings, 'ACTOR_PAIR_CACHE_TTL', 60))
+    return body
+
+
+def get_pair_body(pair_id):
+    return _read_through(f'id:{pair_id}', lambda: ActorPair.objects.filter(pk=pair_id).first())
+
+
+def get_pair_body_by_actors(actor1_id, actor2_id):
+    key = f'actors:{min(actor1_id, actor2_id)}_{max(actor1_id, actor2_id)}'
+    # Si les deux orientations ont été enregistrées (anciennes données), la plus ancienne fait foi.
+    return _read_through(key, lambda: pairs_for_actors(actor1_id, actor2_id).order_by('id').first())
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+
+from .utils import normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+class ActorPrefixIndex:
+    """
+    Index de préfixes des acteurs déjà rencontrés, pour l'autocomplétion.
+
+    Chaque acteur est indexé sous son nom normalisé (``normalize_name``) et
+    sous chaque fin de nom commençant par un mot (« de niro », « niro ») dans
+    une liste triée ; une recherche est un ``bisect`` suivi d'un parcours des
+    clés qui commencent par le préfixe demandé. Les résultats sont classés par
+    popularité TMDB décroissante.
+
+    Un préfixe de moins de ``SHORT_PREFIX`` caractères couvrirait une bonne
+    part de la liste : ses ``short_prefix_top`` acteurs les plus populaires sont
+    tenus à jour à chaque ajout et la recherche n'en parcourt pas d'autres
+    (approximation : un acteur sorti de ce classement n'y revient que s'il est
+    ajouté de nouveau).
+    """
+
+    SHORT_PREFIX = 3
+
+    def __init__(self, short_prefix_top=20):
+        self._keys = []
+        self._actors = {}
+        self._short_prefix_top = short_prefix_top
+        # préfixe court -> [(-popularité, actor_id)] trié, au plus short_prefix_top éléments
+        self._top_by_prefix = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._actors)
+
+    def add(self, actor_id, name, profile_path=None, popularity=0):
+        if not name:
+            return
+        with self._lock:
+            current = self._actors.get(actor_id)
+            if current is None or current['name'] != name:
+                if current is not None:
+                    self._remove_keys(actor_id, current['name'])
+                for key in self._index_keys(name):
+                    insort(self._keys, (key, actor_id))
+            actor = self._actors[actor_id] = {
+                'id': actor_id,
+                'name': name,
+                'profile_path': profile_path if profile_path is not None else (current or {}).get('profile_path'),
+                'popularity': popularity or (current or {}).get('popularity', 0),
+            }
+            for prefix in self._short_prefixes(name):
+                top = [item for item in self._top_by_prefix.get(prefix, []) if item[1] != actor_id]
+                insort(top, (-actor['popularity'], actor_id))
+                self._top_by_prefix[prefix] = top[:self._short_prefix_top]
+
+    def search(self, query, limit=5):
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        with self._lock:
+            if len(prefix) < self.SHORT_PREFIX and limit <= self._short_prefix_top:
+                return [dict(self._actors[actor_id]) for _, actor_id in self._top_by_prefix.get(prefix, [])[:limit]]
+            matched_ids = set()
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and self._keys[position][0].startswith(prefix):
+                matched_ids.add(self._keys[position][1])
+                position += 1
+            matches = [dict(self._actors[actor_id]) for actor_id in matched_ids]
+        return sorted(matches, key=lambda actor: actor['popularity'], reverse=True)[:limit]
+
+    @staticmethod
+    def _index_keys(name):
+        words = normalize_name(name).split(' ')
+        return {' '.join(words[start:]) for start in range(len(words))}
+
+    @classmethod
+    def _short_prefixes(cls, name):
+        return {key[:length] for key in cls._index_keys(name) for length in range(1, min(len(key), cls.SHORT_PREFIX - 1) + 1)}
+
+    def _remove_keys(self, actor_id, name):
+        for key in self._index_keys(name):
+            position = bisect_left(self._keys, (key, actor_id))
+            if position < len(self._keys) and self._keys[position] == (key, actor_id):
+                del self._keys[position]
+        for prefix in self._short_prefixes(name):
+            top = self._top_by_prefix.get(prefix, [])
+            self._top_by_prefix[prefix] = [item for item in top if item[1] != actor_id]
+
+
+_index = ActorPrefixIndex()
+_seeded = False
+_seed_failed_at = None
+_seed_lock = threading.Lock()
+# Après un échec (base indisponible...), l'initialisation n'est retentée qu'au bout de ce délai, en secondes.
+SEED_RETRY_INTERVAL = 60
+
+
+def is_seeded():
+    return _seeded
+
+
+def get_index(seed=True):
+    """
+    Index du processus, initialisé depuis ActorPair au premier accès. Requête
+    ORM synchrone : depuis une coroutine, passer par ``sync_to_async`` ou
+    demander ``seed=False``.
+    """
+    global _seeded, _seed_failed_at
+    if seed and not _seeded and (_seed_failed_at is None or time.monotonic() - _seed_failed_at >= SEED_RETRY_INTERVAL):
+        with _seed_lock:
+            if not _seeded:
+                # Marqué initialisé seulement si la lecture d'ActorPair a réussi.
+                if seed_from_actor_pairs() is None:
+                    _seed_failed_at = time.monotonic()
+                else:
+                    _seeded = True
+                    _seed_failed_at = None
+    return _index
+
+
+def reset_index():
+    """Vide l'index ; il sera réinitialisé depuis ActorPair au prochain accès."""
+    global _index, _seeded, _seed_failed_at
+    with _seed_lock:
+        _index = ActorPrefixIndex()
+        _seeded = False
+        _seed_failed_at = None
+
+
+def seed_from_actor_pairs():
+    """Ajoute les acteurs d'ActorPair à l'index ; renvoie la taille de l'index, ou ``None`` si la lecture a échoué."""
+    from api.models import ActorPair
+
+    try:
+        rows = list(ActorPair.objects.values_list('actor1_id', 'actor1_name', 'actor2_id', 'actor2_name'))
+    except Exception as e:
+        logger.warning(f"Impossible d'initialiser l'index d'autocomplétion depuis ActorPair: {e}")
+        return None
+
+    for actor1_id, actor1_name, actor2_id, actor2_name in rows:
+        _index.add(actor1_id, actor1_name)
+        _index.add(actor2_id, actor2_name)
+    logger.info(f"Index d'autocomplétion initialisé avec {len(_index)} acteur(s)")
+    return len(_index)
+
+
+def record_actor(actor_data):
+    """
+    Ajoute à l'index un acteur tel que renvoyé par TMDB (search/person) ou par
+    ``search_actors``. Sans initialisation depuis ActorPair : appelable depuis
+    une coroutine, la prochaine recherche s'en charge.
+    """
+    get_index(seed=False).add(
+        actor_data['id'],
+        actor_data.get('name'),
+        profile_path=actor_data.get('profile_path'),
+        popularity=actor_data.get('popularity', 0),
+    )
+
+
+def search(query, limit=5, seed=True):
+    return get_index(seed=seed).search(query, limit=limit)
+
+
+def merge_results(*result_lists, limit=5):
+    merged = {}
+    for results in result_lists:
+        for actor in results:
+            merged.setdefault(actor['id'], actor)
+    return sorted(merged.values(), key=lambda actor: actor['popularity'], reverse=True)[:limit]
@@ -0,0 +1,175 @@
+"""
+Calcul groupé des films communs pour une liste de paires (``POST /api/common-movies/batch/``).
+
+Contrairement à des appels répétés à ``tmdb.find_common_movies``, chaque
+acteur distinct n'est résolu qu'une fois, chaque filmographie et chaque fiche
+film ne sont demandées qu'une fois pour tout le lot, et les paires sont
+renvoyées dès que leurs films sont prêts.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, as_completed
+
+from django.conf import settings
+
+from . import cache_manager, credits_index, tmdb
+from .concurrency import run_bounded
+from .utils import TMDBServiceError, normalize_name
+
+logger = logging.getLogger(__name__)
+
+
+class PairResult:
+    __slots__ = ('index', 'actor1', 'actor2', 'movies', 'actor1_info', 'actor2_info', 'complete')
+
+    def __init__(self, index, actor1, actor2, movies, actor1_info, actor2_info, complete=True):
+        self.index = index
+        self.actor1 = actor1
+        self.actor2 = actor2
+        self.movies = movies
+        self.actor1_info = actor1_info or {}
+        self.actor2_info = actor2_info or {}
+        self.complete = complete
+
+
+def _remaining(deadline):
+    return None if deadline is None else max(0, deadline - time.monotonic())
+
+
+def _load_filmographies(actor_infos, deadline):
+    """Filmographie de chaque acteur distinct : index local si activé, sinon TMDB, en parallèle."""
+    actor_ids = sorted(actor_infos)
+    if not tmdb._use_credits_index():
+        movies = run_bounded(tmdb.get_movies_by_actor, [(actor_id,) for actor_id in actor_ids], timeout=_remaining(deadline))
+        return {actor_id: credits for actor_id, credits in zip(actor_ids, movies) if credits is not None}
+
+    # Appels TMDB en parallèle ; les écritures et lectures de l'index restent dans le thread de la requête.
+    to_ingest = sorted(credits_index.actors_needing_ingest(actor_ids))
+    fetched = run_bounded(tmdb.get_movies_by_actor, [(actor_id,) for actor_id in to_ingest], timeout=_remaining(deadline))
+    for actor_id, movies in zip(to_ingest, fetched):
+        if movies is not None:
+            info = actor_infos[actor_id]
+            credits_index.ingest_credits(actor_id, movies, name=info.get('name'), profile_path=info.get('image_path'))
+    return {actor_id: credits_index.get_actor_credits(actor_id) for actor_id in actor_ids}
+
+
+def _credit_versions(actor_infos, filmographies):
+    """Versions des filmographies chargées (déjà en cache ou indexées : pas de requête TMDB supplémentaire)."""
+    versions = {}
+    for actor_id in filmographies:
+        try:
+            versions[actor_id] = tmdb._credit_version(actor_infos[actor_id])
+        except TMDBServiceError:
+            versions[actor_id] = None
+    return versions
+
+
+def iter_common_movies(pairs, deadline=None):
+    """
+    Génère un ``PairResult`` par paire ``(actor1, actor2)`` de ``pairs``, dans
+    l'ordre où elles sont prêtes : d'abord les paires en cache, puis les autres
+    au fil des fiches films récupérées. Passé ``deadline`` secondes, les paires
+    restantes sont renvoyées avec les films obtenus jusque-là et ``complete`` à False.
+    """
+    deadline = time.monotonic() + deadline if deadline else None
+
+    names = {}
+    for actor1, actor2 in pairs:
+        for name in (actor1, actor2):
+            names.setdefault(normalize_name(name), name)
+    name_keys = list(names)
+    resolved = run_bounded(tmdb.get_actor_info, [(names[key],) for key in name_keys], timeout=_remaining(deadline))
+    infos = dict(zip(name_keys, resolved))
+
+    pending = []
+    for index, (actor1, actor2) in enumerate(pairs):
+        actor1_info = infos.get(normalize_name(actor1))
+        actor2_info = infos.get(normalize_name(actor2))
+        if not actor1_info or not actor2_info:
+            yield PairResult(index, actor1, actor2, [], actor1_info, actor2_info)
+            continue
+
+        cached_entry = cache_manager.get_entry(actor1_info['id'], actor2_info['id'])
+        if cached_entry:
+            cached_data, is_fresh = cached_entry
+            if not is_fresh and getattr(settings, 'PAIR_CACHE_STALE_WHILE_REVALIDATE', False):
+                cache_key = cache_manager._get_cache_key(actor1_info['id'], actor2_info['id'])
+                tmdb._pair_flight.do_in_background(
+                    cache_key, tmdb._compute_pair_shared, cache_key, actor1, actor2, actor1_info, actor2_info
+                )
+                is_fresh = True
+            if is_fresh:
+                yield PairResult(index, actor1, actor2, cached_data.get('results', []), actor1_info, actor2_info)
+                continue
+        pending.append((index, actor1, actor2, actor1_info, actor2_info))
+
+    if not pending:
+        return
+
+    actor_infos = {}
+    for _, _, _, actor1_info, actor2_info in pending:
+        actor_infos.setdefault(actor1_info['id'], actor1_info)
+        actor_infos.setdefault(actor2_info['id'], actor2_info)
+    filmographies = _load_filmographies(actor_infos, deadline)
+    credit_versions = _credit_versions(actor_infos, filmographies)
+
+    # Films à récupérer par paire, et paires en attente de chaque film.
+    pair_fetch_args = {}
+    waiting_on = {}
+    for index, actor1, actor2, actor1_info, actor2_info in pending:
+        fetch_args = tmdb._common_movie_fetch_args(
+            filmographies.get(actor1_info['id'], []), filmographies.get(actor2_info['id'], [])
+        )
+        pair_fetch_args[index] = fetch_args
+        for movie_id, _, _ in fetch_args:
+            waiting_on.setdefault(movie_id, set()).add(index)
+
+    pending_by_index = {entry[0]: entry for entry in pending}
+    remaining_movies = {index: {args[0] for args in fetch_args} for index, fetch_args in pair_fetch_args.items()}
+    details = {}
+
+    def finish(index, complete):
+        _, actor1, actor2, actor1_info, actor2_info = pending_by_index.pop(index)
+        fetch_args = pair_fetch_args[index]
+        # Copie par paire : _build_pair_payload écrit les personnages dans chaque fiche.
+        details_list = [dict(details[movie_id]) if details.get(movie_id) else None for movie_id, _, _ in fetch_args]
+        deps = tmdb._pair_deps(
+            {str(info['id']): credit_versions.get(info['id']) for info in (actor1_info, actor2_info)}, fetch_args, details_list, {}
+        )
+        payload = tmdb._build_pair_payload(actor1, actor2, actor1_info, actor2_info, fetch_args, details_list, deps)
+        if complete:
+            cache_manager.add_to_cache(actor1_info['id'], actor2_info['id'], payload)
+        return PairResult(index, actor1, actor2, payload['results'], actor1_info, actor2_info, complete)
+
+    for index in [index for index, movie_ids in remaining_movies.items() if not movie_ids]:
+        yield finish(index, True)
+
+    if not waiting_on:
+        return
+
+    max_in_flight = getattr(settings, 'TMDB_MAX_IN_FLIGHT', 8)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(waiting_on))), thread_name_prefix='tmdb-batch')
+    try:
+        futures = {
+            executor.submit(contextvars.copy_context().run, tmdb.fetch_common_movie_details, movie_id, None, None): movie_id
+            for movie_id in sorted(waiting_on)
+        }
+        try:
+            for future in as_completed(futures, timeout=_remaining(deadline)):
+                movie_id = futures[future]
+                try:
+                    details[movie_id] = future.result()
+                except Exception as e:
+                    logger.warning(f"Détails du film {movie_id} indisponibles pour le lot: {e}")
+                    details[movie_id] = None
+                for index in waiting_on[movie_id]:
+                    remaining_movies[index].discard(movie_id)
+                    if not remaining_movies[index]:
+                        yield finish(index, True)
+        except FuturesTimeoutError:
+            logger.warning(f"Délai du lot dépassé: {len(pending_by_index)} paire(s) renvoyée(s) incomplète(s)")
+            for index in list(pending_by_index):
+                yield finish(index, False)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
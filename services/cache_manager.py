@@ -1,81 +1,292 @@
+import hashlib
 import json
 import os
 import logging
+import threading
+import time
 from pathlib import Path
 from datetime import datetime, timedelta
 
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import instrumentation
+
 logger = logging.getLogger(__name__)
 
 
+# Ancien cache fichier, conservé uniquement pour l'import ponctuel (import_json_cache).
 CACHE_FILE_PATH = Path(__file__).resolve().parent.parent / 'api_cache.json'
 CACHE_DURATION = timedelta(days=1)
 
-def _load_cache():
-    if not CACHE_FILE_PATH.exists():
-        return {}
-    try:
-        with open(CACHE_FILE_PATH, 'r', encoding='utf-8') as f:
-            content = f.read()
-            if not content:
-                return {}
-            return json.loads(content)
-    except (json.JSONDecodeError, IOError) as e:
-        logger.error(f"Erreur lors du chargement du cache JSON ({CACHE_FILE_PATH}): {e}")
-        return {}
-
-def _save_cache(cache_data):
-    try:
-        with open(CACHE_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
-    except IOError as e:
-        logger.error(f"Erreur lors de la sauvegarde du cache JSON ({CACHE_FILE_PATH}): {e}")
+_backend = None
+_backend_pid = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend, _backend_pid
+    if _backend is None or _backend_pid != os.getpid():
+        with _backend_lock:
+            if _backend is None or _backend_pid != os.getpid():
+                backend_class = import_string(getattr(settings, 'PAIR_CACHE_BACKEND', 'services.pair_cache.SQLitePairCache'))
+                _backend = backend_class(**getattr(settings, 'PAIR_CACHE_OPTIONS', {}))
+                _backend_pid = os.getpid()
+                _start_sweeper()
+    return _backend
+
+
+def reset_backend():
+    global _backend, _backend_pid
+    with _backend_lock:
+        if _backend is not None:
+            _backend.close()
+        _backend = None
+        _backend_pid = None
+
+
+def _stale_ttl():
+    return getattr(settings, 'PAIR_CACHE_STALE_TTL', 0)
+
+
+def sweep_expired():
+    # Les entrées expirées restent servables en mode stale-while-revalidate pendant PAIR_CACHE_STALE_TTL.
+    cutoff = time.time() - CACHE_DURATION.total_seconds() - _stale_ttl()
+    deleted = get_backend().delete_older_than(cutoff)
+    if deleted:
+        logger.info(f"Balayage du cache des paires: {deleted} entrée(s) expirée(s) supprimée(s)")
+    return deleted
+
+
+def _sweep_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            sweep_expired()
+        except Exception:
+            logger.exception("Erreur pendant le balayage du cache des paires")
+
 
-def _get_cache_key(actor1_id, actor2_id):
+def _start_sweeper():
+    interval = getattr(settings, 'PAIR_CACHE_SWEEP_INTERVAL', 300)
+    if not interval:
+        return
+    thread = threading.Thread(target=_sweep_loop, args=(interval,), name='pair-cache-sweeper', daemon=True)
+    thread.start()
+
+
+def _get_cache_key(*actor_ids):
+    """Clé indépendante de l'ordre : IDs distincts triés, ``"12_57"`` pour une paire, ``"3_12_57"`` pour un groupe."""
     try:
-        id1 = int(actor1_id)
-        id2 = int(actor2_id)
-        return f"{min(id1, id2)}_{max(id1, id2)}"
+        ids = sorted({int(actor_id) for actor_id in actor_ids})
     except (ValueError, TypeError):
-        logger.warning(f"Impossible de générer la clé de cache pour les IDs : {actor1_id}, {actor2_id}")
+        logger.warning(f"Impossible de générer la clé de cache pour les IDs : {', '.join(map(str, actor_ids))}")
         return None
+    return '_'.join(map(str, ids))
 
-def get_from_cache(actor1_id, actor2_id):
-    cache_key = _get_cache_key(actor1_id, actor2_id)
+
+def _pack(data):
+    """
+    Entrée telle que stockée : chaque film de ``results`` devient une
+    référence dans ``movie_refs`` et sa fiche part dans le stockage des films du
+    backend, partagé par toutes les paires. Renvoie ``(entrée, {movie_id: fiche})``.
+
+    Quand tous les films nomment les mêmes acteurs (cas des paires et des
+    groupes), les noms sont écrits une fois dans ``character_names`` et chaque
+    référence vaut ``[id, personnage 1, personnage 2, ...]`` ; sinon ``[id, personnages]``.
+    """
+    if not getattr(settings, 'PAIR_CACHE_DEDUPLICATE_MOVIES', True) or not isinstance(data, dict) or 'results' not in data:
+        return data, {}
+    movies = {}
+    characters = []
+    for movie in data['results']:
+        movies[movie['id']] = {field: value for field, value in movie.items() if field != 'characters'}
+        characters.append(movie.get('characters'))
+    packed = {key: value for key, value in data.items() if key not in ('results', 'movies_version')}
+    names = list(characters[0]) if characters and isinstance(characters[0], dict) else None
+    if names is not None and all(isinstance(roles, dict) and list(roles) == names for roles in characters):
+        packed['character_names'] = names
+        packed['movie_refs'] = [[movie['id'], *roles.values()] for movie, roles in zip(data['results'], characters)]
+    else:
+        packed['movie_refs'] = [[movie['id'], roles] for movie, roles in zip(data['results'], characters)]
+    return packed, movies
+
+
+def _resolve(cache_key, data, stored_at):
+    """
+    Inverse de ``_pack`` (les entrées non dédupliquées sont renvoyées telles
+    quelles) ; ``None`` si une fiche manque.
+
+    Une fiche réécrite par une autre entrée après ``stored_at`` change le
+    contenu de celle-ci sans changer son ``computed_at`` : ``movies_version``
+    résume alors les ``stored_at`` de ces fiches. Il est absent tant qu'aucune
+    ne l'a été, comme dans l'entrée renvoyée au moment de son calcul.
+    """
+    if not isinstance(data, dict) or 'movie_refs' not in data:
+        return data
+    refs = data['movie_refs']
+    movie_ids = [ref[0] for ref in refs]
+    movies = get_backend().get_movie_entries(movie_ids) if refs else {}
+    if len(movies) < len(set(movie_ids)):
+        logger.warning(f"Fiche(s) film absente(s) du cache pour la clé: {cache_key}, entrée ignorée")
+        return None
+    names = data.get('character_names')
+    resolved = {key: value for key, value in data.items() if key not in ('movie_refs', 'character_names')}
+    resolved['results'] = [
+        {**movies[ref[0]][0], 'characters': dict(zip(names, ref[1:])) if names is not None else ref[1]}
+        for ref in refs
+    ]
+    rewritten = sorted((movie_id, movies[movie_id][1]) for movie_id in set(movie_ids) if movies[movie_id][1] > stored_at)
+    if rewritten:
+        resolved['movies_version'] = hashlib.md5(repr(rewritten).encode('ascii')).hexdigest()[:16]
+    return resolved
+
+
+def get_movie(movie_id):
+    """
+    Copie de la fiche du film dans le stockage des films du backend, ou ``None``.
+    Elle y reste tant qu'une entrée la référence, quel que soit son âge : c'est
+    la fiche de secours quand TMDB échoue.
+    """
+    details = get_backend().get_movies([movie_id]).get(movie_id)
+    return dict(details) if details is not None else None
+
+
+def get_from_cache(*actor_ids):
+    cache_key = _get_cache_key(*actor_ids)
     if not cache_key:
         return None
 
-    cache_data = _load_cache()
-    cached_entry = cache_data.get(cache_key)
+    cached_entry = get_backend().get(cache_key)
 
     if cached_entry:
-        timestamp_str = cached_entry.get("timestamp")
-        if timestamp_str:
-            try:
-                timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                if datetime.now(timestamp.tzinfo) - timestamp < CACHE_DURATION:
-                    logger.info(f"Cache hit pour la clé: {cache_key}")
-                    return {k: v for k, v in cached_entry.items() if k != 'timestamp'}
-                else:
-                    logger.info(f"Cache expiré pour la clé: {cache_key}")
-            except ValueError:
-                logger.warning(f"Format de timestamp invalide dans le cache pour la clé: {cache_key}")
+        data, stored_at = cached_entry
+        if time.time() - stored_at < CACHE_DURATION.total_seconds():
+            data = _resolve(cache_key, data, stored_at)
+            if data is not None:
+                logger.info(f"Cache hit pour la clé: {cache_key}")
+                return data
         else:
-            logger.info(f"Entrée de cache sans timestamp pour la clé: {cache_key}")
-
+            logger.info(f"Cache expiré pour la clé: {cache_key}")
 
     logger.info(f"Cache miss pour la clé: {cache_key}")
     return None
 
-def add_to_cache(actor1_id, actor2_id, data_to_cache):
+
+@instrumentation.timed('pair_cache')
+def get_entry(*actor_ids):
+    """
+    Renvoie ``(data, is_fresh)`` pour la paire (ou le groupe d'acteurs), y
+    compris une entrée expirée depuis moins de ``PAIR_CACHE_STALE_TTL`` secondes
+    (``is_fresh`` à False), ou ``None``.
+    """
+    cache_key = _get_cache_key(*actor_ids)
+    cached_entry = get_backend().get(cache_key) if cache_key else None
+    if not cached_entry:
+        instrumentation.tag(cache='miss')
+        return None
+
+    data, stored_at = cached_entry
+    age = time.time() - stored_at
+    # Une entrée calculée pendant une panne TMDB (resilience) n'est fraîche que PAIR_CACHE_DEGRADED_TTL secondes.
+    fresh_for = CACHE_DURATION.total_seconds()
+    if isinstance(data, dict) and data.get('degraded'):
+        fresh_for = min(fresh_for, getattr(settings, 'PAIR_CACHE_DEGRADED_TTL', 60))
+    if age < CACHE_DURATION.total_seconds() + _stale_ttl():
+        data = _resolve(cache_key, data, stored_at)
+    else:
+        data = None
+    if data is None:
+        instrumentation.tag(cache='miss')
+        return None
+    if age < fresh_for:
+        instrumentation.tag(cache='hit')
+        return data, True
+    instrumentation.tag(cache='stale')
+    return data, False
+
+
+def get_any(*actor_ids):
+    """
+    Dernière entrée de la paire (ou du groupe) quel que soit son âge, jusqu'au
+    balayage : reconstruction incrémentale, ou réponse de secours si TMDB échoue.
+    """
+    cache_key = _get_cache_key(*actor_ids)
+    if not cache_key:
+        return None
+    cached_entry = get_backend().get(cache_key)
+    return _resolve(cache_key, *cached_entry) if cached_entry else None
+
+
+def get_stored_at(actor1_id, actor2_id):
+    """Timestamp d'enregistrement de l'entrée de la paire, ou ``None`` si elle est absente."""
     cache_key = _get_cache_key(actor1_id, actor2_id)
+    cached_entry = get_backend().get(cache_key) if cache_key else None
+    return cached_entry[1] if cached_entry else None
+
+
+def add_to_cache(actor1_id, actor2_id, data_to_cache):
+    set_entry((actor1_id, actor2_id), data_to_cache)
+
+
+def set_entry(actor_ids, data_to_cache):
+    cache_key = _get_cache_key(*actor_ids)
     if not cache_key:
         return
 
-    cache_data = _load_cache()
+    set_entries([(cache_key, data_to_cache, None)])
+    logger.info(f"Données ajoutées au cache pour la clé: {cache_key}")
+
+
+def set_entries(items):
+    """
+    Écrit des ``(cache_key, data, stored_at)`` (``stored_at`` à ``None`` pour
+    maintenant). Les fiches films sont écrites avant les entrées qui les
+    référencent : un lecteur ne voit jamais une entrée sans ses fiches.
+    """
+    now = time.time()
+    entries = []
+    movies = {}
+    for cache_key, data, stored_at in items:
+        stored_at = stored_at if stored_at is not None else now
+        packed, entry_movies = _pack(data)
+        entries.append((cache_key, packed, stored_at))
+        for movie_id, details in entry_movies.items():
+            if movie_id not in movies or stored_at >= movies[movie_id][1]:
+                movies[movie_id] = (details, stored_at)
+    backend = get_backend()
+    if movies:
+        backend.set_movies([(movie_id, details, stored_at) for movie_id, (details, stored_at) in movies.items()])
+    backend.set_many(entries)
 
-    entry_to_store = data_to_cache.copy()
-    entry_to_store["timestamp"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    cache_data[cache_key] = entry_to_store
-    _save_cache(cache_data)
-    logger.info(f"Données ajoutées au cache pour la clé: {cache_key}")
\ No newline at end of file
+def import_json_cache(path=CACHE_FILE_PATH):
+    """
+    Importe l'ancien fichier ``api_cache.json`` dans le backend configuré.
+    Les entrées conservent leur timestamp d'origine, donc celles déjà expirées
+    seront supprimées au prochain balayage. Renvoie le nombre d'entrées importées.
+    """
+    path = Path(path)
+    if not path.exists():
+        logger.info(f"Aucun fichier de cache JSON à importer ({path})")
+        return 0
+
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    cache_data = json.loads(content) if content else {}
+
+    items = []
+    for cache_key, entry in cache_data.items():
+        entry = dict(entry)
+        timestamp_str = entry.pop('timestamp', None)
+        stored_at = 0
+        if timestamp_str:
+            try:
+                stored_at = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00')).timestamp()
+            except ValueError:
+                logger.warning(f"Format de timestamp invalide dans le cache pour la clé: {cache_key}")
+        items.append((cache_key, entry, stored_at))
+
+    set_entries(items)
+    logger.info(f"{len(items)} entrée(s) importée(s) depuis {path}")
+    return len(items)
@@ -0,0 +1,51 @@
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def run_bounded(func, args_list, max_in_flight=None, timeout=None):
+    """
+    Appelle ``func(*args)`` pour chaque tuple de ``args_list`` avec au plus
+    ``max_in_flight`` appels simultanés, et renvoie les résultats dans le même
+    ordre que ``args_list``.
+
+    Un appel qui lève une exception ou qui n'est pas terminé après ``timeout``
+    secondes donne ``None`` à sa position, comme ``fetch_common_movie_details``
+    le fait déjà pour un film introuvable.
+    """
+    args_list = list(args_list)
+    if not args_list:
+        return []
+
+    if max_in_flight is None:
+        max_in_flight = getattr(settings, 'TMDB_MAX_IN_FLIGHT', 8)
+    deadline = time.monotonic() + timeout if timeout else None
+
+    results = [None] * len(args_list)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, len(args_list))), thread_name_prefix='tmdb-fetch')
+    try:
+        # Contexte copié pour chaque appel : la voie de rate_limit suit l'appelant dans les threads.
+        futures = {
+            executor.submit(contextvars.copy_context().run, func, *args): index
+            for index, args in enumerate(args_list)
+        }
+        remaining = None if deadline is None else max(0, deadline - time.monotonic())
+        done, not_done = wait(futures, timeout=remaining)
+
+        for future in done:
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                logger.warning(f"Appel concurrent échoué pour {args_list[futures[future]]}: {e}")
+
+        if not_done:
+            logger.warning(f"Délai de {timeout}s dépassé: {len(not_done)} appel(s) sur {len(args_list)} abandonné(s)")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
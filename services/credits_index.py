@@ -0,0 +1,162 @@
+"""
+Index local acteur <-> film (tables Actor, Movie, Credit).
+
+La filmographie d'un acteur est ingérée depuis TMDB (``get_movies_by_actor``)
+la première fois qu'il est demandé, puis rafraîchie après ``CREDITS_INDEX_TTL``.
+Ensuite les films communs à deux acteurs indexés et leurs partenaires les plus
+fréquents se calculent par jointure SQL, sans appel TMDB.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from api.models import Actor, Credit, Movie
+from . import instrumentation, tmdb
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_release_date(value):
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+def _is_stale(actor):
+    if actor.credits_ingested_at is None:
+        return True
+    ttl = getattr(settings, 'CREDITS_INDEX_TTL', 60 * 60 * 24 * 7)
+    return timezone.now() - actor.credits_ingested_at > timedelta(seconds=ttl)
+
+
+def ingest_credits(actor_id, movies, name=None, profile_path=None):
+    """Remplace les crédits indexés de l'acteur par ``movies`` (format ``get_movies_by_actor``)."""
+    movie_rows = {}
+    characters = {}
+    for movie in movies:
+        movie_id = movie['id']
+        movie_rows.setdefault(movie_id, Movie(
+            id=movie_id,
+            title=movie.get('title') or '',
+            release_date=_parse_release_date(movie.get('release_date')),
+            genre_ids=movie.get('genre_ids') or [],
+        ))
+        # TMDB liste parfois plusieurs rôles pour un même film.
+        character = movie.get('character') or ''
+        if movie_id in characters and character and character not in characters[movie_id]:
+            characters[movie_id] = f"{characters[movie_id]} / {character}"
+        else:
+            characters.setdefault(movie_id, character)
+
+    # Lignes triées par ID de film : deux ingestions concurrentes verrouillent les films dans le même
+    # ordre et ne peuvent pas s'interbloquer sur l'upsert.
+    movie_ids = sorted(movie_rows)
+    with transaction.atomic():
+        actor, _ = Actor.objects.get_or_create(id=actor_id)
+        if name:
+            actor.name = name
+        if profile_path is not None:
+            actor.profile_path = profile_path
+        actor.credits_ingested_at = timezone.now()
+        actor.save()
+
+        Movie.objects.bulk_create(
+            [movie_rows[movie_id] for movie_id in movie_ids],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=['title', 'release_date', 'genre_ids'],
+        )
+        Credit.objects.filter(actor_id=actor_id).delete()
+        Credit.objects.bulk_create(
+            Credit(actor_id=actor_id, movie_id=movie_id, character=characters[movie_id])
+            for movie_id in movie_ids
+        )
+
+    logger.info(f"Index des crédits: {len(characters)} film(s) ingéré(s) pour l'acteur ID {actor_id}")
+    return actor
+
+
+def ensure_actor_indexed(actor_id, name=None, profile_path=None):
+    """
+    Ingère la filmographie de l'acteur si elle est absente ou trop ancienne. Renvoie l'``Actor``.
+    Sans ``name`` pour un acteur encore sans nom, nom et photo viennent de ``tmdb.get_person``.
+    """
+    actor = Actor.objects.filter(id=actor_id).first()
+    if not name and not (actor and actor.name):
+        person = tmdb.get_person(actor_id)
+        name = person['name']
+        if profile_path is None:
+            profile_path = person['profile_path']
+    if actor is not None and not _is_stale(actor):
+        if name and actor.name != name:
+            actor.name = name
+            if profile_path is not None:
+                actor.profile_path = profile_path
+            actor.save(update_fields=['name', 'profile_path'])
+        return actor
+    return ingest_credits(actor_id, tmdb.get_movies_by_actor(actor_id), name=name, profile_path=profile_path)
+
+
+def actors_needing_ingest(actor_ids):
+    """IDs de ``actor_ids`` absents de l'index ou dont la filmographie est trop ancienne."""
+    indexed = {actor.id: actor for actor in Actor.objects.filter(id__in=actor_ids)}
+    return {actor_id for actor_id in actor_ids if actor_id not in indexed or _is_stale(indexed[actor_id])}
+
+
+def get_actor_credits(actor_id):
+    """Filmographie indexée de l'acteur, au format de ``get_movies_by_actor``."""
+    rows = (
+        Credit.objects
+        .filter(actor_id=actor_id)
+        .order_by('movie_id')
+        .values_list('movie_id', 'movie__title', 'movie__release_date', 'character', 'movie__genre_ids')
+    )
+    return [{
+        'id': movie_id,
+        'title': title,
+        'release_date': release_date.isoformat() if release_date else '',
+        'character': character,
+        'genre_ids': genre_ids or [],
+    } for movie_id, title, release_date, character, genre_ids in rows]
+
+
+@instrumentation.timed('credits_index')
+def common_movie_fetch_args(actor1_info, actor2_info):
+    """
+    Équivalent indexé de ``tmdb._common_movie_fetch_args`` : (movie_id,
+    personnage acteur 1, personnage acteur 2) pour chaque film commun, triés par ID.
+    """
+    ensure_actor_indexed(actor1_info['id'], actor1_info.get('name'), actor1_info.get('image_path'))
+    ensure_actor_indexed(actor2_info['id'], actor2_info.get('name'), actor2_info.get('image_path'))
+
+    rows = (
+        Credit.objects
+        .filter(actor_id=actor1_info['id'], movie__credits__actor_id=actor2_info['id'])
+        .order_by('movie_id')
+        .values_list('movie_id', 'character', 'movie__credits__character')
+    )
+    return [(movie_id, character1 or 'N/A', character2 or 'N/A') for movie_id, character1, character2 in rows]
+
+
+def top_costars(actor_id, limit=10):
+    """Acteurs indexés ayant partagé le plus de films avec ``actor_id``."""
+    rows = (
+        Credit.objects
+        .filter(movie__credits__actor_id=actor_id)
+        .exclude(actor_id=actor_id)
+        .values('actor_id', 'actor__name', 'actor__profile_path')
+        .annotate(shared_movies=Count('movie_id', distinct=True))
+        .order_by('-shared_movies', 'actor_id')[:limit]
+    )
+    return [{
+        'id': row['actor_id'],
+        'name': row['actor__name'],
+        'profile_path': row['actor__profile_path'],
+        'shared_movies': row['shared_movies'],
+    } for row in rows]
@@ -0,0 +1,185 @@
+"""
+Mesure de la latence par étape (résolution des acteurs, cache des paires,
+filmographies, fiches films, appels TMDB).
+
+Chaque étape est un *span* : sa durée alimente un histogramme Prometheus du
+processus (``render_prometheus``, servi par ``/metrics``) et, pendant une
+requête HTTP, le relevé de cette requête (``start_request``), d'où
+``api.middleware`` tire l'en-tête ``Server-Timing``. Les étiquettes (``cache``
+hit/miss, point d'accès TMDB...) s'ajoutent au span courant avec ``tag``.
+
+Le relevé de la requête suit le contexte (``contextvars``) : il est partagé par
+les threads de ``run_bounded`` et par ``sync_to_async``, qui copient le contexte.
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from collections import defaultdict
+
+# Bornes des histogrammes, en secondes.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'screenpairs'
+
+_request_spans = contextvars.ContextVar('instrumentation_request_spans', default=None)
+_current_tags = contextvars.ContextVar('instrumentation_current_tags', default=None)
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += seconds
+
+
+class Registry:
+    """Histogrammes du processus, par nom de span puis par jeu d'étiquettes."""
+
+    def __init__(self):
+        self._histograms = defaultdict(dict)
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in sorted(self._histograms):
+                metric = f"{METRIC_PREFIX}_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{metric}_bucket{_format_labels(key + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {histogram.total:.6f}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(items):
+    if not items:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in items)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(items, escaped)) + '}'
+
+
+registry = Registry()
+
+
+class RequestSpans:
+    """Spans d'une requête HTTP, agrégés par (nom, étiquettes) pour Server-Timing."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            count, total = self._totals.get(key, (0, 0.0))
+            self._totals[key] = (count + 1, total + seconds)
+
+    def server_timing(self):
+        """Valeur de l'en-tête Server-Timing, par exemple ``pair_cache;desc="cache=hit";dur=0.4``."""
+        with self._lock:
+            totals = sorted(self._totals.items())
+        entries = []
+        for (name, labels), (count, total) in totals:
+            desc = ' '.join(f'{key}={value}' for key, value in labels)
+            if count > 1:
+                desc = f'{desc} x{count}'.strip()
+            desc_part = f';desc="{desc}"' if desc else ''
+            entries.append(f'{name}{desc_part};dur={total * 1000:.1f}')
+        entries.append(f'total;dur={(time.perf_counter() - self.started_at) * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def start_request():
+    """Ouvre le relevé de la requête courante ; renvoie ``(spans, token)`` pour ``end_request``."""
+    spans = RequestSpans()
+    return spans, _request_spans.set(spans)
+
+
+def end_request(token):
+    _request_spans.reset(token)
+
+
+def record(name, seconds, **labels):
+    """Enregistre une durée déjà mesurée, comme le ferait un span."""
+    registry.observe(name, seconds, labels)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.add(name, seconds, labels)
+
+
+def tag(**labels):
+    """Ajoute des étiquettes au span en cours (sans effet hors d'un span)."""
+    tags = _current_tags.get()
+    if tags is not None:
+        tags.update(labels)
+
+
+@contextlib.contextmanager
+def span(name, **labels):
+    tags = dict(labels)
+    token = _current_tags.set(tags)
+    start = time.perf_counter()
+    try:
+        yield tags
+    finally:
+        _current_tags.reset(token)
+        record(name, time.perf_counter() - start, **tags)
+
+
+def timed(name, **labels):
+    """Décorateur : un span ``name`` autour de chaque appel (fonctions synchrones ou coroutines)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **labels):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_prometheus():
+    return registry.render()
+
+
+def render_gauge(name, samples):
+    """Jauge ``name`` au format texte Prometheus ; ``samples`` est une liste de ``(étiquettes, valeur)``."""
+    metric = f"{METRIC_PREFIX}_{name}"
+    lines = [f"# TYPE {metric} gauge"]
+    for labels, value in samples:
+        lines.append(f"{metric}{_format_labels(tuple(sorted(labels.items())))} {value:g}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,469 @@
+"""
+Index TMDB local, construit depuis un export en masse (``manage.py import_tmdb_dump``).
+
+Un seul fichier binaire, colonnes d'entiers alignées sur 8 octets :
+
+- acteurs triés par ID (nom, photo, IMDb ID, popularité) et, en CSR
+  (``person_offsets``), leurs crédits : IDs de films triés et personnages ;
+- films triés par ID (titre, date, genres, fiche JSON) et, en CSR
+  (``movie_offsets``), leur distribution dans l'ordre du générique ;
+- table des noms : fins de noms normalisés (« robert de niro », « de niro »,
+  « niro ») triées, pour la résolution exacte et l'autocomplétion ;
+- table des chaînes UTF-8 référencées par les colonnes.
+
+Le fichier est ouvert par ``mmap`` en lecture seule et les colonnes lues via
+``memoryview`` sans copie : tous les workers partagent les mêmes pages du cache
+disque, et l'ouverture ne lit que l'en-tête, quelle que soit la taille de l'index.
+
+``TMDB_DATA_MODE`` choisit la source : ``remote`` (TMDB seul, index ignoré),
+``local_first`` (index d'abord, TMDB pour ce qu'il ne connaît pas) ou
+``offline`` (index seul ; ``services.utils`` refuse tout appel TMDB).
+"""
+import gzip
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .utils import normalize_name
+
+logger = logging.getLogger(__name__)
+
+REMOTE = 'remote'
+LOCAL_FIRST = 'local_first'
+OFFLINE = 'offline'
+
+MAGIC = b'SPIDX001'
+_PREAMBLE = struct.Struct('<8sQ')
+_ALIGN = 8
+
+_COLUMNS = {
+    'person_ids': 'q', 'person_names': 'q', 'person_profiles': 'q', 'person_imdb': 'q', 'person_popularity': 'd',
+    'person_offsets': 'q', 'credit_movies': 'q', 'credit_characters': 'q',
+    'movie_ids': 'q', 'movie_titles': 'q', 'movie_dates': 'q', 'movie_details': 'q',
+    'movie_genre_offsets': 'q', 'movie_genres': 'q', 'movie_offsets': 'q', 'cast_persons': 'q',
+    'name_keys': 'q', 'name_persons': 'q',
+    'string_offsets': 'q', 'strings': 'B',
+}
+
+
+def _read_jsonl(path):
+    opener = gzip.open if str(path).endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _name_keys(name):
+    words = normalize_name(name).split(' ')
+    return {' '.join(words[start:]) for start in range(len(words))} - {''}
+
+
+class _Strings:
+    """Table des chaînes de l'index : chaque chaîne distincte n'est stockée qu'une fois."""
+
+    def __init__(self):
+        self.ids = {}
+        self.offsets = array('q', [0])
+        self.blob = bytearray()
+
+    def add(self, value):
+        if value is None:
+            return -1
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.offsets) - 1
+            self.blob += value.encode('utf-8')
+            self.offsets.append(len(self.blob))
+        return string_id
+
+    def value(self, string_id):
+        if string_id < 0:
+            return None
+        return self.blob[self.offsets[string_id]:self.offsets[string_id + 1]].decode('utf-8')
+
+
+def build_index(persons_path, movies_path, credits_path, output_path):
+    """
+    Construit l'index depuis trois fichiers JSONL (gzip si ``.gz``) :
+
+    - acteurs : ``{"id", "name", "popularity", "profile_path", "imdb_id"}`` ;
+    - films : ``{"id", "title", "release_date", "genre_ids" ou "genres", "poster_path", "imdb_id", "directors"}`` ;
+    - crédits : ``{"person_id", "movie_id", "character", "order"}``.
+
+    Le fichier est écrit à côté de ``output_path`` puis renommé : les workers
+    qui ont ouvert l'ancien index le gardent jusqu'à leur redémarrage.
+    Renvoie les statistiques de l'import.
+    """
+    strings = _Strings()
+
+    person_rows = {}
+    for person in _read_jsonl(persons_path):
+        if person.get('name'):
+            person_rows[person['id']] = person
+    person_ids = array('q', sorted(person_rows))
+    person_row_of = {person_id: row for row, person_id in enumerate(person_ids)}
+
+    movie_rows = {}
+    for movie in _read_jsonl(movies_path):
+        movie_rows[movie['id']] = movie
+    movie_ids = array('q', sorted(movie_rows))
+    movie_row_of = {movie_id: row for row, movie_id in enumerate(movie_ids)}
+
+    credit_persons, credit_movies, credit_orders, credit_characters = array('q'), array('q'), array('q'), array('q')
+    skipped = 0
+    for credit in _read_jsonl(credits_path):
+        person_row = person_row_of.get(credit.get('person_id'))
+        movie_row = movie_row_of.get(credit.get('movie_id'))
+        if person_row is None or movie_row is None:
+            skipped += 1
+            continue
+        credit_persons.append(person_row)
+        credit_movies.append(movie_row)
+        credit_orders.append(min(max(int(credit.get('order') or 0), 0), 1 << 20))
+        credit_characters.append(strings.add(credit.get('character') or ''))
+
+    # Côté acteurs : crédits triés par (acteur, film) ; plusieurs rôles dans un même film sont réunis.
+    by_person = sorted(range(len(credit_persons)), key=lambda i: credit_persons[i] * len(movie_ids) + credit_movies[i])
+    person_offsets = array('q', [0] * (len(person_ids) + 1))
+    out_movies, out_characters = array('q'), array('q')
+    last = None
+    for i in by_person:
+        key = (credit_persons[i], credit_movies[i])
+        if key == last:
+            previous = strings.value(out_characters[-1])
+            character = strings.value(credit_characters[i])
+            if character and character not in previous.split(' / '):
+                out_characters[-1] = strings.add(f"{previous} / {character}" if previous else character)
+            continue
+        last = key
+        out_movies.append(movie_ids[credit_movies[i]])
+        out_characters.append(credit_characters[i])
+        person_offsets[credit_persons[i] + 1] += 1
+    for row in range(len(person_ids)):
+        person_offsets[row + 1] += person_offsets[row]
+
+    # Côté films : distribution dans l'ordre du générique (tri stable), chaque acteur une seule fois.
+    by_movie = sorted(range(len(credit_movies)), key=lambda i: credit_movies[i] * ((1 << 20) + 1) + credit_orders[i])
+    movie_offsets = array('q', [0] * (len(movie_ids) + 1))
+    cast_persons = array('q')
+    current_movie, seen = None, set()
+    for i in by_movie:
+        if credit_movies[i] != current_movie:
+            current_movie, seen = credit_movies[i], set()
+        if credit_persons[i] in seen:
+            continue
+        seen.add(credit_persons[i])
+        cast_persons.append(person_ids[credit_persons[i]])
+        movie_offsets[credit_movies[i] + 1] += 1
+    for row in range(len(movie_ids)):
+        movie_offsets[row + 1] += movie_offsets[row]
+    del seen, by_movie, by_person
+
+    columns = {name: array(typecode) for name, typecode in _COLUMNS.items() if name != 'strings'}
+    names = []
+    for row, person_id in enumerate(person_ids):
+        person = person_rows[person_id]
+        columns['person_names'].append(strings.add(person['name']))
+        columns['person_profiles'].append(strings.add(person.get('profile_path')))
+        columns['person_imdb'].append(strings.add(person.get('imdb_id')))
+        columns['person_popularity'].append(float(person.get('popularity') or 0))
+        names.extend((key.encode('utf-8'), row) for key in _name_keys(person['name']))
+    names.sort()
+    for key, row in names:
+        columns['name_keys'].append(strings.add(key.decode('utf-8')))
+        columns['name_persons'].append(row)
+    del names
+
+    columns['movie_genre_offsets'].append(0)
+    for movie_id in movie_ids:
+        movie = movie_rows[movie_id]
+        genres = movie.get('genres')
+        genre_ids = [genre['id'] for genre in genres] if genres is not None else movie.get('genre_ids') or []
+        columns['movie_titles'].append(strings.add(movie.get('title')))
+        columns['movie_dates'].append(strings.add(movie.get('release_date') or ''))
+        columns['movie_genres'].extend(genre_ids)
+        columns['movie_genre_offsets'].append(len(columns['movie_genres']))
+        details = {
+            'genres': genres if genres is not None else [{'id': genre_id} for genre_id in genre_ids],
+            'poster_path': movie.get('poster_path'),
+            'imdb_id': movie.get('imdb_id'),
+            'directors': movie.get('directors') or [],
+        }
+        columns['movie_details'].append(strings.add(json.dumps(details, separators=(',', ':'))))
+
+    columns.update(
+        person_ids=person_ids, person_offsets=person_offsets, credit_movies=out_movies, credit_characters=out_characters,
+        movie_ids=movie_ids, movie_offsets=movie_offsets, cast_persons=cast_persons,
+        string_offsets=strings.offsets,
+    )
+    columns['strings'] = array('B', bytes(strings.blob))
+
+    stats = {
+        'persons': len(person_ids), 'movies': len(movie_ids), 'credits': len(out_movies),
+        'name_keys': len(columns['name_keys']), 'strings': len(strings.offsets) - 1, 'skipped_credits': skipped,
+    }
+    _write(output_path, columns, stats)
+    logger.info(f"Index TMDB local écrit dans {output_path}: {stats}")
+    return stats
+
+
+def _write(output_path, columns, stats):
+    # Sections alignées sur 8 octets, après le préambule et l'en-tête JSON qui les décrit.
+    sections, position = {}, 0
+    for name in _COLUMNS:
+        size = len(columns[name]) * columns[name].itemsize
+        sections[name] = [position, size]
+        position += size + (-size % _ALIGN)
+    header = json.dumps({'sections': sections, 'stats': stats}).encode('utf-8')
+    header += b' ' * (-(_PREAMBLE.size + len(header)) % _ALIGN)
+    data_start = _PREAMBLE.size + len(header)
+
+    directory = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmdb_index_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_PREAMBLE.pack(MAGIC, len(header)))
+            f.write(header)
+            for name in _COLUMNS:
+                offset, size = sections[name]
+                f.seek(data_start + offset)
+                columns[name].tofile(f)
+            f.truncate(data_start + position)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class OfflineIndex:
+    """Lecture de l'index par ``mmap`` ; les méthodes renvoient ``None`` pour un acteur ou un film absent."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_size = _PREAMBLE.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} n'est pas un index TMDB local")
+        header = json.loads(self._mmap[_PREAMBLE.size:_PREAMBLE.size + header_size])
+        data_start = _PREAMBLE.size + header_size
+        view = memoryview(self._mmap)
+        self.columns = {
+            name: view[data_start + offset:data_start + offset + size].cast(_COLUMNS[name])
+            for name, (offset, size) in header['sections'].items()
+        }
+        self.stats = header['stats']
+        self.path = path
+
+    def _string(self, string_id):
+        if string_id < 0:
+            return None
+        offsets = self.columns['string_offsets']
+        return bytes(self.columns['strings'][offsets[string_id]:offsets[string_id + 1]]).decode('utf-8')
+
+    def _string_bytes(self, string_id):
+        offsets = self.columns['string_offsets']
+        return bytes(self.columns['strings'][offsets[string_id]:offsets[string_id + 1]])
+
+    @staticmethod
+    def _row(ids, value):
+        row = bisect_left(ids, value)
+        return row if row < len(ids) and ids[row] == value else None
+
+    def has_actor(self, actor_id):
+        return self._row(self.columns['person_ids'], actor_id) is not None
+
+    def _person(self, row):
+        columns = self.columns
+        return {
+            'id': columns['person_ids'][row],
+            'name': self._string(columns['person_names'][row]),
+            'profile_path': self._string(columns['person_profiles'][row]),
+            'popularity': columns['person_popularity'][row],
+        }
+
+    def person(self, actor_id):
+        """Nom, photo et popularité de l'acteur, au format de ``tmdb.get_person``, ou ``None``."""
+        row = self._row(self.columns['person_ids'], actor_id)
+        return self._person(row) if row is not None else None
+
+    def _actor_info(self, row):
+        imdb_id = self._string(self.columns['person_imdb'][row])
+        person = self._person(row)
+        return {
+            'id': person['id'],
+            'name': person['name'],
+            'image_path': person['profile_path'],
+            'imdb_url': f"https://www.imdb.com/name/{imdb_id}/" if imdb_id else None,
+        }
+
+    def _name_rows(self, prefix, exact):
+        """Lignes des acteurs dont une fin de nom normalisé commence par ``prefix`` (ou lui est égale)."""
+        keys, persons = self.columns['name_keys'], self.columns['name_persons']
+        target = prefix.encode('utf-8')
+        position = bisect_left(keys, target, key=self._string_bytes)
+        scan_limit = getattr(settings, 'OFFLINE_INDEX_SEARCH_SCAN', 2000)
+        rows = []
+        while position < len(keys) and len(rows) < scan_limit:
+            key = self._string_bytes(keys[position])
+            if key != target if exact else not key.startswith(target):
+                break
+            rows.append(persons[position])
+            position += 1
+        return rows
+
+    def find_actor(self, name):
+        """Infos de l'acteur au nom (normalisé) exact, au format de ``tmdb.get_actor_info`` ; le plus populaire s'il y a homonymie."""
+        key = normalize_name(name)
+        if not key:
+            return None
+        popularity, names = self.columns['person_popularity'], self.columns['person_names']
+        rows = [row for row in self._name_rows(key, exact=True) if normalize_name(self._string(names[row])) == key]
+        if not rows:
+            return None
+        return self._actor_info(max(rows, key=lambda row: popularity[row]))
+
+    def search(self, query, limit=5):
+        """Autocomplétion au format de ``tmdb.search_actors``, par popularité décroissante."""
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        popularity = self.columns['person_popularity']
+        rows = sorted(set(self._name_rows(prefix, exact=False)), key=lambda row: popularity[row], reverse=True)
+        return [self._person(row) for row in rows[:limit]]
+
+    def movies_by_actor(self, actor_id):
+        """Filmographie au format de ``tmdb.get_movies_by_actor``, triée par ID de film."""
+        columns = self.columns
+        row = self._row(columns['person_ids'], actor_id)
+        if row is None:
+            return None
+        movies = []
+        for credit in range(columns['person_offsets'][row], columns['person_offsets'][row + 1]):
+            movie_id = columns['credit_movies'][credit]
+            movie_row = self._row(columns['movie_ids'], movie_id)
+            genres = columns['movie_genres'][columns['movie_genre_offsets'][movie_row]:columns['movie_genre_offsets'][movie_row + 1]]
+            movies.append({
+                'id': movie_id,
+                'title': self._string(columns['movie_titles'][movie_row]),
+                'release_date': self._string(columns['movie_dates'][movie_row]),
+                'character': self._string(columns['credit_characters'][credit]),
+                'genre_ids': genres.tolist(),
+            })
+        return movies
+
+    def movie_cast(self, movie_id):
+        """Distribution au format de ``tmdb.get_movie_cast``."""
+        columns = self.columns
+        row = self._row(columns['movie_ids'], movie_id)
+        if row is None:
+            return None
+        cast = []
+        for person_id in columns['cast_persons'][columns['movie_offsets'][row]:columns['movie_offsets'][row + 1]]:
+            person_row = self._row(columns['person_ids'], person_id)
+            cast.append((person_id, self._string(columns['person_names'][person_row])))
+        return cast
+
+    def movie_details(self, movie_id):
+        """Fiche film au format de ``tmdb._parse_movie_details``."""
+        columns = self.columns
+        row = self._row(columns['movie_ids'], movie_id)
+        if row is None:
+            return None
+        details = json.loads(self._string(columns['movie_details'][row]))
+        release_date = self._string(columns['movie_dates'][row])
+        imdb_id = details['imdb_id']
+        return {
+            'id': movie_id, 'imdb_url': f"https://www.imdb.com/title/{imdb_id}/" if imdb_id else None,
+            'title': self._string(columns['movie_titles'][row]),
+            'genres': details['genres'], 'poster_path': details['poster_path'],
+            'release_year': release_date.split('-')[0] if release_date else '', 'directors': details['directors'],
+        }
+
+    def close(self):
+        self.columns = {}
+        self._mmap.close()
+
+
+_index = None
+_index_path = None
+_index_lock = threading.Lock()
+
+
+def get_mode():
+    return getattr(settings, 'TMDB_DATA_MODE', REMOTE)
+
+
+def is_offline():
+    return get_mode() == OFFLINE
+
+
+def get_index():
+    """Index du processus, ouvert au premier accès ; ``None`` en mode ``remote`` ou si le fichier manque."""
+    global _index, _index_path
+    if get_mode() == REMOTE:
+        return None
+    path = getattr(settings, 'OFFLINE_INDEX_PATH', None)
+    if _index_path != path:
+        with _index_lock:
+            if _index_path != path:
+                index = None
+                try:
+                    index = OfflineIndex(path) if path else None
+                    if index is not None:
+                        logger.info(f"Index TMDB local ouvert: {path} {index.stats}")
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Index TMDB local indisponible ({path}): {e}")
+                _index, _index_path = index, path
+    return _index
+
+
+def reset_index():
+    global _index, _index_path
+    with _index_lock:
+        _index, _index_path = None, None
+
+
+def has_actor(actor_id):
+    index = get_index()
+    return index is not None and index.has_actor(actor_id)
+
+
+def person(actor_id):
+    index = get_index()
+    return index.person(actor_id) if index is not None else None
+
+
+def find_actor(name):
+    index = get_index()
+    return index.find_actor(name) if index is not None else None
+
+
+def search_actors(query, limit=5):
+    index = get_index()
+    return index.search(query, limit=limit) if index is not None else None
+
+
+def movies_by_actor(actor_id):
+    index = get_index()
+    return index.movies_by_actor(actor_id) if index is not None else None
+
+
+def movie_cast(movie_id):
+    index = get_index()
+    return index.movie_cast(movie_id) if index is not None else None
+
+
+def movie_details(movie_id):
+    index = get_index()
+    return index.movie_details(movie_id) if index is not None else None
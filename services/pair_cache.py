@@ -0,0 +1,356 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .tiered_cache import LRUStore
+
+logger = logging.getLogger(__name__)
+
+# Premier octet d'une valeur encodée par PairCodec ; les lignes écrites en texte JSON avant lui restent lisibles.
+_JSON = b'J'
+_MSGPACK = b'M'
+_ZSTD = b'Z'
+_IN_CHUNK = 500
+
+
+class PairCodec:
+    """
+    Encodage compact des valeurs : msgpack (JSON compact si ``msgpack`` n'est
+    pas installé ou si ``codec='json'``), compressé avec zstd au-delà de
+    ``compress_min_bytes`` octets si ``zstandard`` est installé (``None`` pour
+    ne jamais compresser). Le préfixe d'un octet décrit le format : une valeur
+    reste lisible après un changement de configuration.
+    """
+
+    def __init__(self, codec='msgpack', compress_min_bytes=256, compression_level=3):
+        self.use_msgpack = codec == 'msgpack' and msgpack is not None
+        self.compress_min_bytes = compress_min_bytes if zstandard is not None else None
+        self.compression_level = compression_level
+        # Compresseurs zstd : un par thread, leurs méthodes ne sont pas thread-safe.
+        self._local = threading.local()
+
+    def _zstd(self):
+        if getattr(self._local, 'compressor', None) is None:
+            self._local.compressor = zstandard.ZstdCompressor(level=self.compression_level)
+            self._local.decompressor = zstandard.ZstdDecompressor()
+        return self._local.compressor, self._local.decompressor
+
+    def encode(self, data):
+        if self.use_msgpack:
+            raw = _MSGPACK + msgpack.packb(data, use_bin_type=True)
+        else:
+            raw = _JSON + json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        if self.compress_min_bytes is not None and len(raw) >= self.compress_min_bytes:
+            compressed = _ZSTD + self._zstd()[0].compress(raw)
+            if len(compressed) < len(raw):
+                return compressed
+        return raw
+
+    def decode(self, raw):
+        """Valeur décodée ; ``ValueError`` si elle est illisible ou si son format demande une dépendance absente."""
+        if isinstance(raw, str):
+            return json.loads(raw)
+        raw = bytes(raw)
+        tag, body = raw[:1], raw[1:]
+        if tag == _ZSTD and zstandard is not None:
+            try:
+                raw = self._zstd()[1].decompress(body)
+            except zstandard.ZstdError as e:
+                raise ValueError(f"Valeur zstd illisible: {e}") from e
+            return self.decode(raw)
+        if tag == _MSGPACK and msgpack is not None:
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        if tag == _JSON:
+            return json.loads(body)
+        raise ValueError(f"Format de valeur inconnu ou non pris en charge: {tag!r}")
+
+
+class BasePairCache:
+    """
+    Stockage clé -> payload pour le cache des paires d'acteurs.
+
+    Les clés sont celles produites par ``cache_manager._get_cache_key``
+    (``"<min_id>_<max_id>"``). ``get`` renvoie ``(data, stored_at)`` où
+    ``stored_at`` est un timestamp epoch, ou ``None`` si la clé est absente.
+    L'expiration est gérée par ``delete_older_than``, appelé par le balayage
+    en arrière-plan de ``cache_manager`` et jamais pendant une lecture.
+
+    Les fiches films référencées par les entrées sont stockées une seule fois,
+    par ID (``get_movies``/``set_movies``). Le ``stored_at`` d'une fiche est
+    celui de l'entrée la plus récente qui l'a écrite : ``delete_older_than``
+    ne supprime donc jamais une fiche encore référencée, et ``get_movie_entries``
+    le renvoie comme version de la fiche.
+    """
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, data, stored_at=None):
+        raise NotImplementedError
+
+    def set_many(self, items):
+        for key, data, stored_at in items:
+            self.set(key, data, stored_at)
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def delete_older_than(self, cutoff):
+        raise NotImplementedError
+
+    def get_movies(self, movie_ids):
+        """``{movie_id: fiche}`` pour les IDs présents."""
+        return {movie_id: details for movie_id, (details, _) in self.get_movie_entries(movie_ids).items()}
+
+    def get_movie_entries(self, movie_ids):
+        """``{movie_id: (fiche, stored_at)}`` pour les IDs présents."""
+        raise NotImplementedError
+
+    def set_movies(self, items):
+        """Écrit des ``(movie_id, fiche, stored_at)`` ; une fiche plus ancienne que celle en place est ignorée."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SQLitePairCache(BasePairCache):
+    """
+    Backend SQLite en mode WAL : une ligne par paire, lecture par clé primaire
+    et upsert d'une seule ligne par écriture. Plusieurs workers gunicorn peuvent
+    partager le même fichier ; chaque thread (et chaque processus après un
+    fork) ouvre sa propre connexion. Les valeurs sont encodées par ``PairCodec``
+    (options ``codec``, ``compress_min_bytes``, ``compression_level``).
+
+    Les fiches films décodées sont gardées en mémoire du processus
+    (``movie_cache_entries`` au plus, ``movie_cache_ttl`` secondes) et
+    partagées entre les lectures, comme les entrées d'``InMemoryPairCache`` :
+    une fiche réécrite par un autre worker est vue au plus tard à leur expiration.
+    """
+
+    def __init__(self, path, busy_timeout=5.0, codec='msgpack', compress_min_bytes=256, compression_level=3,
+                 movie_cache_entries=20_000, movie_cache_ttl=60):
+        self.path = str(path)
+        self.busy_timeout = busy_timeout
+        self.codec = PairCodec(codec, compress_min_bytes, compression_level)
+        self.movie_cache_ttl = movie_cache_ttl
+        self._movie_cache = LRUStore(movie_cache_entries)
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pair_cache ("
+            " key TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " stored_at REAL NOT NULL"
+            ")"
+        )
+        self._migrate_data_to_blob(conn)
+        conn.execute("CREATE INDEX IF NOT EXISTS pair_cache_stored_at ON pair_cache (stored_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pair_cache_movies ("
+            " movie_id INTEGER PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " stored_at REAL NOT NULL"
+            ")"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS pair_cache_movies_stored_at ON pair_cache_movies (stored_at)")
+
+    def _migrate_data_to_blob(self, conn):
+        """
+        Les fichiers créés avant ``PairCodec`` déclarent ``data TEXT``. SQLite ne
+        sait pas changer le type d'une colonne : la table est recopiée. Les
+        anciennes valeurs JSON restent du texte, que ``PairCodec.decode`` lit toujours.
+        """
+        def declared_type():
+            columns = conn.execute("PRAGMA table_info(pair_cache)").fetchall()
+            return next(column[2] for column in columns if column[1] == 'data').upper()
+
+        if declared_type() == 'BLOB':
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Un autre worker a pu migrer le fichier entre la lecture du schéma et le verrou.
+            if declared_type() != 'BLOB':
+                conn.execute(
+                    "CREATE TABLE pair_cache_blob ("
+                    " key TEXT PRIMARY KEY,"
+                    " data BLOB NOT NULL,"
+                    " stored_at REAL NOT NULL"
+                    ")"
+                )
+                conn.execute("INSERT INTO pair_cache_blob (key, data, stored_at) SELECT key, data, stored_at FROM pair_cache")
+                conn.execute("DROP TABLE pair_cache")
+                conn.execute("ALTER TABLE pair_cache_blob RENAME TO pair_cache")
+                logger.info(f"Cache SQLite des paires: colonne data migrée en BLOB ({self.path})")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT data, stored_at FROM pair_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return self.codec.decode(row[0]), row[1]
+        except ValueError:
+            logger.warning(f"Entrée de cache SQLite illisible pour la clé: {key}")
+            return None
+
+    def set(self, key, data, stored_at=None):
+        self.set_many([(key, data, stored_at)])
+
+    def set_many(self, items):
+        now = time.time()
+        rows = [
+            (key, self.codec.encode(data), stored_at if stored_at is not None else now)
+            for key, data, stored_at in items
+        ]
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO pair_cache (key, data, stored_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET data = excluded.data, stored_at = excluded.stored_at",
+                rows,
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM pair_cache WHERE key = ?", (key,))
+
+    def delete_older_than(self, cutoff):
+        conn = self._conn()
+        cursor = conn.execute("DELETE FROM pair_cache WHERE stored_at < ?", (cutoff,))
+        conn.execute("DELETE FROM pair_cache_movies WHERE stored_at < ?", (cutoff,))
+        self._movie_cache.clear()
+        return cursor.rowcount
+
+    def get_movie_entries(self, movie_ids):
+        now = time.monotonic()
+        movie_ids = list(dict.fromkeys(movie_ids))
+        movies = self._movie_cache.get_many(movie_ids, now)
+        missing = [movie_id for movie_id in movie_ids if movie_id not in movies]
+
+        conn = self._conn()
+        for start in range(0, len(missing), _IN_CHUNK):
+            chunk = missing[start:start + _IN_CHUNK]
+            rows = conn.execute(
+                f"SELECT movie_id, data, stored_at FROM pair_cache_movies WHERE movie_id IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for movie_id, data, stored_at in rows:
+                try:
+                    movies[movie_id] = (self.codec.decode(data), stored_at)
+                except ValueError:
+                    logger.warning(f"Fiche film illisible dans le cache SQLite: {movie_id}")
+                    continue
+                self._movie_cache.set(movie_id, movies[movie_id], now + self.movie_cache_ttl)
+        return movies
+
+    def set_movies(self, items):
+        now = time.time()
+        rows = [
+            (movie_id, self.codec.encode(details), stored_at if stored_at is not None else now)
+            for movie_id, details, stored_at in items
+        ]
+        # Ce processus relira la fiche depuis SQLite, où une version plus récente peut déjà se trouver.
+        for movie_id, _, _ in rows:
+            self._movie_cache.delete(movie_id)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO pair_cache_movies (movie_id, data, stored_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(movie_id) DO UPDATE SET data = excluded.data, stored_at = excluded.stored_at "
+                "WHERE excluded.stored_at >= pair_cache_movies.stored_at",
+                rows,
+            )
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class InMemoryPairCache(BasePairCache):
+    """Backend en mémoire, propre au processus. Utile pour les tests."""
+
+    def __init__(self):
+        self._data = {}
+        self._movies = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._data.get(key)
+
+    def set(self, key, data, stored_at=None):
+        with self._lock:
+            self._data[key] = (data, stored_at if stored_at is not None else time.time())
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_older_than(self, cutoff):
+        with self._lock:
+            expired = [key for key, (_, stored_at) in self._data.items() if stored_at < cutoff]
+            for key in expired:
+                del self._data[key]
+            for movie_id in [movie_id for movie_id, (_, stored_at) in self._movies.items() if stored_at < cutoff]:
+                del self._movies[movie_id]
+        return len(expired)
+
+    def get_movie_entries(self, movie_ids):
+        with self._lock:
+            return {movie_id: self._movies[movie_id] for movie_id in movie_ids if movie_id in self._movies}
+
+    def set_movies(self, items):
+        now = time.time()
+        with self._lock:
+            for movie_id, details, stored_at in items:
+                stored_at = stored_at if stored_at is not None else now
+                current = self._movies.get(movie_id)
+                if current is None or stored_at >= current[1]:
+                    self._movies[movie_id] = (details, stored_at)
@@ -0,0 +1,366 @@
+"""
+Limitation du débit des appels TMDB.
+
+Tous les appels de ``services.utils`` prennent un jeton avant de partir. Le seau
+est partagé entre les processus (workers gunicorn, commandes de gestion) via un
+petit fichier SQLite si ``TMDB_RATE_LIMIT_SHARED_PATH`` est défini, sinon il est
+propre au processus.
+
+Deux voies de priorité : ``interactive`` (vues, par défaut) et ``batch``
+(scripts et commandes d'ingestion). La voie batch laisse toujours une réserve de
+``TMDB_RATE_BATCH_RESERVE`` × burst jetons aux requêtes interactives, et cède
+son tour tant qu'une requête interactive du même processus attend. Une requête
+qui attend plus de ``TMDB_RATE_MAX_WAIT[voie]`` secondes lève ``RateLimitTimeout``.
+"""
+import asyncio
+import contextlib
+import contextvars
+import os
+import sqlite3
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import instrumentation
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+LANES = (INTERACTIVE, BATCH)
+
+_lane = contextvars.ContextVar('tmdb_rate_lane', default=None)
+_default_lane = INTERACTIVE
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+class TokenBucket:
+    """
+    Seau à jetons thread-safe : ``rate`` jetons par seconde, au plus ``burst``
+    d'avance. ``acquire`` bloque jusqu'à obtenir un jeton.
+    """
+
+    # Prise de jeton sans attente d'E/S : appelable depuis la boucle asyncio.
+    blocking = False
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, reserve=0.0):
+        """Prend un jeton s'il en reste plus de ``reserve`` ; sinon renvoie l'attente estimée en secondes."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= 1 + reserve:
+                self._tokens -= 1
+                return 0.0
+            return (1 + reserve - self._tokens) / self.rate
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """Vide le seau pour ``seconds`` secondes (réponse 429 de TMDB)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class SharedTokenBucket:
+    """
+    Même seau, stocké dans une ligne SQLite : chaque prise de jeton est une
+    transaction ``BEGIN IMMEDIATE``, ce qui sérialise tous les processus de la
+    machine qui partagent le fichier.
+    """
+
+    # Transaction SQLite (jusqu'à ``busy_timeout`` secondes) : hors de la boucle asyncio.
+    blocking = True
+
+    def __init__(self, path, rate, burst=None, name='tmdb', busy_timeout=5.0):
+        self.path = str(path)
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.name = name
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_bucket ("
+            " name TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL"
+            ")"
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO token_bucket (name, tokens, updated_at) VALUES (?, ?, ?)",
+            (self.name, self.burst, time.time()),
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _update(self, change):
+        """Applique ``change(tokens) -> (tokens, résultat)`` au seau rechargé, dans une transaction."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            tokens, updated_at = conn.execute(
+                "SELECT tokens, updated_at FROM token_bucket WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = time.time()
+            tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+            tokens, result = change(tokens)
+            conn.execute(
+                "UPDATE token_bucket SET tokens = ?, updated_at = ? WHERE name = ?", (tokens, now, self.name)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def try_acquire(self, reserve=0.0):
+        def change(tokens):
+            if tokens >= 1 + reserve:
+                return tokens - 1, 0.0
+            return tokens, (1 + reserve - tokens) / self.rate
+        return self._update(change)
+
+    def acquire(self):
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        self._update(lambda tokens: (min(tokens, -seconds * self.rate), None))
+
+    @property
+    def tokens(self):
+        return self._update(lambda tokens: (tokens, tokens))
+
+
+# _UNSET : pas encore construit depuis les settings ; None : pas de limite.
+_UNSET = object()
+_limiter = _UNSET
+_limiter_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    'waiting': {lane: 0 for lane in LANES},
+    'acquired': {lane: 0 for lane in LANES},
+    'timeouts': {lane: 0 for lane in LANES},
+    'wait_seconds': {lane: 0.0 for lane in LANES},
+}
+
+
+def _build_limiter(rate, burst=None):
+    if not rate:
+        return None
+    shared_path = getattr(settings, 'TMDB_RATE_LIMIT_SHARED_PATH', None)
+    if shared_path:
+        return SharedTokenBucket(shared_path, rate, burst)
+    return TokenBucket(rate, burst)
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is _UNSET:
+        with _limiter_lock:
+            if _limiter is _UNSET:
+                _limiter = _build_limiter(getattr(settings, 'TMDB_RATE_LIMIT', None), getattr(settings, 'TMDB_RATE_BURST', None))
+    return _limiter
+
+
+def set_limiter(rate, burst=None):
+    """Remplace le limiteur du processus (ex. ``--rate`` de la commande ``ingest_pairs`` ; 0 = pas de limite)."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = _build_limiter(rate, burst)
+
+
+def reset_limiter():
+    """Oublie le limiteur courant : le prochain appel le reconstruit depuis les settings."""
+    global _limiter
+    with _limiter_lock:
+        _limiter = _UNSET
+
+
+def set_default_lane(lane_name):
+    """Voie utilisée par le processus hors d'un bloc ``lane()`` (``BATCH`` pour les scripts)."""
+    global _default_lane
+    _default_lane = lane_name
+
+
+@contextlib.contextmanager
+def lane(lane_name):
+    token = _lane.set(lane_name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def current_lane():
+    return _lane.get() or _default_lane
+
+
+def _reserve(lane_name, limiter):
+    if lane_name == INTERACTIVE:
+        return 0.0
+    return limiter.burst * getattr(settings, 'TMDB_RATE_BATCH_RESERVE', 0.25)
+
+
+def _max_wait(lane_name):
+    return getattr(settings, 'TMDB_RATE_MAX_WAIT', {}).get(lane_name)
+
+
+def _record(lane_name, key, value=1):
+    with _stats_lock:
+        _stats[key][lane_name] += value
+
+
+def _next_wait(limiter, lane_name, started_at, max_wait):
+    """0 si un jeton a été pris, sinon la durée à attendre avant de réessayer."""
+    if lane_name != INTERACTIVE and _stats['waiting'][INTERACTIVE]:
+        wait = 1 / limiter.rate
+    else:
+        wait = limiter.try_acquire(_reserve(lane_name, limiter))
+        if not wait:
+            return 0.0
+    if max_wait is not None:
+        remaining = started_at + max_wait - time.monotonic()
+        if remaining <= 0:
+            _record(lane_name, 'timeouts')
+            raise RateLimitTimeout(f"Aucun jeton TMDB obtenu en {max_wait}s (voie {lane_name})")
+        wait = min(wait, remaining)
+    return wait
+
+
+def acquire(lane_name=None):
+    """
+    Attend un jeton avant un appel TMDB ; sans limite configurée, ne fait rien.
+    Lève ``RateLimitTimeout`` au-delà de l'attente maximale de la voie.
+    """
+    limiter = get_limiter()
+    if limiter is None:
+        return
+    lane_name = lane_name or current_lane()
+    max_wait = _max_wait(lane_name)
+    started_at = time.monotonic()
+    _record(lane_name, 'waiting')
+    try:
+        while True:
+            wait = _next_wait(limiter, lane_name, started_at, max_wait)
+            if not wait:
+                break
+            time.sleep(wait)
+    finally:
+        _record(lane_name, 'waiting', -1)
+    _record(lane_name, 'acquired')
+    _record(lane_name, 'wait_seconds', time.monotonic() - started_at)
+
+
+def try_acquire(lane_name=None):
+    """Prend un jeton sans attendre (requêtes facultatives, comme les doublons de ``resilience.hedged``)."""
+    limiter = get_limiter()
+    if limiter is None:
+        return True
+    lane_name = lane_name or current_lane()
+    if limiter.try_acquire(_reserve(lane_name, limiter)):
+        return False
+    _record(lane_name, 'acquired')
+    return True
+
+
+async def async_try_acquire(lane_name=None):
+    """Équivalent de ``try_acquire`` pour la boucle asyncio ; le seau partagé est interrogé depuis un thread."""
+    limiter = get_limiter()
+    if limiter is not None and limiter.blocking:
+        return await sync_to_async(try_acquire, thread_sensitive=False)(lane_name or current_lane())
+    return try_acquire(lane_name)
+
+
+async def async_acquire(lane_name=None):
+    """
+    Équivalent de ``acquire`` pour la boucle asyncio : l'attente ne bloque pas
+    la boucle, et le seau partagé est interrogé depuis un thread.
+    """
+    limiter = get_limiter()
+    if limiter is None:
+        return
+    lane_name = lane_name or current_lane()
+    max_wait = _max_wait(lane_name)
+    started_at = time.monotonic()
+    next_wait = sync_to_async(_next_wait, thread_sensitive=False) if limiter.blocking else None
+    _record(lane_name, 'waiting')
+    try:
+        while True:
+            if next_wait is not None:
+                wait = await next_wait(limiter, lane_name, started_at, max_wait)
+            else:
+                wait = _next_wait(limiter, lane_name, started_at, max_wait)
+            if not wait:
+                break
+            await asyncio.sleep(wait)
+    finally:
+        _record(lane_name, 'waiting', -1)
+    _record(lane_name, 'acquired')
+    _record(lane_name, 'wait_seconds', time.monotonic() - started_at)
+
+
+def penalize(retry_after):
+    """Après un 429, suspend tous les appels (tous processus confondus si le seau est partagé)."""
+    limiter = get_limiter()
+    if limiter is not None and retry_after:
+        limiter.penalize(retry_after)
+
+
+def get_stats():
+    """
+    Niveau du seau (partagé si configuré) et, pour ce processus, requêtes en
+    attente, jetons obtenus, abandons et temps d'attente cumulé par voie.
+    """
+    limiter = get_limiter()
+    with _stats_lock:
+        stats = {key: dict(values) for key, values in _stats.items()}
+    stats['tokens'] = limiter.tokens if limiter is not None else None
+    stats['rate'] = limiter.rate if limiter is not None else None
+    return stats
+
+
+def render_prometheus():
+    """Niveau du seau et requêtes en attente par voie, au format texte Prometheus (``/metrics``)."""
+    stats = get_stats()
+    body = instrumentation.render_gauge(
+        'tmdb_rate_waiting', [({'lane': lane_name}, stats['waiting'][lane_name]) for lane_name in LANES],
+    )
+    if stats['tokens'] is not None:
+        body += instrumentation.render_gauge('tmdb_rate_tokens', [({}, stats['tokens'])])
+    return body
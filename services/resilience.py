@@ -0,0 +1,494 @@
+"""
+Résilience des appels TMDB, branchée dans ``services.utils``.
+
+- Disjoncteur par point d'accès (``search/person``, ``movie``...) : après
+  ``TMDB_CIRCUIT_FAILURE_THRESHOLD`` échecs consécutifs (délai dépassé, erreur
+  réseau, 5xx), les appels échouent immédiatement pendant
+  ``TMDB_CIRCUIT_RESET_TIMEOUT`` secondes, puis un seul appel d'essai décide de
+  la réouverture.
+- Requêtes doublées : un GET sans réponse après le p95 des latences récentes de
+  son point d'accès (``TMDB_HEDGE_PERCENTILE``) est relancé une fois, et la
+  première réponse l'emporte. Au plus ``TMDB_HEDGE_MAX_RATIO`` des requêtes sont
+  doublées, chaque doublon prend son jeton au limiteur sans attendre. En
+  synchrone, la requête principale reste sur le thread appelant : un doublon
+  qui répond le premier coupe sa connexion HTTP.
+- Dernières valeurs connues : ``remember``/``last_known`` gardent une copie des
+  entrées du cache Django pendant ``TMDB_STALE_TTL`` secondes, servie quand TMDB
+  échoue après leur expiration. Les fiches films n'en ont pas besoin : celle
+  du stockage des films du cache des paires (``cache_manager.get_movie``) sert.
+- Réponses dégradées : ``mark_degraded`` note pourquoi une réponse est
+  incomplète ou périmée ; ``api.middleware`` l'indique dans l'en-tête
+  ``X-Degraded``. Comme pour ``instrumentation``, les raisons suivent le
+  contexte (``contextvars``) jusque dans les threads de ``run_bounded``.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import rate_limit
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_degraded = contextvars.ContextVar('tmdb_degraded', default=())
+
+
+class CircuitBreaker:
+    """Disjoncteur thread-safe : fermé, ouvert pendant ``reset_timeout`` secondes, puis demi-ouvert (un appel d'essai)."""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_started_at = None
+        self._lock = threading.Lock()
+
+    def allow(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+            # Un seul essai à la fois ; un essai sans nouvelles depuis reset_timeout est considéré perdu.
+            if self._trial_started_at is not None and now - self._trial_started_at < self.reset_timeout:
+                return False
+            self._trial_started_at = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_started_at = None
+
+    def record_failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.failures += 1
+            self._trial_started_at = None
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    _count('circuit_opened')
+                self.state = OPEN
+                self._opened_at = now
+
+
+class LatencyWindow:
+    """Dernières latences réussies d'un point d'accès."""
+
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q, min_samples):
+        with self._lock:
+            if len(self._samples) < max(1, min_samples):
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+_lock = threading.Lock()
+_breakers = {}
+_latencies = {}
+_hedge_credit = 0.0
+_executor = None
+_timer = None
+_stats = {'short_circuited': 0, 'circuit_opened': 0, 'hedged': 0, 'hedge_wins': 0}
+
+
+def _count(key, value=1):
+    with _lock:
+        _stats[key] += value
+
+
+def get_breaker(endpoint):
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.get(endpoint)
+            if breaker is None:
+                breaker = _breakers[endpoint] = CircuitBreaker(
+                    getattr(settings, 'TMDB_CIRCUIT_FAILURE_THRESHOLD', 5),
+                    getattr(settings, 'TMDB_CIRCUIT_RESET_TIMEOUT', 30),
+                )
+    return breaker
+
+
+def allow(endpoint):
+    """False si le disjoncteur du point d'accès est ouvert (l'appel doit échouer tout de suite)."""
+    if get_breaker(endpoint).allow():
+        return True
+    _count('short_circuited')
+    return False
+
+
+def _window(endpoint):
+    window = _latencies.get(endpoint)
+    if window is None:
+        with _lock:
+            window = _latencies.setdefault(endpoint, LatencyWindow(getattr(settings, 'TMDB_HEDGE_WINDOW', 200)))
+    return window
+
+
+def hedge_delay(endpoint):
+    """Attente avant de doubler une requête : p95 des latences récentes, ``None`` sans historique suffisant ou si désactivé."""
+    if not getattr(settings, 'TMDB_HEDGE_ENABLED', True):
+        return None
+    delay = _window(endpoint).percentile(
+        getattr(settings, 'TMDB_HEDGE_PERCENTILE', 0.95), getattr(settings, 'TMDB_HEDGE_MIN_SAMPLES', 20),
+    )
+    if delay is None:
+        return None
+    return max(delay, getattr(settings, 'TMDB_HEDGE_MIN_DELAY', 0.05))
+
+
+def _credit_request():
+    # Chaque requête rapporte TMDB_HEDGE_MAX_RATIO doublon, cumulable jusqu'à un petit plafond.
+    global _hedge_credit
+    with _lock:
+        _hedge_credit = min(_hedge_credit + getattr(settings, 'TMDB_HEDGE_MAX_RATIO', 0.1), 5.0)
+
+
+def _take_hedge_credit():
+    global _hedge_credit
+    with _lock:
+        if _hedge_credit < 1:
+            return False
+        _hedge_credit -= 1
+        return True
+
+
+def _take_hedge():
+    # Pas de file d'attente pour un doublon : sans jeton disponible, on attend la première requête.
+    return _take_hedge_credit() and rate_limit.try_acquire()
+
+
+async def _async_take_hedge():
+    return _take_hedge_credit() and await rate_limit.async_try_acquire()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'TMDB_HEDGE_MAX_WORKERS', 32), thread_name_prefix='tmdb-hedge',
+                )
+    return _executor
+
+
+class HedgeTimer(threading.Thread):
+    """Un seul thread lance les doublons à leur échéance : ni thread ni tâche d'attente par requête."""
+
+    def __init__(self):
+        super().__init__(name='tmdb-hedge-timer', daemon=True)
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def schedule(self, delay, callback):
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), callback))
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._condition.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, callback = heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception:
+                logger.exception("Erreur au lancement d'une requête doublée")
+
+
+def _get_timer():
+    global _timer
+    if _timer is None:
+        with _lock:
+            if _timer is None:
+                _timer = HedgeTimer()
+                _timer.start()
+    return _timer
+
+
+class HedgeCancelled(Exception):
+    """Requête principale abandonnée : son doublon a déjà répondu."""
+
+
+class _HedgedAttempt:
+    """
+    Requête principale de ``hedged`` et son éventuel doublon. Le doublon qui
+    répond le premier coupe la connexion de la requête principale (voir
+    ``bind_connection``), ce qui rend la main au thread appelant.
+    """
+
+    def __init__(self):
+        self.done = False
+        self.cancelled = False
+        self.conn = None
+        self.hedge_started = False
+        self.hedge_result = None
+        self.hedge_error = None
+        self.hedge_finished = threading.Event()
+        self._lock = threading.Lock()
+
+    def start_hedge(self):
+        with self._lock:
+            if self.done:
+                return False
+            self.hedge_started = True
+            return True
+
+    def hedge_succeeded(self, result):
+        with self._lock:
+            self.hedge_result = result
+            self.cancelled = not self.done
+        self.hedge_finished.set()
+        if not self.cancelled:
+            return
+        with _bind_lock:
+            conn = self.conn
+            # La connexion a pu retourner au pool et servir une autre requête entre-temps.
+            if conn is not None and getattr(conn, '_hedged_attempt', None) is self and conn.sock is not None:
+                try:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def hedge_failed(self, error):
+        self.hedge_error = error
+        self.hedge_finished.set()
+
+    def finish(self):
+        """Fin de la requête principale ; True si le doublon a répondu avant elle."""
+        with self._lock:
+            self.done = True
+            return self.cancelled
+
+
+_current_attempt = contextvars.ContextVar('tmdb_hedged_attempt', default=None)
+_bind_lock = threading.Lock()
+
+
+def bind_connection(conn):
+    """
+    Appelé par les connexions HTTP de ``services.utils`` avant chaque envoi :
+    rattache la connexion à la requête principale en cours, ou lève
+    ``HedgeCancelled`` si son doublon a déjà répondu.
+    """
+    attempt = _current_attempt.get()
+    with _bind_lock:
+        conn._hedged_attempt = attempt
+        if attempt is not None:
+            if attempt.cancelled:
+                raise HedgeCancelled("Le doublon a déjà répondu")
+            attempt.conn = conn
+
+
+def raise_if_cancelled():
+    """Lève ``HedgeCancelled`` si le doublon de la requête principale en cours a déjà répondu."""
+    attempt = _current_attempt.get()
+    if attempt is not None and attempt.cancelled:
+        raise HedgeCancelled("Le doublon a déjà répondu")
+
+
+def _timed(endpoint, send):
+    start = time.perf_counter()
+    result = send()
+    _window(endpoint).observe(time.perf_counter() - start)
+    return result
+
+
+def _run_hedge(endpoint, send, attempt):
+    if not attempt.start_hedge():
+        return
+    if not _take_hedge():
+        attempt.hedge_failed(None)
+        return
+    _count('hedged')
+    try:
+        result = _timed(endpoint, send)
+    except Exception as e:
+        attempt.hedge_failed(e)
+        return
+    attempt.hedge_succeeded(result)
+
+
+def hedged(endpoint, send):
+    """
+    ``send()`` (un GET idempotent), relancé une fois s'il n'a pas répondu après
+    ``hedge_delay(endpoint)`` ; renvoie la première réponse obtenue, ou lève
+    l'erreur de la dernière tentative si les deux échouent.
+
+    La requête principale part du thread appelant : seuls les doublons passent
+    par le pool de ``TMDB_HEDGE_MAX_WORKERS`` threads, lancés à l'échéance par ``HedgeTimer``.
+    """
+    _credit_request()
+    delay = hedge_delay(endpoint)
+    if delay is None:
+        return _timed(endpoint, send)
+
+    attempt = _HedgedAttempt()
+    context = contextvars.copy_context()
+
+    def launch():
+        if not attempt.done:
+            _get_executor().submit(context.run, _run_hedge, endpoint, send, attempt)
+
+    _get_timer().schedule(delay, launch)
+    token = _current_attempt.set(attempt)
+    try:
+        result, error = _timed(endpoint, send), None
+    except Exception as e:
+        result, error = None, e
+    finally:
+        _current_attempt.reset(token)
+
+    if attempt.finish():
+        _count('hedge_wins')
+        return attempt.hedge_result
+    if error is None:
+        return result
+    # Requête principale en échec : un doublon déjà parti peut encore répondre.
+    if attempt.hedge_started:
+        attempt.hedge_finished.wait()
+        if attempt.hedge_result is not None:
+            _count('hedge_wins')
+            return attempt.hedge_result
+    raise error
+
+
+async def _async_timed(endpoint, send):
+    start = time.perf_counter()
+    result = await send()
+    _window(endpoint).observe(time.perf_counter() - start)
+    return result
+
+
+async def async_hedged(endpoint, send):
+    """Équivalent asynchrone de ``hedged`` (``send`` renvoie une coroutine) ; la requête perdante est annulée."""
+    _credit_request()
+    delay = hedge_delay(endpoint)
+    if delay is None:
+        return await _async_timed(endpoint, send)
+
+    primary = asyncio.ensure_future(_async_timed(endpoint, send))
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done or not await _async_take_hedge():
+        return await primary
+
+    _count('hedged')
+    hedge = asyncio.ensure_future(_async_timed(endpoint, send))
+    pending = {primary, hedge}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                if task is hedge:
+                    _count('hedge_wins')
+                return task.result()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _last_known_key(key):
+    return f"{key}_last_known"
+
+
+def remember(key, value):
+    """Garde ``value`` comme dernière valeur connue de l'entrée ``key`` du cache Django."""
+    cache.set(_last_known_key(key), value, timeout=getattr(settings, 'TMDB_STALE_TTL', 60 * 60 * 24 * 30))
+
+
+def last_known(key):
+    return cache.get(_last_known_key(key))
+
+
+async def aremember(key, value):
+    await cache.aset(_last_known_key(key), value, timeout=getattr(settings, 'TMDB_STALE_TTL', 60 * 60 * 24 * 30))
+
+
+async def alast_known(key):
+    return await cache.aget(_last_known_key(key))
+
+
+@contextlib.contextmanager
+def track_degraded():
+    """Recueille les raisons de dégradation notées dans le bloc (et dans les blocs englobants)."""
+    reasons = set()
+    token = _degraded.set(_degraded.get() + (reasons,))
+    try:
+        yield reasons
+    finally:
+        _degraded.reset(token)
+
+
+def mark_degraded(*reasons):
+    for collected in _degraded.get():
+        collected.update(reasons)
+
+
+def get_stats():
+    """États des disjoncteurs non fermés et compteurs du processus."""
+    with _lock:
+        stats = dict(_stats)
+        breakers = dict(_breakers)
+    stats['circuits'] = {endpoint: breaker.state for endpoint, breaker in breakers.items() if breaker.state != CLOSED}
+    return stats
+
+
+def reset():
+    """Oublie disjoncteurs, latences et compteurs (tests, processus fils)."""
+    global _hedge_credit
+    with _lock:
+        _breakers.clear()
+        _latencies.clear()
+        _hedge_credit = 0.0
+        _stats.update(short_circuited=0, circuit_opened=0, hedged=0, hedge_wins=0)
+
+
+def _reset_after_fork():
+    global _lock, _bind_lock, _executor, _timer
+    _lock = threading.Lock()
+    _bind_lock = threading.Lock()
+    _executor = None
+    _timer = None
+    reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,172 @@
+"""
+Réponses pré-sérialisées de common-movies.
+
+Le corps JSON d'une paire (éventuellement compressé) est mis en cache à côté
+de l'entrée de la paire, sous une clé qui inclut la date de calcul de l'entrée
+(``computed_at``) et la version des fiches films partagées qu'elle référence
+(``movies_version``, voir ``cache_manager._resolve``), ainsi qu'une empreinte
+des photos et liens IMDb des deux acteurs : il reste valable tant que la paire
+n'est pas recalculée, qu'aucune de ses fiches n'est réécrite et que ces
+informations d'acteur ne changent pas.
+L'ETag est une empreinte du corps, conservée avec lui, ce qui permet de
+répondre 304 sans resérialiser.
+"""
+import gzip
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from . import instrumentation
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Champs d'un film dans ``results`` (voir tmdb._parse_movie_details) ; ``id`` est toujours renvoyé.
+MOVIE_FIELDS = ('id', 'imdb_url', 'title', 'genres', 'poster_path', 'release_year', 'directors', 'characters')
+
+
+def dumps(data):
+    """JSON compact en bytes : orjson s'il est installé, sinon le module json standard."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def parse_fields(value):
+    """
+    Champs de film demandés par ``?fields=title,release_year`` : tuple trié,
+    ou ``None`` pour tous les champs. Lève ``ValueError`` pour un champ inconnu.
+    """
+    if not value:
+        return None
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields.difference(MOVIE_FIELDS)
+    if unknown:
+        raise ValueError(f"Champ(s) inconnu(s): {', '.join(sorted(unknown))}")
+    return tuple(sorted(fields | {'id'}))
+
+
+def select_fields(movies, fields):
+    if fields is None:
+        return movies
+    return [{field: movie.get(field) for field in fields} for movie in movies]
+
+
+def _choose_encoding(request, size):
+    if size < getattr(settings, 'COMMON_MOVIES_COMPRESS_MIN_BYTES', 1024):
+        return None
+    accepted = _accepted_encodings(request)
+    return accepted[0] if accepted else None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+
+def _render(payload, actor1_info, actor2_info, fields):
+    data = {
+        'results': select_fields(payload.get('results', []), fields),
+        'actor1_image': actor1_info.get('image_path'),
+        'actor2_image': actor2_info.get('image_path'),
+        'actor1_imdb': actor1_info.get('imdb_url'),
+        'actor2_imdb': actor2_info.get('imdb_url'),
+    }
+    body = dumps(data)
+    return body, hashlib.md5(body).hexdigest()
+
+
+def _actor_fields_digest(actor1_info, actor2_info):
+    fields = [(info.get('image_path'), info.get('imdb_url')) for info in (actor1_info, actor2_info)]
+    return hashlib.md5(repr(fields).encode('utf-8')).hexdigest()[:12]
+
+
+def _cache_key(actor1_info, actor2_info, version, fields, encoding):
+    fields_key = ','.join(fields) if fields else '*'
+    return f"pair_response_{actor1_info['id']}_{actor2_info['id']}_{version}_{fields_key}_{encoding or 'identity'}"
+
+
+@instrumentation.timed('serialize')
+def get_body(request, payload, actor1_info, actor2_info, fields=None):
+    """
+    ``(body, etag, encoding)`` de la réponse common-movies pour ``payload``,
+    depuis le cache si l'entrée de la paire n'a pas changé depuis la dernière
+    sérialisation. ``encoding`` vaut ``'br'``, ``'gzip'`` ou ``None``.
+    """
+    computed_at = payload.get('computed_at')
+    # Paire introuvable ou entrée antérieure à computed_at : rien à mettre en cache.
+    cacheable = computed_at is not None and actor1_info and actor2_info
+    version = None
+    if cacheable:
+        # Fiches partagées avec d'autres paires, photos et liens IMDb des acteurs : ils changent le corps sans changer computed_at.
+        version = f"{computed_at!r}_{payload.get('movies_version', '')}_{_actor_fields_digest(actor1_info, actor2_info)}"
+    timeout = getattr(settings, 'COMMON_MOVIES_RESPONSE_CACHE_TTL', 60 * 60 * 24)
+
+    if cacheable:
+        # Une variante compressée n'est en cache que si le corps dépassait le seuil de compression.
+        for encoding in _accepted_encodings(request):
+            cached = cache.get(_cache_key(actor1_info, actor2_info, version, fields, encoding))
+            if cached is not None:
+                instrumentation.tag(cache='hit')
+                return cached[0], cached[1], encoding
+
+    identity = cache.get(_cache_key(actor1_info, actor2_info, version, fields, None)) if cacheable else None
+    instrumentation.tag(cache='miss' if identity is None else 'hit')
+    if identity is None:
+        body, etag = _render(payload, actor1_info, actor2_info, fields)
+        identity = (body, _variant_etag(etag, None))
+        if cacheable:
+            cache.set(_cache_key(actor1_info, actor2_info, version, fields, None), identity, timeout=timeout)
+
+    encoding = _choose_encoding(request, len(identity[0]))
+    if not encoding:
+        return identity[0], identity[1], None
+
+    compressed = (_compress(identity[0], encoding), _variant_etag(identity[1].strip('"'), encoding))
+    if cacheable:
+        cache.set(_cache_key(actor1_info, actor2_info, version, fields, encoding), compressed, timeout=timeout)
+    return compressed[0], compressed[1], encoding
+
+
+def _accepted_encodings(request):
+    accepted = {part.split(';')[0].strip().lower() for part in request.headers.get('Accept-Encoding', '').split(',')}
+    return [encoding for encoding in ('br', 'gzip') if encoding in accepted and (encoding != 'br' or brotli is not None)]
+
+
+def _variant_etag(etag, encoding):
+    # Chaque représentation a son propre ETag fort.
+    return f'"{etag}-{encoding}"' if encoding else f'"{etag}"'
+
+
+def _etag_matches(if_none_match, etag):
+    # If-None-Match se compare faiblement (RFC 9110) : un W/ du client ne change rien.
+    if if_none_match.strip() == '*':
+        return True
+    return etag in {tag.removeprefix('W/') for tag in parse_etags(if_none_match)}
+
+
+def common_movies_response(request, payload, actor1_info, actor2_info, fields=None):
+    """Réponse HTTP (200 ou 304) pour la paire, avec ETag et compression éventuelle."""
+    body, etag, encoding = get_body(request, payload, actor1_info, actor2_info, fields)
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and _etag_matches(if_none_match, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,228 @@
+"""
+Degrés de séparation entre deux acteurs : plus courte chaîne acteur – film –
+acteur – … dans le graphe des filmographies (``tmdb.get_movies_by_actor``) et
+des distributions (``tmdb.get_movie_cast``).
+
+Recherche en largeur bidirectionnelle : à chaque tour, le côté dont la
+frontière est la plus petite avance d'un niveau, en récupérant en parallèle
+(``run_bounded``) les filmographies de tout le niveau puis les distributions
+des films découverts. Filmographies et distributions sont en cache Django : les
+recherches suivantes ne les redemandent pas. La recherche s'arrête au-delà de
+``max_hops`` films entre les deux acteurs, ou avant un niveau qui coûterait plus
+que le reste de ``max_calls`` appels TMDB (entrées absentes du cache).
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import cache_manager, tmdb
+from .concurrency import run_bounded
+
+logger = logging.getLogger(__name__)
+
+FOUND = 'found'
+NOT_CONNECTED = 'not_connected'
+HOP_LIMIT = 'hop_limit'
+CALL_BUDGET = 'call_budget'
+
+
+class SearchResult:
+    __slots__ = ('status', 'path', 'expanded_actors', 'expanded_movies', 'upstream_calls')
+
+    def __init__(self, status, path=None, expanded_actors=0, expanded_movies=0, upstream_calls=0):
+        self.status = status
+        self.path = path
+        self.expanded_actors = expanded_actors
+        self.expanded_movies = expanded_movies
+        self.upstream_calls = upstream_calls
+
+    @property
+    def degrees(self):
+        return (len(self.path) - 1) // 2 if self.path else None
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'degrees': self.degrees,
+            'path': self.path,
+            'stats': {
+                'expanded_actors': self.expanded_actors,
+                'expanded_movies': self.expanded_movies,
+                'upstream_calls': self.upstream_calls,
+            },
+        }
+
+
+class _Side:
+    """Un côté de la recherche : acteurs atteints (``acteur -> (acteur précédent, film, profondeur)``) et frontière."""
+    __slots__ = ('parents', 'depth', 'frontier', 'seen_movies')
+
+    def __init__(self, actor_id):
+        self.parents = {actor_id: (None, None, 0)}
+        self.depth = 0
+        self.frontier = [actor_id]
+        self.seen_movies = set()
+
+    def chain_to(self, actor_id):
+        """IDs ``[racine, film, acteur, ..., actor_id]`` en remontant les parents."""
+        chain = [actor_id]
+        previous, movie_id, _ = self.parents[actor_id]
+        while previous is not None:
+            chain += [movie_id, previous]
+            previous, movie_id, _ = self.parents[previous]
+        return chain[::-1]
+
+
+class _Search:
+
+    def __init__(self, max_calls):
+        self.max_calls = max_calls
+        self.result = SearchResult(None)
+        self.actor_names = {}
+        self.movie_titles = {}
+
+    def _charge(self, keys):
+        """Compte les entrées absentes du cache comme appels TMDB ; False si le budget serait dépassé."""
+        missing = len(keys) - len(cache.get_many(keys)) if keys else 0
+        if self.max_calls is not None and self.result.upstream_calls + missing > self.max_calls:
+            return False
+        self.result.upstream_calls += missing
+        return True
+
+    def expand(self, side, other):
+        """
+        Avance ``side`` d'un niveau. Renvoie l'acteur de rencontre donnant le
+        plus court chemin, ``None`` sans rencontre, ou ``False`` si le budget
+        d'appels ne permet pas ce niveau.
+        """
+        frontier = side.frontier
+        if not self._charge([tmdb._actor_credits_cache_key(actor_id) for actor_id in frontier]):
+            return False
+        filmographies = run_bounded(tmdb.get_movies_by_actor, [(actor_id,) for actor_id in frontier])
+
+        skip_documentaries = getattr(settings, 'SEPARATION_SKIP_DOCUMENTARIES', True)
+        movie_owners = {}
+        for actor_id, movies in zip(frontier, filmographies):
+            for movie in movies or ():
+                if movie['id'] in side.seen_movies or (skip_documentaries and tmdb.DOCUMENTARY_GENRE_ID in movie.get('genre_ids', ())):
+                    continue
+                side.seen_movies.add(movie['id'])
+                movie_owners[movie['id']] = actor_id
+                self.movie_titles[movie['id']] = movie.get('title')
+
+        movie_ids = list(movie_owners)
+        if not self._charge([tmdb._movie_cast_cache_key(movie_id) for movie_id in movie_ids]):
+            return False
+        casts = run_bounded(tmdb.get_movie_cast, [(movie_id,) for movie_id in movie_ids])
+
+        # Seuls les premiers rôles relient deux films : borne le facteur de branchement.
+        cast_limit = getattr(settings, 'SEPARATION_CAST_LIMIT', 30)
+        depth = side.depth + 1
+        next_frontier = []
+        meeting, meeting_length = None, None
+        for movie_id, cast in zip(movie_ids, casts):
+            for costar_id, name in (cast or ())[:cast_limit]:
+                self.actor_names.setdefault(costar_id, name)
+                if costar_id in side.parents:
+                    continue
+                side.parents[costar_id] = (movie_owners[movie_id], movie_id, depth)
+                next_frontier.append(costar_id)
+                if costar_id in other.parents:
+                    length = depth + other.parents[costar_id][2]
+                    if meeting_length is None or length < meeting_length:
+                        meeting, meeting_length = costar_id, length
+
+        self.result.expanded_actors += len(frontier)
+        self.result.expanded_movies += len(movie_ids)
+        side.frontier = next_frontier
+        side.depth = depth
+        return meeting
+
+    def path(self, sides, meeting):
+        forward = sides[0].chain_to(meeting)
+        backward = sides[1].chain_to(meeting)[::-1]
+        nodes = []
+        for index, node_id in enumerate(forward + backward[1:]):
+            if index % 2:
+                nodes.append({'type': 'movie', 'id': node_id, 'title': self.movie_titles.get(node_id)})
+            else:
+                nodes.append({'type': 'actor', 'id': node_id, 'name': self.actor_names.get(node_id)})
+        return nodes
+
+
+def find_path(actor1_id, actor2_id, max_hops=None, max_calls=None, bidirectional=True):
+    """
+    Plus courte chaîne entre deux acteurs (IDs TMDB), en au plus ``max_hops``
+    films (``SEPARATION_MAX_HOPS``) et ``max_calls`` appels TMDB
+    (``SEPARATION_MAX_UPSTREAM_CALLS``). ``bidirectional=False`` n'avance que
+    depuis ``actor1_id`` (référence pour les benchmarks).
+    """
+    max_hops = getattr(settings, 'SEPARATION_MAX_HOPS', 6) if max_hops is None else max_hops
+    max_calls = getattr(settings, 'SEPARATION_MAX_UPSTREAM_CALLS', 500) if max_calls is None else max_calls
+    search = _Search(max_calls)
+    if actor1_id == actor2_id:
+        search.result.status = FOUND
+        search.result.path = [{'type': 'actor', 'id': actor1_id, 'name': None}]
+        return search.result
+
+    sides = (_Side(actor1_id), _Side(actor2_id))
+    while search.result.status is None:
+        if sides[0].depth + sides[1].depth >= max_hops:
+            search.result.status = HOP_LIMIT
+            break
+        if bidirectional and len(sides[1].frontier) < len(sides[0].frontier):
+            side, other = sides[1], sides[0]
+        else:
+            side, other = sides
+        if not side.frontier:
+            search.result.status = NOT_CONNECTED
+            break
+
+        meeting = search.expand(side, other)
+        if meeting is False:
+            search.result.status = CALL_BUDGET
+        elif meeting is not None:
+            search.result.status = FOUND
+            search.result.path = search.path(sides, meeting)
+
+    logger.info(
+        f"Séparation {actor1_id} → {actor2_id}: {search.result.status} en {search.result.degrees} saut(s), "
+        f"{search.result.expanded_actors} acteur(s) et {search.result.expanded_movies} film(s) développés, "
+        f"{search.result.upstream_calls} appel(s) TMDB"
+    )
+    return search.result
+
+
+def _reverse(result):
+    return {**result, 'path': result['path'][::-1] if result['path'] else result['path']}
+
+
+def get_separation(actor1_info, actor2_info, max_hops=None):
+    """
+    ``find_path`` entre deux acteurs résolus, avec leurs noms aux extrémités.
+    Un chemin trouvé est mis en cache quel que soit l'ordre des acteurs : le
+    plus court chemin ne dépend pas de ``max_hops``.
+    """
+    max_hops = getattr(settings, 'SEPARATION_MAX_HOPS', 6) if max_hops is None else max_hops
+    id1, id2 = actor1_info['id'], actor2_info['id']
+    cache_key = f"separation_{cache_manager._get_cache_key(id1, id2)}"
+    reversed_order = id1 > id2
+
+    cached = cache.get(cache_key)
+    if cached is not None:
+        result = _reverse(cached) if reversed_order else cached
+        result['stats'] = dict.fromkeys(result['stats'], 0)
+        if result['degrees'] <= max_hops:
+            return result
+        return {**result, 'status': HOP_LIMIT, 'degrees': None, 'path': None}
+
+    result = find_path(id1, id2, max_hops=max_hops).as_dict()
+    if result['path']:
+        result['path'][0]['name'] = actor1_info.get('name') or result['path'][0]['name']
+        result['path'][-1]['name'] = actor2_info.get('name') or result['path'][-1]['name']
+        cache.set(
+            cache_key, _reverse(result) if reversed_order else result,
+            timeout=getattr(settings, 'SEPARATION_CACHE_TTL', 60 * 60 * 24),
+        )
+    return result
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Regroupe les appels concurrents portant sur la même clé : le premier
+    appelant exécute la fonction, les suivants attendent son résultat (ou son
+    exception) au lieu de refaire le même travail. Portée : le processus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        return self._lead(key, call, fn, *args, **kwargs)
+
+    def _lead(self, key, call, fn, *args, **kwargs):
+        """Exécute ``fn`` pour l'appel ``call``, déjà enregistré sous ``key``, et réveille les appels regroupés."""
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            if call.waiters:
+                logger.debug(f"Single-flight: {call.waiters} appel(s) regroupé(s) pour la clé {key}")
+            call.event.set()
+
+    def do_in_background(self, key, fn, *args, **kwargs):
+        """Lance ``fn`` dans un thread, sauf si un calcul pour cette clé est déjà en cours."""
+        # Vérification et enregistrement sous le même verrou : deux appelants ne lancent jamais deux rafraîchissements.
+        with self._lock:
+            if key in self._calls:
+                return False
+            call = self._calls[key] = _Call()
+
+        def _run():
+            try:
+                self._lead(key, call, fn, *args, **kwargs)
+            except Exception:
+                logger.exception(f"Échec du rafraîchissement en arrière-plan pour la clé {key}")
+            finally:
+                connections.close_all()
+
+        try:
+            threading.Thread(target=_run, name=f'singleflight-{key}', daemon=True).start()
+        except RuntimeError as e:
+            call.error = e
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+            raise
+        return True
+
+
+class AsyncSingleFlight:
+    """Équivalent de ``SingleFlight`` pour une boucle asyncio."""
+
+    def __init__(self):
+        self._futures = {}
+
+    async def do(self, key, fn, *args, **kwargs):
+        future = self._futures.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.ensure_future(fn(*args, **kwargs))
+        self._futures[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if self._futures.get(key) is future:
+                del self._futures[key]
+
+
+def _shared_lock_key(key):
+    return f"singleflight_lock_{key}"
+
+
+def acquire_shared_lock(key, timeout=None):
+    """
+    Verrou entre workers via ``cache.add`` : un seul processus obtient la clé
+    tant qu'elle n'a pas expiré ou été relâchée.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'SINGLEFLIGHT_LOCK_TIMEOUT', 30)
+    return cache.add(_shared_lock_key(key), os.getpid(), timeout=timeout)
+
+
+def release_shared_lock(key):
+    cache.delete(_shared_lock_key(key))
+
+
+def wait_for_shared_result(key, fetch, timeout=None, interval=0.1):
+    """
+    Attend qu'un autre worker, détenteur du verrou ``key``, publie son résultat :
+    interroge ``fetch()`` jusqu'à obtenir une valeur, jusqu'à la libération du
+    verrou ou jusqu'à expiration du délai. Renvoie ``None`` si rien n'est venu.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'SINGLEFLIGHT_LOCK_TIMEOUT', 30)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = fetch()
+        if value:
+            return value
+        if not cache.has_key(_shared_lock_key(key)):
+            return fetch()
+        time.sleep(interval)
+    return None
@@ -0,0 +1,295 @@
+"""
+Backend de cache Django à deux niveaux.
+
+- L1 : LRU en mémoire du processus, borné en nombre d'entrées, en octets et
+  en durée de vie (``L1_TTL``), partagé par tous les threads du worker.
+- L2 : un autre alias de ``settings.CACHES`` (table de cache en base, Redis…),
+  partagé par tous les workers et toutes les machines.
+
+Les lectures passent par L1 puis L2 (un succès L2 remplit L1) ; les écritures
+et suppressions vont dans les deux niveaux. Chaque écriture ou suppression est
+aussi ajoutée à un journal d'invalidation stocké dans L2 ; chaque worker le
+relit au plus toutes les ``INVALIDATION_POLL_INTERVAL`` secondes et retire de
+son L1 les clés modifiées ailleurs. Si le journal a été perdu (``clear``,
+expiration), le L1 est vidé entièrement.
+
+Exemple de configuration::
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'services.tiered_cache.TieredCache',
+            'OPTIONS': {'SHARED_CACHE': 'shared', 'L1_MAX_ENTRIES': 5000, 'L1_TTL': 60},
+        },
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        },
+    }
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+INVALIDATION_SEQ_KEY = 'tiered_cache:invalidation:seq'
+INVALIDATION_ENTRY_KEY = 'tiered_cache:invalidation:{}'
+
+
+class _Entry:
+    __slots__ = ('value', 'expires_at', 'size')
+
+    def __init__(self, value, expires_at, size):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
+class LRUStore:
+    """LRU thread-safe de valeurs sérialisées (pickle), borné en entrées et en octets."""
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Compteurs du niveau L2 vus depuis ce processus.
+        self.shared_hits = 0
+        self.shared_misses = 0
+        # Position dans le journal d'invalidation de L2 et date de la dernière lecture.
+        self.invalidation_seq = None
+        self.synced_at = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value
+
+    def get_many(self, keys, now):
+        """``{clé: valeur}`` des clés présentes et non expirées, sous un seul verrou."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None or entry.expires_at <= now:
+                    if entry is not None:
+                        self._remove(key)
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = entry.value
+        return found
+
+    def set(self, key, value, expires_at):
+        size = len(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.delete(key)
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key).size
+
+    def record_shared(self, hit):
+        with self._lock:
+            if hit:
+                self.shared_hits += 1
+            else:
+                self.shared_misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'l1': {
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'bytes': self._bytes,
+                },
+                'l2': {'hits': self.shared_hits, 'misses': self.shared_misses},
+            }
+
+
+# Comme LocMemCache : Django instancie un backend par thread, le L1 est donc partagé au niveau du module.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED_CACHE', 'shared')
+        self.l1_ttl = options.get('L1_TTL', 60)
+        self.poll_interval = options.get('INVALIDATION_POLL_INTERVAL', 1.0)
+        self.invalidation_ttl = options.get('INVALIDATION_LOG_TTL', 60 * 60)
+        # Au-delà, relire le journal coûte plus cher que de repartir d'un L1 vide.
+        self.max_log_replay = options.get('INVALIDATION_MAX_REPLAY', 1000)
+        with _stores_lock:
+            self._l1 = _stores.setdefault(
+                location or self._shared_alias,
+                LRUStore(options.get('L1_MAX_ENTRIES', 5000), options.get('L1_MAX_BYTES')),
+            )
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # Journal d'invalidation
+
+    def _publish_invalidation(self, key):
+        shared = self.shared
+        shared.add(INVALIDATION_SEQ_KEY, 0, timeout=None)
+        # incr est atomique sous Redis ; avec DatabaseCache une collision peut faire manquer une
+        # invalidation aux autres workers, L1_TTL borne alors la péremption.
+        try:
+            seq = shared.incr(INVALIDATION_SEQ_KEY)
+        except ValueError:
+            # Clé effacée entre add et incr (clear concurrent) : les autres workers videront leur L1.
+            return
+        shared.set(INVALIDATION_ENTRY_KEY.format(seq), key, timeout=self.invalidation_ttl)
+        # Nos propres écritures sont déjà appliquées à L1.
+        if self._l1.invalidation_seq == seq - 1:
+            self._l1.invalidation_seq = seq
+
+    def _sync_invalidations(self, now):
+        store = self._l1
+        if now - store.synced_at < self.poll_interval:
+            return
+        store.synced_at = now
+        shared = self.shared
+        seq = shared.get(INVALIDATION_SEQ_KEY)
+        last_seq = store.invalidation_seq
+        if seq == last_seq:
+            return
+        if seq is None or last_seq is None or seq < last_seq or seq - last_seq > self.max_log_replay:
+            store.clear()
+        else:
+            entry_keys = [INVALIDATION_ENTRY_KEY.format(n) for n in range(last_seq + 1, seq + 1)]
+            invalidated = shared.get_many(entry_keys)
+            if len(invalidated) < len(entry_keys):
+                store.clear()
+            else:
+                for key in invalidated.values():
+                    store.delete(key)
+        store.invalidation_seq = seq
+
+    # API BaseCache
+
+    def _l1_expiry(self, timeout, now):
+        expires_at = now + self.l1_ttl
+        backend_expiry = self.get_backend_timeout(timeout)
+        if backend_expiry is not None:
+            expires_at = min(expires_at, backend_expiry)
+        return expires_at
+
+    def get(self, key, default=None, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        self._sync_invalidations(now)
+        value = self._l1.get(l1_key, now)
+        if value is not None:
+            return pickle.loads(value)
+
+        sentinel = object()
+        result = self.shared.get(key, sentinel, version=version)
+        self._l1.record_shared(result is not sentinel)
+        if result is sentinel:
+            return default
+        # Durée restante inconnue côté L2 : L1_TTL borne la péremption.
+        self._l1.set(l1_key, pickle.dumps(result, pickle.HIGHEST_PROTOCOL), now + self.l1_ttl)
+        return result
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self._publish_invalidation(l1_key)
+        now = time.time()
+        if timeout is not None and timeout <= 0:
+            self._l1.delete(l1_key)
+        else:
+            self._l1.set(l1_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._l1_expiry(timeout, now))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        added = self.shared.add(key, value, timeout=timeout, version=version)
+        if added:
+            l1_key = self.make_and_validate_key(key, version=version)
+            self._publish_invalidation(l1_key)
+            self._l1.delete(l1_key)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        l1_key = self.make_and_validate_key(key, version=version)
+        deleted = self.shared.delete(key, version=version)
+        self._publish_invalidation(l1_key)
+        self._l1.delete(l1_key)
+        return deleted
+
+    def has_key(self, key, version=None):
+        sentinel = object()
+        return self.get(key, sentinel, version=version) is not sentinel
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        l1_key = self.make_and_validate_key(key, version=version)
+        self._publish_invalidation(l1_key)
+        self._l1.delete(l1_key)
+        return value
+
+    def clear(self):
+        # Efface aussi le journal : les autres workers verront la séquence disparaître et videront leur L1.
+        self.shared.clear()
+        self._l1.clear()
+        self._l1.invalidation_seq = None
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def stats(self):
+        """Succès, échecs et évictions par niveau, cumulés pour le processus."""
+        return self._l1.stats()
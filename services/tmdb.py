@@ -1,27 +1,65 @@
+import hashlib
+import json
 import requests
 import logging
+import time
+from array import array
+from bisect import bisect_left
 from django.conf import settings
 from django.core.cache import cache
 
-from . import cache_manager
-from .utils import make_tmdb_request, TMDBServiceError
+from . import autocomplete, cache_manager, credits_index, instrumentation, offline_index, resilience, singleflight, warming
+from .concurrency import run_bounded
+from .utils import make_conditional_tmdb_request, make_tmdb_request, normalize_name, TMDBServiceError
 
 logger = logging.getLogger(__name__)
 HEADERS = {"Authorization": f"Bearer {settings.TMDB_BEARER_TOKEN}"}
+ACTOR_NOT_FOUND = 'not_found'
+DOCUMENTARY_GENRE_ID = 99
+MOVIE_DETAILS_CACHE_TTL = 60 * 60 * 24
+
+_pair_flight = singleflight.SingleFlight()
+
+def _autocomplete_cache_key(query):
+    digest = hashlib.md5(normalize_name(query).encode('utf-8')).hexdigest()
+    return f"autocomplete_{digest}"
+
 
 def search_actors(query):
     if not query:
         return []
-    url = f"https://api.themoviedb.org/3/search/person"
-    params = {'query': query, 'include_adult': 'false', 'language': 'en-US'}
 
-    data = make_tmdb_request(
-        url=url,
-        headers=HEADERS,
-        params=params,
-        action_description=f"searching actors for '{query}'"
-    )
+    offline_results = offline_index.search_actors(query)
+    if offline_results or offline_index.is_offline():
+        return offline_results or []
+
+    # Index local d'abord ; TMDB seulement si l'index ne remplit pas la liste.
+    local_results = autocomplete.search(query)
+    if len(local_results) >= getattr(settings, 'AUTOCOMPLETE_MIN_LOCAL_RESULTS', 5):
+        return local_results
+
+    cache_key = _autocomplete_cache_key(query)
+    remote_results = cache.get(cache_key)
+    if remote_results is None:
+        url = f"https://api.themoviedb.org/3/search/person"
+        params = {'query': query, 'include_adult': 'false', 'language': 'en-US'}
+
+        data = make_tmdb_request(
+            url=url,
+            headers=HEADERS,
+            params=params,
+            action_description=f"searching actors for '{query}'"
+        )
+
+        remote_results = _parse_actor_search(data)
+        cache.set(cache_key, remote_results, timeout=getattr(settings, 'AUTOCOMPLETE_CACHE_TTL', 60 * 60 * 24))
+        for actor in remote_results:
+            autocomplete.record_actor(actor)
+
+    return autocomplete.merge_results(remote_results, local_results)
 
+
+def _parse_actor_search(data):
     top_results = data.get("results", [])[:5]
     results = [{
         'id': actor['id'],
@@ -32,57 +70,222 @@ def search_actors(query):
     return sorted(results, key=lambda x: x['popularity'], reverse=True)
 
 
+def _actor_info_cache_key(actor_name):
+    digest = hashlib.md5(normalize_name(actor_name).encode('utf-8')).hexdigest()
+    return f"actor_info_{digest}"
+
+
+def _get_actor_imdb_id(actor_id):
+    cache_key = f"actor_{actor_id}_imdb_id"
+    imdb_id = cache.get(cache_key)
+    if imdb_id is not None:
+        return imdb_id or None
+
+    detail_url = f"https://api.themoviedb.org/3/person/{actor_id}/external_ids"
+    detail_data = make_tmdb_request(
+        url=detail_url,
+        headers=HEADERS,
+        action_description=f"getting external IDs for actor ID {actor_id}"
+    )
+    imdb_id = detail_data.get('imdb_id')
+    cache.set(cache_key, imdb_id or '', timeout=getattr(settings, 'ACTOR_IMDB_CACHE_TTL', 60 * 60 * 24 * 90))
+    return imdb_id
+
+
+def _build_actor_info(actor_data, imdb_id):
+    return {
+        'id': actor_data['id'],
+        'name': actor_data.get('name'),
+        'image_path': actor_data.get('profile_path'),
+        'imdb_url': f"https://www.imdb.com/name/{imdb_id}/" if imdb_id else None
+    }
+
+
+def get_person(actor_id):
+    """
+    ``{'id', 'name', 'profile_path'}`` de l'acteur, pour un acteur connu par son
+    seul ID (vue costars). Lève ``TMDBNotFoundError`` si TMDB ne le connaît pas.
+    """
+    local_person = offline_index.person(actor_id)
+    if local_person is not None:
+        return local_person
+
+    cache_key = f"actor_{actor_id}_person"
+    person = cache.get(cache_key)
+    if person is None:
+        data = make_tmdb_request(
+            url=f"https://api.themoviedb.org/3/person/{actor_id}",
+            headers=HEADERS,
+            params={'language': 'en-US'},
+            action_description=f"getting person details for actor ID {actor_id}"
+        )
+        person = {'id': actor_id, 'name': data.get('name') or '', 'profile_path': data.get('profile_path')}
+        cache.set(cache_key, person, timeout=getattr(settings, 'ACTOR_INFO_CACHE_TTL', 60 * 60 * 24 * 7))
+    return dict(person)
+
+
+@instrumentation.timed('actor_info')
 def get_actor_info(actor_name):
+    local_info = offline_index.find_actor(actor_name)
+    if local_info is not None or offline_index.is_offline():
+        instrumentation.tag(cache='local')
+        return local_info
+
+    cache_key = _actor_info_cache_key(actor_name)
+    cached_info = cache.get(cache_key)
+    if cached_info == ACTOR_NOT_FOUND:
+        instrumentation.tag(cache='hit')
+        logger.debug(f"Cache Django hit (négatif) pour l'acteur: {actor_name}")
+        return None
+    if cached_info:
+        instrumentation.tag(cache='hit')
+        logger.debug(f"Cache Django hit pour l'acteur: {actor_name}")
+        return cached_info.copy()
+
+    instrumentation.tag(cache='miss')
     search_url = f"https://api.themoviedb.org/3/search/person"
     search_params = {'query': actor_name, 'language': 'en-US'}
 
-    search_data = make_tmdb_request(
-        url=search_url,
-        headers=HEADERS,
-        params=search_params,
-        action_description=f"searching for actor '{actor_name}'"
-    )
+    try:
+        search_data = make_tmdb_request(
+            url=search_url,
+            headers=HEADERS,
+            params=search_params,
+            action_description=f"searching for actor '{actor_name}'"
+        )
+    except TMDBServiceError:
+        stale_info = resilience.last_known(cache_key)
+        if not stale_info:
+            raise
+        logger.warning(f"TMDB indisponible, infos expirées servies pour l'acteur: {actor_name}")
+        resilience.mark_degraded('stale_actor')
+        return stale_info.copy()
 
     results = search_data.get('results')
     if not results:
         logger.info(f"Aucun résultat TMDB trouvé pour l'acteur: {actor_name}")
+        cache.set(cache_key, ACTOR_NOT_FOUND, timeout=getattr(settings, 'ACTOR_NOT_FOUND_CACHE_TTL', 60 * 60))
         return None
 
     actor_data = results[0]
     actor_id = actor_data['id']
+    autocomplete.record_actor(actor_data)
 
-    detail_url = f"https://api.themoviedb.org/3/person/{actor_id}/external_ids"
     imdb_id = None
+    imdb_lookup_failed = False
     try:
-        detail_data = make_tmdb_request(
-            url=detail_url,
-            headers=HEADERS,
-            action_description=f"getting external IDs for actor ID {actor_id}"
-        )
-        imdb_id = detail_data.get('imdb_id')
+        imdb_id = _get_actor_imdb_id(actor_id)
     except TMDBServiceError as e:
+        imdb_lookup_failed = True
         logger.warning(f"Impossible de récupérer les détails externes TMDB (IMDb ID) pour l'acteur ID {actor_id}. Erreur: {e}", exc_info=False)
 
-    imdb_url = f"https://www.imdb.com/name/{imdb_id}/" if imdb_id else None
+    actor_info = _build_actor_info(actor_data, imdb_id)
+
+    # Sans IMDb ID à cause d'une erreur TMDB, on ne fige pas l'entrée : le prochain appel réessaiera.
+    if not imdb_lookup_failed:
+        cache.set(cache_key, actor_info, timeout=getattr(settings, 'ACTOR_INFO_CACHE_TTL', 60 * 60 * 24 * 7))
+        resilience.remember(cache_key, actor_info)
+
+    return actor_info.copy()
+
 
+def _actor_credits_cache_key(actor_id):
+    return f"actor_{actor_id}_credits"
+
+
+def _pack_credits(movies, etag):
+    """
+    Forme compacte d'une filmographie pour le cache : IDs triés dans un
+    ``array`` d'entiers et, à la même position, un tuple (titre, date,
+    personnage, genres) par film.
+    """
+    movies = sorted(movies, key=lambda movie: movie['id'])
+    ids = array('l', (movie['id'] for movie in movies)).tobytes()
+    rows = [
+        (movie.get('title'), movie.get('release_date'), movie.get('character'), tuple(movie.get('genre_ids') or ()))
+        for movie in movies
+    ]
     return {
-        'id': actor_id,
-        'image_path': actor_data.get('profile_path'),
-        'imdb_url': imdb_url
+        'etag': etag,
+        'checked_at': time.time(),
+        # Empreinte du contenu, enregistrée dans les paires calculées à partir de cette filmographie.
+        'version': hashlib.md5(ids + repr(rows).encode('utf-8')).hexdigest()[:16],
+        'ids': ids,
+        'rows': rows,
     }
 
 
+def _unpack_credits(entry):
+    ids = array('l')
+    ids.frombytes(entry['ids'])
+    return [{
+        'id': movie_id,
+        'title': title,
+        'release_date': release_date,
+        'character': character,
+        'genre_ids': list(genre_ids),
+    } for movie_id, (title, release_date, character, genre_ids) in zip(ids, entry['rows'])]
+
+
+def _credits_need_revalidation(entry):
+    return time.time() - entry['checked_at'] >= getattr(settings, 'ACTOR_CREDITS_REVALIDATE_AFTER', 60 * 60 * 24)
+
+
+def _store_credits(cache_key, entry, data, etag):
+    """Nouvelle entrée après un GET conditionnel (``data`` à None = 304, l'entrée en cache reste valable)."""
+    if data is None:
+        entry = {**entry, 'checked_at': time.time()}
+    else:
+        entry = _pack_credits(_parse_movie_credits(data), etag)
+    cache.set(cache_key, entry, timeout=getattr(settings, 'ACTOR_CREDITS_CACHE_TTL', 60 * 60 * 24 * 30))
+    return entry
+
+
 def get_movies_by_actor(actor_id):
+    """
+    Filmographie de l'acteur, depuis le cache tant qu'elle a été vérifiée il y a
+    moins de ``ACTOR_CREDITS_REVALIDATE_AFTER`` secondes, sinon revalidée par
+    ETag (un 304 ne retélécharge rien). Si TMDB est indisponible, la version en
+    cache est servie.
+    """
+    return _unpack_credits(_get_credits_entry(actor_id))
+
+
+@instrumentation.timed('credits')
+def _get_credits_entry(actor_id):
+    local_movies = offline_index.movies_by_actor(actor_id)
+    if local_movies is not None:
+        instrumentation.tag(cache='local')
+        return _pack_credits(local_movies, None)
+
+    cache_key = _actor_credits_cache_key(actor_id)
+    entry = cache.get(cache_key)
+    if entry and not _credits_need_revalidation(entry):
+        instrumentation.tag(cache='hit')
+        return entry
+    instrumentation.tag(cache='revalidate' if entry else 'miss')
+
     url = f"https://api.themoviedb.org/3/person/{actor_id}/movie_credits"
-    params = {'language': 'en"-US'}
+    params = {'language': 'en-US'}
 
-    data = make_tmdb_request(
-        url=url,
-        headers=HEADERS,
-        params=params,
-        action_description=f"getting movie credits for actor ID {actor_id}"
-    )
+    try:
+        data, etag = make_conditional_tmdb_request(
+            url=url,
+            headers=HEADERS,
+            etag=entry and entry['etag'],
+            params=params,
+            action_description=f"getting movie credits for actor ID {actor_id}"
+        )
+    except TMDBServiceError as e:
+        if not entry:
+            raise
+        logger.warning(f"Revalidation des crédits impossible pour l'acteur ID {actor_id}, version en cache servie. Erreur: {e}")
+        return entry
+
+    return _store_credits(cache_key, entry, data, etag)
 
+
+def _parse_movie_credits(data):
     return [{
         'id': movie['id'],
         'title': movie.get('title'),
@@ -92,7 +295,40 @@ def get_movies_by_actor(actor_id):
     } for movie in data.get('cast', [])]
 
 
+def _movie_cast_cache_key(movie_id):
+    return f"movie_{movie_id}_cast"
+
+
+def get_movie_cast(movie_id):
+    """Distribution du film dans l'ordre du générique : ``[(actor_id, nom), ...]``."""
+    local_cast = offline_index.movie_cast(movie_id)
+    if local_cast is not None:
+        return local_cast
+
+    cache_key = _movie_cast_cache_key(movie_id)
+    cast = cache.get(cache_key)
+    if cast is not None:
+        return cast
+
+    url = f"https://api.themoviedb.org/3/movie/{movie_id}/credits"
+    data = make_tmdb_request(
+        url=url,
+        headers=HEADERS,
+        params={'language': 'en-US'},
+        action_description=f"getting cast for movie ID {movie_id}"
+    )
+    members = sorted(data.get('cast', []), key=lambda member: member.get('order', 0))
+    cast = [(member['id'], member.get('name')) for member in members]
+    cache.set(cache_key, cast, timeout=getattr(settings, 'MOVIE_CAST_CACHE_TTL', 60 * 60 * 24 * 30))
+    return cast
+
+
 def fetch_common_movie_details(movie_id, actor1_character, actor2_character):
+    local_movie = offline_index.movie_details(movie_id)
+    if local_movie is not None:
+        local_movie['characters'] = {'actor1_dynamic': actor1_character, 'actor2_dynamic': actor2_character}
+        return local_movie
+
     cache_key = f"internal_movie_{movie_id}_details"
     cached_movie = cache.get(cache_key)
     if cached_movie:
@@ -112,73 +348,444 @@ def fetch_common_movie_details(movie_id, actor1_character, actor2_character):
             action_description=f"getting details for movie ID {movie_id}"
         )
     except TMDBServiceError as e:
-        logger.warning(f"Impossible de récupérer les détails TMDB pour film ID {movie_id}. Erreur: {e}", exc_info=False)
-        return None
+        # Dernière fiche connue plutôt qu'un film en moins ; la paire est marquée dégradée dans les deux cas.
+        stale_movie = cache_manager.get_movie(movie_id)
+        logger.warning(f"Impossible de récupérer les détails TMDB pour film ID {movie_id}{', fiche expirée servie' if stale_movie else ''}. Erreur: {e}", exc_info=False)
+        if not stale_movie:
+            return None
+        resilience.mark_degraded('stale_movie')
+        stale_movie['characters'] = {'actor1_dynamic': actor1_character, 'actor2_dynamic': actor2_character}
+        return stale_movie
+
+    movie_details = _parse_movie_details(movie_id, data)
+
+    # Seule copie à durée de vie courte : le stockage des films du cache des paires garde la fiche tant qu'une
+    # paire la référence, sans date de récupération, et ne peut donc pas dire si elle est encore fraîche.
+    cache.set(cache_key, movie_details.copy(), timeout=MOVIE_DETAILS_CACHE_TTL)
+
+    movie_details['characters'] = {'actor1_dynamic': actor1_character, 'actor2_dynamic': actor2_character}
+    return movie_details
 
+
+def _parse_movie_details(movie_id, data):
     directors = [crew['name'] for crew in data.get('credits', {}).get('crew', []) if crew['job'] == 'Director']
     imdb_id = data.get('external_ids', {}).get('imdb_id')
     imdb_url = f"https://www.imdb.com/title/{imdb_id}/" if imdb_id else None
     release_date = data.get('release_date', '')
     release_year = release_date.split('-')[0] if release_date else ''
 
-    movie_details = {
+    return {
         'id': movie_id, 'imdb_url': imdb_url, 'title': data.get('title'),
         'genres': data.get('genres', []), 'poster_path': data.get('poster_path'),
         'release_year': release_year, 'directors': directors,
-        'characters': {'actor1_dynamic': actor1_character, 'actor2_dynamic': actor2_character}
     }
 
-    cache_payload = movie_details.copy()
-    del cache_payload['characters']
-    cache.set(cache_key, cache_payload, timeout=60 * 60 * 24)
 
-    return movie_details
+def _common_movie_fetch_args(actor1_movies, actor2_movies):
+    """(movie_id, personnage acteur 1, personnage acteur 2) pour chaque film commun, triés par ID."""
+    actor1_movie_map = {movie['id']: movie for movie in actor1_movies}
+    actor2_movie_map = {movie['id']: movie for movie in actor2_movies}
+    common_movie_ids = set(actor1_movie_map.keys()).intersection(set(actor2_movie_map.keys()))
+
+    fetch_args = []
+    for common_id in sorted(common_movie_ids):
+        actor1_character = actor1_movie_map.get(common_id, {}).get('character', 'N/A')
+        actor2_character = actor2_movie_map.get(common_id, {}).get('character', 'N/A')
+        fetch_args.append((common_id, actor1_character, actor2_character))
+    return fetch_args
+
+
+def intersect_sorted(id_arrays):
+    """
+    Intersection de séquences d'IDs triées, de la plus courte à la plus
+    longue : chaque ID restant est cherché par dichotomie dans la séquence
+    suivante, et le calcul s'arrête dès que l'intersection est vide.
+    """
+    arrays = sorted(id_arrays, key=len)
+    if not arrays:
+        return []
+    common = list(dict.fromkeys(arrays[0]))
+    for ids in arrays[1:]:
+        if not common:
+            break
+        kept = []
+        position = 0
+        for movie_id in common:
+            position = bisect_left(ids, movie_id, position)
+            if position == len(ids):
+                break
+            if ids[position] == movie_id:
+                kept.append(movie_id)
+        common = kept
+    return common
+
+
+def _credit_ids(entry):
+    ids = array('l')
+    ids.frombytes(entry['ids'])
+    return ids
+
+
+def _credit_character(entry, ids, movie_id):
+    position = bisect_left(ids, movie_id)
+    if position < len(ids) and ids[position] == movie_id:
+        return entry['rows'][position][2] or 'N/A'
+    return 'N/A'
+
+
+def summarize_common_movies(movies1, movies2):
+    """Films communs (format court, sans appel TMDB) triés par date de sortie, pour ActorPair."""
+    ids1 = {m['id']: m for m in movies1}
+    ids2 = {m['id']: m for m in movies2}
+    common_ids = set(ids1.keys()) & set(ids2.keys())
+
+    common_movies = []
+    for mid in common_ids:
+        movie = ids1[mid]
+        genre_ids = movie.get("genre_ids", [])
+        if not movie.get("title"):
+            continue
+        common_movies.append({
+            "id": mid,
+            "title": movie["title"],
+            "release_date": movie.get("release_date") or "",
+            "is_documentary": DOCUMENTARY_GENRE_ID in genre_ids,
+        })
+    return sorted(common_movies, key=lambda m: m["release_date"] or "9999")
+
+
+def _details_version(details):
+    content = {key: value for key, value in details.items() if key != 'characters'}
+    return hashlib.md5(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+
+
+def _plan_pair_rebuild(fetch_args, previous, cached_details):
+    """
+    Reconstruction incrémentale d'une paire à partir de son entrée précédente.
+
+    Renvoie ``(details_list, movie_deps)`` : pour chaque film de ``fetch_args``,
+    la fiche réutilisée (celle de ``previous``, ou celle du cache Django
+    ``cached_details`` si sa version a changé) ou ``None`` si elle doit être
+    récupérée ; ``movie_deps`` donne ``[version, date de récupération]`` des
+    fiches réutilisées. Les fiches plus anciennes que ``PAIR_MOVIE_DETAILS_MAX_AGE``
+    sont toujours récupérées de nouveau.
+    """
+    now = time.time()
+    max_age = getattr(settings, 'PAIR_MOVIE_DETAILS_MAX_AGE', 60 * 60 * 24 * 7)
+    previous_deps = (previous or {}).get('deps') or {}
+    previous_movies = {movie['id']: movie for movie in (previous or {}).get('results', [])}
+
+    details_list = []
+    movie_deps = {}
+    for movie_id, _, _ in fetch_args:
+        movie = previous_movies.get(movie_id)
+        dep = previous_deps.get('movies', {}).get(str(movie_id))
+        if movie is None or dep is None or now - dep[1] > max_age:
+            details_list.append(None)
+            continue
+        cached = cached_details.get(movie_id)
+        if cached and _details_version(cached) != dep[0]:
+            movie, dep = cached, [_details_version(cached), now]
+        details_list.append(dict(movie))
+        movie_deps[str(movie_id)] = dep
+    return details_list, movie_deps
+
+
+def _pair_deps(credit_versions, fetch_args, details_list, movie_deps):
+    """
+    Entrées dont la paire dépend : versions des filmographies (``credit_versions``,
+    acteur 1 puis acteur 2) et, par ID de film commun, version de la fiche. Les
+    rôles ne sont pas répétés ici, ils sont dans ``results`` ; ``actors`` donne
+    l'ordre de leurs personnages (``_previous_fetch_args``).
+    """
+    now = time.time()
+    movies = dict(movie_deps)
+    for (movie_id, _, _), details in zip(fetch_args, details_list):
+        if details and str(movie_id) not in movies:
+            movies[str(movie_id)] = [_details_version(details), now]
+    return {
+        'actors': [int(actor_id) for actor_id in credit_versions],
+        'credits': credit_versions,
+        'movies': movies,
+    }
+
+
+def _previous_fetch_args(previous, actor1_id, actor2_id):
+    """
+    ``fetch_args`` de l'entrée précédente, relus dans ses ``results`` (rôles de
+    ``actor1_id`` puis de ``actor2_id``), ou ``None`` s'ils ne peuvent pas l'être.
+    La clé de la paire ne dépend pas de l'ordre des acteurs : l'entrée a pu être
+    calculée dans l'ordre inverse, que donne ``deps['actors']``.
+    """
+    order = (previous.get('deps') or {}).get('actors')
+    if order == [actor1_id, actor2_id]:
+        swapped = False
+    elif order == [actor2_id, actor1_id]:
+        swapped = True
+    else:
+        return None
+    fetch_args = []
+    for movie in previous['results']:
+        characters = list((movie.get('characters') or {}).values())
+        if len(characters) != 2:
+            return None
+        if swapped:
+            characters.reverse()
+        fetch_args.append((movie['id'], *characters))
+    return fetch_args
+
+
+def _build_pair_payload(actor1_name, actor2_name, actor1_info, actor2_info, fetch_args, details_list, deps=None, degraded=None):
+    calculated_common_movies_details = []
+    for (common_id, actor1_character, actor2_character), movie_details in zip(fetch_args, details_list):
+        if movie_details:
+            movie_details['characters'] = { actor1_name: actor1_character, actor2_name: actor2_character }
+            calculated_common_movies_details.append(movie_details)
+
+    payload = {
+        'results': calculated_common_movies_details,
+        'actor1_image': actor1_info.get('image_path'), 'actor2_image': actor2_info.get('image_path'),
+        'actor1_imdb': actor1_info.get('imdb_url'), 'actor2_imdb': actor2_info.get('imdb_url'),
+        # Identifie cette version de la paire (réponses pré-sérialisées, services/responses.py).
+        'computed_at': time.time(),
+    }
+    if deps is not None:
+        payload['deps'] = deps
+    if degraded:
+        # Raisons (fiches expirées ou manquantes) : voir resilience.mark_degraded et PAIR_CACHE_DEGRADED_TTL.
+        payload['degraded'] = sorted(degraded)
+    return payload
 
 
 def find_common_movies(actor1_name, actor2_name):
+    payload, actor1_info, actor2_info = get_common_movies_payload(actor1_name, actor2_name)
+    return payload.get('results', []), actor1_info, actor2_info
+
+
+def get_common_movies_payload(actor1_name, actor2_name):
+    """Comme ``find_common_movies``, mais renvoie l'entrée complète de la paire (``{}`` si un acteur est introuvable)."""
     actor1_info = get_actor_info(actor1_name)
     actor2_info = get_actor_info(actor2_name)
 
     if not actor1_info or not actor2_info:
         logger.info(f"Infos acteur(s) introuvables pour la paire: '{actor1_name}' / '{actor2_name}'")
-        return [], actor1_info or {}, actor2_info or {}
+        return {}, actor1_info or {}, actor2_info or {}
 
+    warming.record_request(actor1_name, actor2_name, actor1_info, actor2_info)
     actor1_id = actor1_info['id']
     actor2_id = actor2_info['id']
 
-    cached_data = cache_manager.get_from_cache(actor1_id, actor2_id)
-    if cached_data:
-        logger.info(f"Cache JSON hit pour la paire d'ID: {actor1_id}_{actor2_id}")
-        return cached_data.get('results', []), actor1_info, actor2_info
+    cache_key = cache_manager._get_cache_key(actor1_id, actor2_id)
+    cached_entry = cache_manager.get_entry(actor1_id, actor2_id)
+    if cached_entry:
+        cached_data, is_fresh = cached_entry
+        if is_fresh:
+            logger.info(f"Cache JSON hit pour la paire d'ID: {actor1_id}_{actor2_id}")
+            resilience.mark_degraded(*cached_data.get('degraded', ()))
+            return cached_data, actor1_info, actor2_info
+        if getattr(settings, 'PAIR_CACHE_STALE_WHILE_REVALIDATE', False):
+            logger.info(f"Cache JSON périmé pour la paire d'ID: {actor1_id}_{actor2_id}, rafraîchissement en arrière-plan")
+            _pair_flight.do_in_background(
+                cache_key, _compute_pair_shared, cache_key, actor1_name, actor2_name, actor1_info, actor2_info
+            )
+            resilience.mark_degraded(*cached_data.get('degraded', ()))
+            return cached_data, actor1_info, actor2_info
 
     logger.info(f"Cache JSON miss pour la paire d'ID: {actor1_id}_{actor2_id}. Calcul en cours...")
-    actor1_movies = get_movies_by_actor(actor1_id)
-    actor2_movies = get_movies_by_actor(actor2_id)
+    try:
+        payload = _pair_flight.do(
+            cache_key, _compute_pair_shared, cache_key, actor1_name, actor2_name, actor1_info, actor2_info
+        )
+    except TMDBServiceError as e:
+        payload = _stale_on_error(e, actor1_id, actor2_id)
+    resilience.mark_degraded(*payload.get('degraded', ()))
+    return payload, actor1_info, actor2_info
+
+
+def _stale_on_error(error, *actor_ids):
+    """Dernière entrée connue de la paire (ou du groupe), même expirée, quand son calcul échoue ; sinon relève l'erreur."""
+    stale = cache_manager.get_any(*actor_ids)
+    if stale is None:
+        raise error
+    logger.warning(f"Calcul impossible pour {cache_manager._get_cache_key(*actor_ids)}, entrée expirée servie. Erreur: {error}")
+    resilience.mark_degraded('stale_pair')
+    return stale
+
+
+def get_group_common_movies(actor_names):
+    """
+    Films communs à tous les acteurs de ``actor_names`` (2 noms ou plus) :
+    ``(movies, actors)``, ``actors`` listant ``(nom, infos)`` par acteur. Si un
+    acteur est introuvable, ``movies`` est vide et ses infos valent ``{}``. Un
+    nom qui désigne un acteur déjà présent est ignoré ; deux acteurs distincts
+    passent par le calcul des paires et partagent son cache.
+    """
+    actor_infos = run_bounded(get_actor_info, [(name,) for name in actor_names])
+    if not all(actor_infos):
+        logger.info(f"Infos acteur(s) introuvables pour le groupe: {', '.join(actor_names)}")
+        return [], [(name, info or {}) for name, info in zip(actor_names, actor_infos)]
+
+    distinct = {}
+    for name, info in zip(actor_names, actor_infos):
+        distinct.setdefault(info['id'], (name, info))
+    actors = list(distinct.values())
+    actor_names = [name for name, _ in actors]
+    actor_infos = [info for _, info in actors]
+    if len(actors) == 2:
+        payload, _, _ = get_common_movies_payload(*actor_names)
+        return payload.get('results', []), actors
+
+    actor_ids = [info['id'] for info in actor_infos]
+    cache_key = cache_manager._get_cache_key(*actor_ids)
+    cached_entry = cache_manager.get_entry(*actor_ids)
+    if cached_entry:
+        cached_data, is_fresh = cached_entry
+        if is_fresh:
+            resilience.mark_degraded(*cached_data.get('degraded', ()))
+            return cached_data.get('results', []), actors
+        if getattr(settings, 'PAIR_CACHE_STALE_WHILE_REVALIDATE', False):
+            _pair_flight.do_in_background(cache_key, _compute_group, actor_names, actor_infos)
+            resilience.mark_degraded(*cached_data.get('degraded', ()))
+            return cached_data.get('results', []), actors
 
-    actor1_movie_map = {movie['id']: movie for movie in actor1_movies}
-    actor2_movie_map = {movie['id']: movie for movie in actor2_movies}
-    common_movie_ids = set(actor1_movie_map.keys()).intersection(set(actor2_movie_map.keys()))
+    try:
+        payload = _pair_flight.do(cache_key, _compute_group, actor_names, actor_infos)
+    except TMDBServiceError as e:
+        payload = _stale_on_error(e, *actor_ids)
+    resilience.mark_degraded(*payload.get('degraded', ()))
+    return payload.get('results', []), actors
+
+
+def _compute_group(actor_names, actor_infos):
+    entries = run_bounded(_get_credits_entry, [(info['id'],) for info in actor_infos])
+    if not all(entries):
+        raise TMDBServiceError(f"Filmographie(s) indisponible(s) pour le groupe: {', '.join(actor_names)}")
+
+    id_arrays = [_credit_ids(entry) for entry in entries]
+    common_ids = intersect_sorted(id_arrays)
+
+    # Fiches films uniquement pour l'intersection finale.
+    results = []
+    degraded = set()
+    if common_ids:
+        with instrumentation.span('movie_details'), resilience.track_degraded() as degraded:
+            details_list = run_bounded(
+                fetch_common_movie_details,
+                [(movie_id, None, None) for movie_id in common_ids],
+                timeout=getattr(settings, 'COMMON_MOVIES_DEADLINE', None),
+            )
+            if None in details_list:
+                resilience.mark_degraded('missing_movies')
+        for movie_id, movie_details in zip(common_ids, details_list):
+            if movie_details:
+                movie_details['characters'] = {
+                    name: _credit_character(entry, ids, movie_id)
+                    for name, entry, ids in zip(actor_names, entries, id_arrays)
+                }
+                results.append(movie_details)
+    actor_ids = [info['id'] for info in actor_infos]
+    logger.info(f"Groupe {cache_manager._get_cache_key(*actor_ids)}: {len(results)} film(s) commun(s) sur {len(id_arrays)} filmographies")
+
+    payload = {'results': results, 'computed_at': time.time()}
+    if degraded:
+        payload['degraded'] = sorted(degraded)
+    cache_manager.set_entry(actor_ids, payload)
+    return payload
+
+
+def _compute_pair_shared(cache_key, actor1_name, actor2_name, actor1_info, actor2_info):
+    """
+    Calcule la paire une seule fois pour tous les workers si SINGLEFLIGHT_SHARED_LOCK
+    est activé : les autres attendent que le résultat apparaisse dans le cache des paires.
+    """
+    if not getattr(settings, 'SINGLEFLIGHT_SHARED_LOCK', False):
+        return _compute_pair(actor1_name, actor2_name, actor1_info, actor2_info)
+
+    lock_key = f"pair_{cache_key}"
+    if singleflight.acquire_shared_lock(lock_key):
+        try:
+            return _compute_pair(actor1_name, actor2_name, actor1_info, actor2_info)
+        finally:
+            singleflight.release_shared_lock(lock_key)
+
+    cached_data = singleflight.wait_for_shared_result(
+        lock_key, lambda: cache_manager.get_from_cache(actor1_info['id'], actor2_info['id'])
+    )
+    if cached_data:
+        return cached_data
+    return _compute_pair(actor1_name, actor2_name, actor1_info, actor2_info)
+
+
+def _use_credits_index():
+    """Index SQL des crédits (``credits_index``), inutile quand l'index TMDB local (``offline_index``) est ouvert."""
+    return getattr(settings, 'CREDITS_INDEX_ENABLED', False) and offline_index.get_index() is None
+
+
+def _credit_version(actor_info):
+    """Version de la filmographie de l'acteur, revérifiée si nécessaire (index local ou cache ETag)."""
+    if _use_credits_index():
+        actor = credits_index.ensure_actor_indexed(actor_info['id'], actor_info.get('name'), actor_info.get('image_path'))
+        return actor.credits_ingested_at.isoformat()
+    return _get_credits_entry(actor_info['id']).get('version')
+
+
+def _pair_inputs(actor1_info, actor2_info, previous):
+    """
+    ``(credit_versions, fetch_args)`` de la paire. Les films communs de
+    ``previous`` sont repris tels quels si aucune des deux filmographies n'a changé.
+    """
+    credit_versions = {str(info['id']): _credit_version(info) for info in (actor1_info, actor2_info)}
+    previous_deps = (previous or {}).get('deps') or {}
+    if previous_deps.get('credits') == credit_versions:
+        fetch_args = _previous_fetch_args(previous, actor1_info['id'], actor2_info['id'])
+        if fetch_args is not None:
+            return credit_versions, fetch_args
+    if _use_credits_index():
+        return credit_versions, credits_index.common_movie_fetch_args(actor1_info, actor2_info)
+    return credit_versions, _common_movie_fetch_args(
+        get_movies_by_actor(actor1_info['id']), get_movies_by_actor(actor2_info['id'])
+    )
 
-    calculated_common_movies_details = []
-    if common_movie_ids:
-        for common_id in common_movie_ids:
-            actor1_character = actor1_movie_map.get(common_id, {}).get('character', 'N/A')
-            actor2_character = actor2_movie_map.get(common_id, {}).get('character', 'N/A')
 
-            movie_details = fetch_common_movie_details(common_id, actor1_character, actor2_character)
+def _compute_pair(actor1_name, actor2_name, actor1_info, actor2_info):
+    actor1_id = actor1_info['id']
+    actor2_id = actor2_info['id']
 
-            if movie_details:
-                movie_details['characters'] = { actor1_name: actor1_character, actor2_name: actor2_character }
-                calculated_common_movies_details.append(movie_details)
+    # Entrée précédente, même expirée : seuls les films ajoutés à l'intersection seront récupérés.
+    previous = cache_manager.get_any(actor1_id, actor2_id) if getattr(settings, 'PAIR_CACHE_INCREMENTAL_REFRESH', True) else None
+    credit_versions, fetch_args = _pair_inputs(actor1_info, actor2_info, previous)
+
+    details_list, movie_deps = [], {}
+    degraded = set()
+    if fetch_args:
+        with instrumentation.span('movie_details') as tags, resilience.track_degraded() as degraded:
+            cached_details = {}
+            if previous:
+                keys = {f"internal_movie_{movie_id}_details": movie_id for movie_id, _, _ in fetch_args}
+                cached_details = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+            details_list, movie_deps = _plan_pair_rebuild(fetch_args, previous, cached_details)
+            missing = [index for index, details in enumerate(details_list) if details is None]
+            tags['cache'] = 'hit' if not missing else 'miss' if len(missing) == len(fetch_args) else 'partial'
+            if missing:
+                fetched = run_bounded(
+                    fetch_common_movie_details,
+                    [fetch_args[index] for index in missing],
+                    timeout=getattr(settings, 'COMMON_MOVIES_DEADLINE', None),
+                )
+                for index, details in zip(missing, fetched):
+                    details_list[index] = details
+                if None in fetched:
+                    resilience.mark_degraded('missing_movies')
+        logger.info(f"Paire {actor1_id}_{actor2_id}: {len(missing)} fiche(s) film récupérée(s) sur {len(fetch_args)}")
     else:
         logger.info(f"Aucun ID de film commun trouvé entre {actor1_name} et {actor2_name}.")
 
-    payload_to_cache_and_return = {
-        'results': calculated_common_movies_details,
-        'actor1_image': actor1_info.get('image_path'), 'actor2_image': actor2_info.get('image_path'),
-        'actor1_imdb': actor1_info.get('imdb_url'), 'actor2_imdb': actor2_info.get('imdb_url'),
-    }
+    # Sans dépendances, la prochaine reconstruction redemande les fiches expirées ou manquantes.
+    deps = None if degraded else _pair_deps(credit_versions, fetch_args, details_list, movie_deps)
+    payload_to_cache_and_return = _build_pair_payload(
+        actor1_name, actor2_name, actor1_info, actor2_info, fetch_args, details_list, deps, degraded
+    )
 
     cache_manager.add_to_cache(actor1_id, actor2_id, payload_to_cache_and_return)
 
-    return payload_to_cache_and_return.get('results', []), actor1_info, actor2_info
\ No newline at end of file
+    return payload_to_cache_and_return
@@ -0,0 +1,345 @@
+"""
+Version asynchrone du service TMDB, pour les vues servies par ASGI (uvicorn).
+
+Les fonctions ont la même signature et les mêmes caches que ``services.tmdb`` ;
+seules les entrées/sorties changent. ``scripts/fetch_selected_pairs.py`` et le
+code synchrone continuent d'utiliser ``services.tmdb``.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from . import autocomplete, cache_manager, instrumentation, offline_index, resilience, tmdb, warming
+from .singleflight import AsyncSingleFlight
+from .tmdb import (
+    ACTOR_NOT_FOUND, HEADERS,
+    _actor_credits_cache_key, _actor_info_cache_key, _autocomplete_cache_key, _build_actor_info, _build_pair_payload,
+    _common_movie_fetch_args, _credits_need_revalidation, _pack_credits, _pair_deps, _parse_actor_search,
+    _parse_movie_credits, _parse_movie_details, _plan_pair_rebuild, _previous_fetch_args, _unpack_credits,
+)
+from .utils import async_make_conditional_tmdb_request, async_make_tmdb_request, TMDBServiceError
+
+logger = logging.getLogger(__name__)
+
+_pair_flight = AsyncSingleFlight()
+
+
+async def search_actors(query):
+    if not query:
+        return []
+
+    offline_results = offline_index.search_actors(query)
+    if offline_results or offline_index.is_offline():
+        return offline_results or []
+
+    # Initialisation depuis ActorPair (ORM) hors de la boucle d'événements ; jamais retentée ici si elle a échoué.
+    if not autocomplete.is_seeded():
+        await sync_to_async(autocomplete.get_index)()
+    local_results = autocomplete.search(query, seed=False)
+    if len(local_results) >= getattr(settings, 'AUTOCOMPLETE_MIN_LOCAL_RESULTS', 5):
+        return local_results
+
+    cache_key = _autocomplete_cache_key(query)
+    remote_results = await cache.aget(cache_key)
+    if remote_results is None:
+        url = f"https://api.themoviedb.org/3/search/person"
+        params = {'query': query, 'include_adult': 'false', 'language': 'en-US'}
+
+        data = await async_make_tmdb_request(
+            url=url,
+            headers=HEADERS,
+            params=params,
+            action_description=f"searching actors for '{query}'"
+        )
+
+        remote_results = _parse_actor_search(data)
+        await cache.aset(cache_key, remote_results, timeout=getattr(settings, 'AUTOCOMPLETE_CACHE_TTL', 60 * 60 * 24))
+        for actor in remote_results:
+            autocomplete.record_actor(actor)
+
+    return autocomplete.merge_results(remote_results, local_results)
+
+
+async def _get_actor_imdb_id(actor_id):
+    cache_key = f"actor_{actor_id}_imdb_id"
+    imdb_id = await cache.aget(cache_key)
+    if imdb_id is not None:
+        return imdb_id or None
+
+    detail_url = f"https://api.themoviedb.org/3/person/{actor_id}/external_ids"
+    detail_data = await async_make_tmdb_request(
+        url=detail_url,
+        headers=HEADERS,
+        action_description=f"getting external IDs for actor ID {actor_id}"
+    )
+    imdb_id = detail_data.get('imdb_id')
+    await cache.aset(cache_key, imdb_id or '', timeout=getattr(settings, 'ACTOR_IMDB_CACHE_TTL', 60 * 60 * 24 * 90))
+    return imdb_id
+
+
+@instrumentation.timed('actor_info')
+async def get_actor_info(actor_name):
+    local_info = offline_index.find_actor(actor_name)
+    if local_info is not None or offline_index.is_offline():
+        instrumentation.tag(cache='local')
+        return local_info
+
+    cache_key = _actor_info_cache_key(actor_name)
+    cached_info = await cache.aget(cache_key)
+    if cached_info == ACTOR_NOT_FOUND:
+        instrumentation.tag(cache='hit')
+        return None
+    if cached_info:
+        instrumentation.tag(cache='hit')
+        return cached_info.copy()
+
+    instrumentation.tag(cache='miss')
+    search_url = f"https://api.themoviedb.org/3/search/person"
+    search_params = {'query': actor_name, 'language': 'en-US'}
+
+    try:
+        search_data = await async_make_tmdb_request(
+            url=search_url,
+            headers=HEADERS,
+            params=search_params,
+            action_description=f"searching for actor '{actor_name}'"
+        )
+    except TMDBServiceError:
+        stale_info = await resilience.alast_known(cache_key)
+        if not stale_info:
+            raise
+        logger.warning(f"TMDB indisponible, infos expirées servies pour l'acteur: {actor_name}")
+        resilience.mark_degraded('stale_actor')
+        return stale_info.copy()
+
+    results = search_data.get('results')
+    if not results:
+        logger.info(f"Aucun résultat TMDB trouvé pour l'acteur: {actor_name}")
+        await cache.aset(cache_key, ACTOR_NOT_FOUND, timeout=getattr(settings, 'ACTOR_NOT_FOUND_CACHE_TTL', 60 * 60))
+        return None
+
+    actor_data = results[0]
+    actor_id = actor_data['id']
+    autocomplete.record_actor(actor_data)
+
+    imdb_id = None
+    imdb_lookup_failed = False
+    try:
+        imdb_id = await _get_actor_imdb_id(actor_id)
+    except TMDBServiceError as e:
+        imdb_lookup_failed = True
+        logger.warning(f"Impossible de récupérer les détails externes TMDB (IMDb ID) pour l'acteur ID {actor_id}. Erreur: {e}", exc_info=False)
+
+    actor_info = _build_actor_info(actor_data, imdb_id)
+    if not imdb_lookup_failed:
+        await cache.aset(cache_key, actor_info, timeout=getattr(settings, 'ACTOR_INFO_CACHE_TTL', 60 * 60 * 24 * 7))
+        await resilience.aremember(cache_key, actor_info)
+
+    return actor_info.copy()
+
+
+async def get_movies_by_actor(actor_id):
+    return _unpack_credits(await _get_credits_entry(actor_id))
+
+
+@instrumentation.timed('credits')
+async def _get_credits_entry(actor_id):
+    local_movies = offline_index.movies_by_actor(actor_id)
+    if local_movies is not None:
+        instrumentation.tag(cache='local')
+        return _pack_credits(local_movies, None)
+
+    cache_key = _actor_credits_cache_key(actor_id)
+    entry = await cache.aget(cache_key)
+    if entry and not _credits_need_revalidation(entry):
+        instrumentation.tag(cache='hit')
+        return entry
+    instrumentation.tag(cache='revalidate' if entry else 'miss')
+
+    url = f"https://api.themoviedb.org/3/person/{actor_id}/movie_credits"
+    params = {'language': 'en-US'}
+
+    try:
+        data, etag = await async_make_conditional_tmdb_request(
+            url=url,
+            headers=HEADERS,
+            etag=entry and entry['etag'],
+            params=params,
+            action_description=f"getting movie credits for actor ID {actor_id}"
+        )
+    except TMDBServiceError as e:
+        if not entry:
+            raise
+        logger.warning(f"Revalidation des crédits impossible pour l'acteur ID {actor_id}, version en cache servie. Erreur: {e}")
+        return entry
+
+    entry = {**entry, 'checked_at': time.time()} if data is None else _pack_credits(_parse_movie_credits(data), etag)
+    await cache.aset(cache_key, entry, timeout=getattr(settings, 'ACTOR_CREDITS_CACHE_TTL', 60 * 60 * 24 * 30))
+    return entry
+
+
+async def fetch_common_movie_details(movie_id, actor1_character, actor2_character):
+    local_movie = offline_index.movie_details(movie_id)
+    if local_movie is not None:
+        local_movie['characters'] = {'actor1_dynamic': actor1_character, 'actor2_dynamic': actor2_character}
+        return local_movie
+
+    cache_key = f"internal_movie_{movie_id}_details"
+    cached_movie = await cache.aget(cache_key)
+    if cached_movie:
+        movie_data_to_return = cached_movie.copy()
+        movie_data_to_return['characters'] = {'actor1_dynamic': actor1_character, 'actor2_dynamic': actor2_character}
+        return movie_data_to_return
+
+    url = f"https://api.themoviedb.org/3/movie/{movie_id}"
+    params = {'append_to_response': 'credits,external_ids', 'language': 'en-US'}
+    try:
+        data = await async_make_tmdb_request(
+            url=url,
+            headers=HEADERS,
+            params=params,
+            action_description=f"getting details for movie ID {movie_id}"
+        )
+    except TMDBServiceError as e:
+        stale_movie = await sync_to_async(cache_manager.get_movie, thread_sensitive=False)(movie_id)
+        logger.warning(f"Impossible de récupérer les détails TMDB pour film ID {movie_id}{', fiche expirée servie' if stale_movie else ''}. Erreur: {e}", exc_info=False)
+        if not stale_movie:
+            return None
+        resilience.mark_degraded('stale_movie')
+        stale_movie['characters'] = {'actor1_dynamic': actor1_character, 'actor2_dynamic': actor2_character}
+        return stale_movie
+
+    movie_details = _parse_movie_details(movie_id, data)
+    await cache.aset(cache_key, movie_details.copy(), timeout=tmdb.MOVIE_DETAILS_CACHE_TTL)
+
+    movie_details['characters'] = {'actor1_dynamic': actor1_character, 'actor2_dynamic': actor2_character}
+    return movie_details
+
+
+async def gather_bounded(func, args_list, max_in_flight=None, timeout=None):
+    """Équivalent asynchrone de ``concurrency.run_bounded`` : ordre conservé, ``None`` en cas d'échec ou de délai dépassé."""
+    args_list = list(args_list)
+    if not args_list:
+        return []
+    if max_in_flight is None:
+        max_in_flight = getattr(settings, 'TMDB_MAX_IN_FLIGHT', 8)
+    semaphore = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def _call(args):
+        async with semaphore:
+            return await func(*args)
+
+    tasks = [asyncio.ensure_future(_call(args)) for args in args_list]
+    done, not_done = await asyncio.wait(tasks, timeout=timeout)
+    for task in not_done:
+        task.cancel()
+    if not_done:
+        logger.warning(f"Délai de {timeout}s dépassé: {len(not_done)} appel(s) sur {len(args_list)} abandonné(s)")
+
+    results = []
+    for args, task in zip(args_list, tasks):
+        if task in done and not task.cancelled() and task.exception() is None:
+            results.append(task.result())
+        else:
+            if task in done and not task.cancelled():
+                logger.warning(f"Appel concurrent échoué pour {args}: {task.exception()}")
+            results.append(None)
+    return results
+
+
+async def find_common_movies(actor1_name, actor2_name):
+    payload, actor1_info, actor2_info = await get_common_movies_payload(actor1_name, actor2_name)
+    return payload.get('results', []), actor1_info, actor2_info
+
+
+async def get_common_movies_payload(actor1_name, actor2_name):
+    """Comme ``find_common_movies``, mais renvoie l'entrée complète de la paire (``{}`` si un acteur est introuvable)."""
+    actor1_info, actor2_info = await asyncio.gather(get_actor_info(actor1_name), get_actor_info(actor2_name))
+
+    if not actor1_info or not actor2_info:
+        logger.info(f"Infos acteur(s) introuvables pour la paire: '{actor1_name}' / '{actor2_name}'")
+        return {}, actor1_info or {}, actor2_info or {}
+
+    warming.record_request(actor1_name, actor2_name, actor1_info, actor2_info)
+    actor1_id = actor1_info['id']
+    actor2_id = actor2_info['id']
+
+    cache_key = cache_manager._get_cache_key(actor1_id, actor2_id)
+    cached_entry = await sync_to_async(cache_manager.get_entry, thread_sensitive=False)(actor1_id, actor2_id)
+    if cached_entry:
+        cached_data, is_fresh = cached_entry
+        if is_fresh:
+            resilience.mark_degraded(*cached_data.get('degraded', ()))
+            return cached_data, actor1_info, actor2_info
+        if getattr(settings, 'PAIR_CACHE_STALE_WHILE_REVALIDATE', False):
+            # Le rafraîchissement passe par le chemin synchrone, dans un thread, pour survivre à la requête.
+            tmdb._pair_flight.do_in_background(
+                cache_key, tmdb._compute_pair_shared, cache_key, actor1_name, actor2_name, actor1_info, actor2_info
+            )
+            resilience.mark_degraded(*cached_data.get('degraded', ()))
+            return cached_data, actor1_info, actor2_info
+
+    try:
+        payload = await _pair_flight.do(cache_key, _compute_pair, actor1_name, actor2_name, actor1_info, actor2_info)
+    except TMDBServiceError as e:
+        payload = await sync_to_async(tmdb._stale_on_error, thread_sensitive=False)(e, actor1_id, actor2_id)
+    resilience.mark_degraded(*payload.get('degraded', ()))
+    return payload, actor1_info, actor2_info
+
+
+async def _pair_inputs(actor1_info, actor2_info, previous):
+    """Équivalent asynchrone de ``tmdb._pair_inputs``."""
+    if tmdb._use_credits_index():
+        return await sync_to_async(tmdb._pair_inputs)(actor1_info, actor2_info, previous)
+
+    entries = await asyncio.gather(_get_credits_entry(actor1_info['id']), _get_credits_entry(actor2_info['id']))
+    credit_versions = {str(info['id']): entry.get('version') for info, entry in zip((actor1_info, actor2_info), entries)}
+    previous_deps = (previous or {}).get('deps') or {}
+    if previous_deps.get('credits') == credit_versions:
+        fetch_args = _previous_fetch_args(previous, actor1_info['id'], actor2_info['id'])
+        if fetch_args is not None:
+            return credit_versions, fetch_args
+    return credit_versions, _common_movie_fetch_args(_unpack_credits(entries[0]), _unpack_credits(entries[1]))
+
+
+async def _compute_pair(actor1_name, actor2_name, actor1_info, actor2_info):
+    actor1_id = actor1_info['id']
+    actor2_id = actor2_info['id']
+
+    previous = None
+    if getattr(settings, 'PAIR_CACHE_INCREMENTAL_REFRESH', True):
+        previous = await sync_to_async(cache_manager.get_any, thread_sensitive=False)(actor1_id, actor2_id)
+    credit_versions, fetch_args = await _pair_inputs(actor1_info, actor2_info, previous)
+
+    details_list, movie_deps = [], {}
+    degraded = set()
+    if fetch_args:
+        with instrumentation.span('movie_details') as tags, resilience.track_degraded() as degraded:
+            cached_details = {}
+            if previous:
+                keys = {f"internal_movie_{movie_id}_details": movie_id for movie_id, _, _ in fetch_args}
+                cached_details = {keys[key]: value for key, value in (await cache.aget_many(list(keys))).items()}
+            details_list, movie_deps = _plan_pair_rebuild(fetch_args, previous, cached_details)
+            missing = [index for index, details in enumerate(details_list) if details is None]
+            tags['cache'] = 'hit' if not missing else 'miss' if len(missing) == len(fetch_args) else 'partial'
+            fetched = await gather_bounded(
+                fetch_common_movie_details,
+                [fetch_args[index] for index in missing],
+                timeout=getattr(settings, 'COMMON_MOVIES_DEADLINE', None),
+            )
+            for index, details in zip(missing, fetched):
+                details_list[index] = details
+            if None in fetched:
+                resilience.mark_degraded('missing_movies')
+
+    deps = None if degraded else _pair_deps(credit_versions, fetch_args, details_list, movie_deps)
+    payload_to_cache_and_return = _build_pair_payload(
+        actor1_name, actor2_name, actor1_info, actor2_info, fetch_args, details_list, deps, degraded
+    )
+    await sync_to_async(cache_manager.add_to_cache, thread_sensitive=False)(actor1_id, actor2_id, payload_to_cache_and_return)
+
+    return payload_to_cache_and_return
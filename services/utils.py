@@ -1,41 +1,476 @@
+import asyncio
+import functools
+import os
+import random
+import threading
+import time
+import unicodedata
+import weakref
+import httpx
 import requests
 import logging
+from django.conf import settings
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException, HTTPError, Timeout
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
 import json
 
+from . import instrumentation, rate_limit, resilience
+from .singleflight import SingleFlight
+
 logger = logging.getLogger(__name__)
 
+DEFAULT_HTTP_CONFIG = {
+    'POOL_CONNECTIONS': 4,
+    'POOL_SIZE': 20,
+    'CONNECT_TIMEOUT': 3.05,
+    'READ_TIMEOUT': 5,
+    'RETRIES': 2,
+    'BACKOFF_FACTOR': 0.3,
+    'BACKOFF_JITTER': 0.3,
+    'BACKOFF_MAX': 10,
+}
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+_async_clients = weakref.WeakKeyDictionary()
+_request_flight = SingleFlight()
+
+
 class TMDBServiceError(Exception):
     pass
 
-def make_tmdb_request(url, headers, method='GET', params=None, timeout=5, action_description="making TMDB request"):
+
+class TMDBCircuitOpenError(TMDBServiceError):
+    """Disjoncteur ouvert pour ce point d'accès : l'appel échoue sans partir vers TMDB."""
+
+
+class TMDBNotFoundError(TMDBServiceError):
+    """TMDB a répondu 404 : la ressource demandée (acteur, film) n'existe pas."""
+
+
+def normalize_name(name):
+    """Forme canonique d'un nom pour les clés de cache : sans accents, casse ni espaces superflus."""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def _resolve_url(url):
+    """Redirige les URL TMDB vers ``TMDB_API_BASE_URL`` (faux serveur des benchmarks, proxy...)."""
+    base_url = getattr(settings, 'TMDB_API_BASE_URL', TMDB_BASE_URL).rstrip('/')
+    if base_url != TMDB_BASE_URL and url.startswith(TMDB_BASE_URL):
+        return base_url + url[len(TMDB_BASE_URL):]
+    return url
+
+
+def get_http_config():
+    return {**DEFAULT_HTTP_CONFIG, **getattr(settings, 'TMDB_HTTP', {})}
+
+
+class _HedgeAwareConnection:
+    """Connexion que le doublon gagnant de ``resilience.hedged`` peut couper pendant que la requête principale attend."""
+
+    def connect(self):
+        super().connect()
+        resilience.bind_connection(self)
+
+    def request(self, *args, **kwargs):
+        resilience.bind_connection(self)
+        return super().request(*args, **kwargs)
+
+
+class _HTTPConnection(_HedgeAwareConnection, HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_HedgeAwareConnection, HTTPSConnection):
+    pass
+
+
+class _HTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class _HTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+class RateLimitedRetry(Retry):
+    """``Retry`` urllib3 dont chaque nouvelle tentative prend son jeton au limiteur, comme la première."""
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        # Requête principale déjà servie par son doublon : pas de jeton pour une tentative inutile.
+        resilience.raise_if_cancelled()
+        rate_limit.acquire()
+
+
+class TMDBAdapter(HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+
+def _build_session():
+    config = get_http_config()
+    retry = RateLimitedRetry(
+        total=config['RETRIES'],
+        connect=config['RETRIES'],
+        read=config['RETRIES'],
+        status=config['RETRIES'],
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        backoff_factor=config['BACKOFF_FACTOR'],
+        backoff_jitter=config['BACKOFF_JITTER'],
+        backoff_max=config['BACKOFF_MAX'],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = TMDBAdapter(
+        pool_connections=config['POOL_CONNECTIONS'],
+        pool_maxsize=config['POOL_SIZE'],
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate', 'Connection': 'keep-alive'})
+    return session
+
+
+def get_session():
+    """
+    Session HTTP partagée par tous les threads du processus. Le pool urllib3
+    est thread-safe ; chaque worker gunicorn recrée la sienne après le fork.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def reset_session():
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+    with _stats_lock:
+        _stats.update(requests=0, errors=0, total_seconds=0.0, max_seconds=0.0)
+
+
+def _reset_after_fork():
+    global _session, _session_lock, _stats_lock
+    _session = None
+    _session_lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    _stats.update(requests=0, errors=0, total_seconds=0.0, max_seconds=0.0)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _endpoint_label(url):
+    # Étiquette à faible cardinalité pour les métriques : les IDs sont retirés de l'URL.
+    path = url.split('/3/', 1)[-1]
+    return '/'.join(part for part in path.split('/') if not part.isdigit()) or 'unknown'
+
+
+def _record_timing(elapsed, failed, url):
+    instrumentation.record('tmdb_request', elapsed, endpoint=_endpoint_label(url), outcome='error' if failed else 'ok')
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['total_seconds'] += elapsed
+        _stats['max_seconds'] = max(_stats['max_seconds'], elapsed)
+        if failed:
+            _stats['errors'] += 1
+
+
+def get_http_stats():
+    """
+    Compteurs du processus courant : nombre d'appels, durées, nombre de
+    connexions ouvertes vs réutilisées d'après les pools urllib3, et état des
+    disjoncteurs et requêtes doublées (``resilience``).
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+
+    new_connections = 0
+    pooled_requests = 0
+    session = _session
+    if session is not None:
+        for adapter in {id(a): a for a in session.adapters.values()}.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    new_connections += pool.num_connections
+                    pooled_requests += pool.num_requests
+
+    stats['new_connections'] = new_connections
+    stats['reused_connections'] = max(0, pooled_requests - new_connections)
+    stats['avg_seconds'] = stats['total_seconds'] / stats['requests'] if stats['requests'] else 0.0
+    stats['resilience'] = resilience.get_stats()
+    return stats
+
+
+def _request_key(method, url, params):
+    return f"{method} {url}?{sorted((params or {}).items())}"
+
+
+def make_tmdb_request(url, headers, method='GET', params=None, timeout=None, action_description="making TMDB request"):
+    """
+    Appel TMDB synchrone. Les GET identiques (URL + paramètres) lancés en même
+    temps par plusieurs threads partagent une seule requête HTTP.
+    """
+    if method == 'GET' and getattr(settings, 'TMDB_REQUEST_COALESCING', True):
+        return _request_flight.do(
+            _request_key(method, url, params),
+            _send_tmdb_request, url, headers, method, params, timeout, action_description,
+        )
+    return _send_tmdb_request(url, headers, method, params, timeout, action_description)
+
+
+def make_conditional_tmdb_request(url, headers, etag=None, params=None, timeout=None, action_description="making TMDB request"):
+    """
+    GET conditionnel (``If-None-Match``) : renvoie ``(data, etag)``, avec
+    ``data`` à ``None`` si TMDB répond 304 Not Modified.
+    """
+    args = (url, headers, 'GET', params, timeout, action_description, etag, True)
+    if getattr(settings, 'TMDB_REQUEST_COALESCING', True):
+        return _request_flight.do(f"{_request_key('GET', url, params)} etag={etag}", _send_tmdb_request, *args)
+    return _send_tmdb_request(*args)
+
+
+def _check_online(action_description):
+    """En mode ``offline`` (``TMDB_DATA_MODE``), aucune requête ne part vers TMDB."""
+    if getattr(settings, 'TMDB_DATA_MODE', 'remote') == 'offline':
+        raise TMDBServiceError(f"TMDB API is disabled in offline mode while {action_description}.")
+
+
+def _check_circuit(endpoint, action_description):
+    if not resilience.allow(endpoint):
+        raise TMDBCircuitOpenError(f"TMDB circuit breaker is open for {endpoint} while {action_description}.")
+
+
+def _record_health(endpoint, healthy):
+    # None : issue sans rapport avec la santé de TMDB (bug local...), le disjoncteur n'en tient pas compte.
+    if healthy is True:
+        resilience.get_breaker(endpoint).record_success()
+    elif healthy is False:
+        resilience.get_breaker(endpoint).record_failure()
+
+
+def _send_tmdb_request(url, headers, method, params, timeout, action_description, etag=None, conditional=False):
     logger.debug(f"TMDB API call: {method} {url} - Action: {action_description}")
+    _check_online(action_description)
+    endpoint = _endpoint_label(url)
+    _check_circuit(endpoint, action_description)
+    if timeout is None:
+        config = get_http_config()
+        timeout = (config['CONNECT_TIMEOUT'], config['READ_TIMEOUT'])
+
+    try:
+        rate_limit.acquire()
+    except rate_limit.RateLimitTimeout as e:
+        logger.warning(f"TMDB rate limit queue timeout while {action_description} (URL: {url}): {e}")
+        raise TMDBServiceError(f"TMDB rate limit queue is full while {action_description}.")
+
+    if conditional and etag:
+        headers = {**headers, 'If-None-Match': etag}
+
+    start = time.perf_counter()
+    failed = True
+    healthy = None
     try:
-        response = requests.request(
+        send = functools.partial(
+            get_session().request,
             method=method,
-            url=url,
+            url=_resolve_url(url),
             headers=headers,
             params=params,
             timeout=timeout
         )
+        # Seuls les GET, idempotents, sont doublés quand TMDB tarde.
+        response = resilience.hedged(endpoint, send) if method == 'GET' else send()
+        if conditional and response.status_code == 304:
+            failed = False
+            healthy = True
+            return None, etag
         response.raise_for_status()
+        healthy = True
 
         data = response.json()
-        return data
+        failed = False
+        return (data, response.headers.get('ETag')) if conditional else data
 
+    except rate_limit.RateLimitTimeout as e:
+        logger.warning(f"TMDB rate limit queue timeout before retrying while {action_description} (URL: {url}): {e}")
+        raise TMDBServiceError(f"TMDB rate limit queue is full while {action_description}.")
     except Timeout:
+        healthy = False
         logger.error(f"TMDB Timeout while {action_description} (URL: {url})")
         raise TMDBServiceError(f"Timeout communicating with TMDB API while {action_description}.")
     except HTTPError as http_err:
         status_code = http_err.response.status_code
+        healthy = status_code < 500
+        if status_code == 429:
+            rate_limit.penalize(_retry_after(http_err.response))
         logger.error(f"TMDB HTTP error {status_code} while {action_description} (URL: {url}): {http_err}")
-        raise TMDBServiceError(f"TMDB API returned HTTP error {status_code} while {action_description}.")
+        error_class = TMDBNotFoundError if status_code == 404 else TMDBServiceError
+        raise error_class(f"TMDB API returned HTTP error {status_code} while {action_description}.")
     except RequestException as req_err:
+        healthy = False
+        logger.error(f"TMDB Request error while {action_description} (URL: {url}): {req_err}")
+        raise TMDBServiceError(f"Network error connecting to TMDB API while {action_description}.")
+    except json.JSONDecodeError as json_err:
+        healthy = False
+        logger.error(f"TMDB JSON decode error while {action_description} (URL: {url}): {json_err}")
+        raise TMDBServiceError(f"Invalid JSON response from TMDB API while {action_description}.")
+    except Exception as e:
+        logger.exception(f"Unexpected error during TMDB request while {action_description} (URL: {url})")
+        raise TMDBServiceError(f"An unexpected error occurred while {action_description}.")
+    finally:
+        elapsed = time.perf_counter() - start
+        _record_timing(elapsed, failed, url)
+        _record_health(endpoint, healthy)
+        logger.debug(f"TMDB API call done in {elapsed * 1000:.1f} ms: {method} {url}")
+
+
+def get_async_client():
+    """
+    Client httpx asynchrone propre à la boucle d'événements courante : sous
+    uvicorn il n'y en a qu'une et toutes les requêtes partagent le pool.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        config = get_http_config()
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=config['POOL_SIZE'], max_keepalive_connections=config['POOL_SIZE']),
+            timeout=httpx.Timeout(config['READ_TIMEOUT'], connect=config['CONNECT_TIMEOUT']),
+            headers={'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'},
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _retry_after(response):
+    retry_after = response.headers.get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return None
+
+
+def _retry_delay(response, attempt, config):
+    retry_after = _retry_after(response)
+    if retry_after is not None:
+        return min(retry_after, config['BACKOFF_MAX'])
+    delay = config['BACKOFF_FACTOR'] * (2 ** attempt) + random.uniform(0, config['BACKOFF_JITTER'])
+    return min(delay, config['BACKOFF_MAX'])
+
+
+async def async_make_conditional_tmdb_request(url, headers, etag=None, params=None, timeout=None, action_description="making TMDB request"):
+    """Équivalent asynchrone de ``make_conditional_tmdb_request``."""
+    return await async_make_tmdb_request(
+        url, headers, params=params, timeout=timeout, action_description=action_description, etag=etag, conditional=True
+    )
+
+
+async def async_make_tmdb_request(url, headers, method='GET', params=None, timeout=None, action_description="making TMDB request",
+                                  etag=None, conditional=False):
+    """Équivalent asynchrone de ``make_tmdb_request``, mêmes retries et mêmes erreurs."""
+    logger.debug(f"TMDB API async call: {method} {url} - Action: {action_description}")
+    _check_online(action_description)
+    endpoint = _endpoint_label(url)
+    _check_circuit(endpoint, action_description)
+    config = get_http_config()
+    if timeout is None:
+        timeout = httpx.Timeout(config['READ_TIMEOUT'], connect=config['CONNECT_TIMEOUT'])
+
+    try:
+        await rate_limit.async_acquire()
+    except rate_limit.RateLimitTimeout as e:
+        logger.warning(f"TMDB rate limit queue timeout while {action_description} (URL: {url}): {e}")
+        raise TMDBServiceError(f"TMDB rate limit queue is full while {action_description}.")
+
+    if conditional and etag:
+        headers = {**headers, 'If-None-Match': etag}
+
+    start = time.perf_counter()
+    failed = True
+    healthy = None
+    try:
+        client = get_async_client()
+        send = functools.partial(client.request, method, _resolve_url(url), headers=headers, params=params, timeout=timeout)
+        attempt = 0
+        while True:
+            response = None
+            try:
+                response = await resilience.async_hedged(endpoint, send) if method == 'GET' else await send()
+                retryable = response.status_code in RETRY_STATUSES
+                if response.status_code == 429:
+                    rate_limit.penalize(_retry_after(response))
+            except (httpx.ConnectError, httpx.ReadTimeout):
+                if method != 'GET' or attempt >= config['RETRIES']:
+                    raise
+                retryable = True
+            if not retryable or method != 'GET' or attempt >= config['RETRIES']:
+                break
+            await asyncio.sleep(_retry_delay(response, attempt, config))
+            await rate_limit.async_acquire()
+            attempt += 1
+
+        if conditional and response.status_code == 304:
+            failed = False
+            healthy = True
+            return None, etag
+        response.raise_for_status()
+        healthy = True
+        data = response.json()
+        failed = False
+        return (data, response.headers.get('ETag')) if conditional else data
+
+    except rate_limit.RateLimitTimeout as e:
+        logger.warning(f"TMDB rate limit queue timeout before retrying while {action_description} (URL: {url}): {e}")
+        raise TMDBServiceError(f"TMDB rate limit queue is full while {action_description}.")
+    except httpx.TimeoutException:
+        healthy = False
+        logger.error(f"TMDB Timeout while {action_description} (URL: {url})")
+        raise TMDBServiceError(f"Timeout communicating with TMDB API while {action_description}.")
+    except httpx.HTTPStatusError as http_err:
+        status_code = http_err.response.status_code
+        healthy = status_code < 500
+        logger.error(f"TMDB HTTP error {status_code} while {action_description} (URL: {url}): {http_err}")
+        error_class = TMDBNotFoundError if status_code == 404 else TMDBServiceError
+        raise error_class(f"TMDB API returned HTTP error {status_code} while {action_description}.")
+    except httpx.HTTPError as req_err:
+        healthy = False
         logger.error(f"TMDB Request error while {action_description} (URL: {url}): {req_err}")
         raise TMDBServiceError(f"Network error connecting to TMDB API while {action_description}.")
     except json.JSONDecodeError as json_err:
+        healthy = False
         logger.error(f"TMDB JSON decode error while {action_description} (URL: {url}): {json_err}")
         raise TMDBServiceError(f"Invalid JSON response from TMDB API while {action_description}.")
     except Exception as e:
         logger.exception(f"Unexpected error during TMDB request while {action_description} (URL: {url})")
-        raise TMDBServiceError(f"An unexpected error occurred while {action_description}.")
\ No newline at end of file
+        raise TMDBServiceError(f"An unexpected error occurred while {action_description}.")
+    finally:
+        elapsed = time.perf_counter() - start
+        _record_timing(elapsed, failed, url)
+        _record_health(endpoint, healthy)
+        logger.debug(f"TMDB API async call done in {elapsed * 1000:.1f} ms: {method} {url}")
@@ -0,0 +1,309 @@
+"""
+Préchauffage du cache des paires.
+
+Chaque requête common-movies compte pour la popularité de sa paire (score à
+décroissance exponentielle, demi-vie ``PAIR_WARMING_HALF_LIFE``). Un thread par
+worker, démarré par ``wsgi.py``/``asgi.py`` (et après un fork, pour
+``--preload``), verse toutes les ``PAIR_WARMING_INTERVAL`` secondes les requêtes
+comptées par son processus dans la popularité partagée (cache Django partagé).
+Un seul worker par intervalle, celui qui obtient le verrou partagé ``warming``,
+recalcule ensuite celles des ``PAIR_WARMING_TOP_N`` paires les plus demandées
+dont l'entrée manque ou expire dans moins de ``PAIR_WARMING_LEAD_TIME``
+secondes, au plus ``PAIR_WARMING_MAX_PER_CYCLE`` par passage : le trafic de
+préchauffage ne dépend pas du nombre de workers. Les appels TMDB passent par la
+voie ``batch`` du limiteur : la réserve des requêtes interactives n'est jamais entamée.
+
+Le recalcul est incrémental (``tmdb._compute_pair``) : les fiches films plus
+vieilles que ``PAIR_MOVIE_DETAILS_MAX_AGE`` sont redemandées, et les fiches
+récentes de la paire remises dans le cache des fiches films.
+
+Les paires d'``ActorPair`` reçoivent un score de ``PAIR_WARMING_SEED_SCORE``,
+une fois par demi-vie pour l'ensemble des workers : elles sont préchauffées
+avant toute requête.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import cache_manager, rate_limit, singleflight, tmdb
+from .utils import TMDBServiceError
+
+logger = logging.getLogger(__name__)
+
+# Popularité partagée par les workers, et verrous (singleflight.acquire_shared_lock) qui la protègent.
+POPULARITY_CACHE_KEY = 'warming_popularity'
+POPULARITY_LOCK = 'warming_popularity'
+WARMING_LOCK = 'warming'
+SEEDED_CACHE_KEY = 'warming_seeded'
+
+
+class PairPopularity:
+    """Scores de popularité par paire, à décroissance exponentielle ; au plus ``max_pairs`` paires suivies."""
+
+    def __init__(self, half_life, max_pairs):
+        self.half_life = half_life
+        self.max_pairs = max_pairs
+        # Clé de cache de la paire -> [score, instant du score, ID 1, nom 1, ID 2, nom 2]
+        self._pairs = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score, updated_at, now):
+        if not self.half_life:
+            return score
+        return score * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def record(self, actor1_id, actor1_name, actor2_id, actor2_name, weight=1.0, now=None):
+        key = cache_manager._get_cache_key(actor1_id, actor2_id)
+        if not key:
+            return
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._pairs.get(key)
+            score = self._decayed(entry[0], entry[1], now) if entry else 0.0
+            self._pairs[key] = [score + weight, now, actor1_id, actor1_name, actor2_id, actor2_name]
+            if len(self._pairs) > self.max_pairs:
+                self._prune(now)
+
+    def _prune(self, now):
+        # On garde la moitié la plus populaire, pour que l'élagage reste rare.
+        ranked = heapq.nlargest(
+            self.max_pairs // 2, self._pairs.items(), key=lambda item: self._decayed(item[1][0], item[1][1], now)
+        )
+        self._pairs = dict(ranked)
+
+    def top(self, n, now=None):
+        """``[(score, ID 1, nom 1, ID 2, nom 2)]`` des ``n`` paires les plus demandées, par score décroissant."""
+        now = time.time() if now is None else now
+        with self._lock:
+            scored = [
+                (self._decayed(score, updated_at, now), actor1_id, actor1_name, actor2_id, actor2_name)
+                for score, updated_at, actor1_id, actor1_name, actor2_id, actor2_name in self._pairs.values()
+            ]
+        return heapq.nlargest(n, scored, key=lambda item: item[0])
+
+    def merge(self, pairs, now=None):
+        """Ajoute aux scores suivis des entrées d'``entries``, par exemple celles d'un autre processus."""
+        now = time.time() if now is None else now
+        with self._lock:
+            for key, (score, updated_at, *actors) in pairs.items():
+                entry = self._pairs.get(key)
+                total = self._decayed(score, updated_at, now) + (self._decayed(entry[0], entry[1], now) if entry else 0.0)
+                self._pairs[key] = [total, now, *actors]
+            if len(self._pairs) > self.max_pairs:
+                self._prune(now)
+
+    def entries(self):
+        """Copie des entrées suivies, au format accepté par ``merge``."""
+        with self._lock:
+            return {key: list(entry) for key, entry in self._pairs.items()}
+
+    def drain(self):
+        """Comme ``entries``, mais vide le suivi."""
+        with self._lock:
+            pairs, self._pairs = self._pairs, {}
+        return pairs
+
+    def clear(self):
+        with self._lock:
+            self._pairs.clear()
+
+    def __len__(self):
+        return len(self._pairs)
+
+
+_popularity = None
+_popularity_lock = threading.Lock()
+_warmer_pid = None
+
+
+def _new_popularity():
+    return PairPopularity(
+        getattr(settings, 'PAIR_WARMING_HALF_LIFE', 60 * 60 * 6),
+        getattr(settings, 'PAIR_WARMING_TRACKED_MAX', 10_000),
+    )
+
+
+def get_popularity():
+    """Requêtes comptées par ce processus, pas encore versées dans la popularité partagée."""
+    global _popularity
+    if _popularity is None:
+        with _popularity_lock:
+            if _popularity is None:
+                _popularity = _new_popularity()
+    return _popularity
+
+
+def get_shared_popularity():
+    """Popularité de tous les workers, telle que publiée dans le cache partagé."""
+    popularity = _new_popularity()
+    popularity.merge(cache.get(POPULARITY_CACHE_KEY) or {})
+    return popularity
+
+
+def publish_popularity(now=None):
+    """Verse les requêtes comptées par ce processus dans la popularité partagée ; False si le verrou est pris."""
+    if not singleflight.acquire_shared_lock(POPULARITY_LOCK):
+        return False
+    try:
+        shared = get_shared_popularity()
+        shared.merge(get_popularity().drain(), now=now)
+        cache.set(POPULARITY_CACHE_KEY, shared.entries(), timeout=None)
+    finally:
+        singleflight.release_shared_lock(POPULARITY_LOCK)
+    return True
+
+
+def reset_popularity():
+    global _popularity
+    with _popularity_lock:
+        _popularity = None
+
+
+def record_request(actor1_name, actor2_name, actor1_info, actor2_info):
+    """Compte une requête pour la paire (appelé par ``get_common_movies_payload`` une fois les acteurs résolus)."""
+    if getattr(settings, 'PAIR_WARMING_ENABLED', True):
+        get_popularity().record(actor1_info['id'], actor1_name, actor2_info['id'], actor2_name)
+
+
+def seed_from_actor_pairs():
+    """Compte les paires d'``ActorPair`` dans la popularité de ce processus ; renvoie leur nombre."""
+    from api.models import ActorPair
+
+    try:
+        rows = list(ActorPair.objects.values_list('actor1_id', 'actor1_name', 'actor2_id', 'actor2_name'))
+    except Exception as e:
+        logger.warning(f"Impossible d'initialiser le préchauffage depuis ActorPair: {e}")
+        return 0
+
+    popularity = get_popularity()
+    weight = getattr(settings, 'PAIR_WARMING_SEED_SCORE', 1.0)
+    for actor1_id, actor1_name, actor2_id, actor2_name in rows:
+        popularity.record(actor1_id, actor1_name, actor2_id, actor2_name, weight=weight)
+    logger.info(f"Préchauffage initialisé avec {len(rows)} paire(s) d'ActorPair")
+    return len(rows)
+
+
+def _seed_movie_details(payload):
+    """Remet dans le cache des fiches films celles de la paire récupérées depuis moins de leur durée de cache."""
+    now = time.time()
+    movie_deps = (payload.get('deps') or {}).get('movies', {})
+    keys = {f"internal_movie_{movie['id']}_details": movie for movie in payload.get('results', [])}
+    missing = set(keys) - set(cache.get_many(list(keys)))
+    for key in missing:
+        movie = keys[key]
+        dep = movie_deps.get(str(movie['id']))
+        remaining = tmdb.MOVIE_DETAILS_CACHE_TTL - (now - dep[1]) if dep else 0
+        if remaining > 0:
+            details = {field: value for field, value in movie.items() if field != 'characters'}
+            cache.set(key, details, timeout=int(remaining))
+
+
+def warm_pair(actor1_name, actor2_name):
+    """Recalcule la paire et l'enregistre dans le cache des paires ; False si un acteur est introuvable."""
+    actor1_info = tmdb.get_actor_info(actor1_name)
+    actor2_info = tmdb.get_actor_info(actor2_name)
+    if not actor1_info or not actor2_info:
+        return False
+
+    cache_key = cache_manager._get_cache_key(actor1_info['id'], actor2_info['id'])
+    # Même clé que les requêtes : une requête concurrente attend ce calcul au lieu d'en lancer un second.
+    payload = tmdb._pair_flight.do(
+        cache_key, tmdb._compute_pair_shared, cache_key, actor1_name, actor2_name, actor1_info, actor2_info
+    )
+    _seed_movie_details(payload)
+    return True
+
+
+def warm_once(limit=None, top_n=None, now=None, popularity=None):
+    """
+    Un passage de préchauffage : parmi les ``top_n`` paires les plus demandées
+    (``PAIR_WARMING_TOP_N``) de ``popularity`` (par défaut celle du processus),
+    recalcule par popularité décroissante celles absentes du cache ou proches
+    de l'expiration, au plus ``limit`` (``PAIR_WARMING_MAX_PER_CYCLE``).
+    Renvoie le nombre de paires recalculées.
+    """
+    now = time.time() if now is None else now
+    limit = getattr(settings, 'PAIR_WARMING_MAX_PER_CYCLE', 10) if limit is None else limit
+    top_n = getattr(settings, 'PAIR_WARMING_TOP_N', 50) if top_n is None else top_n
+    refresh_after = cache_manager.CACHE_DURATION.total_seconds() - getattr(settings, 'PAIR_WARMING_LEAD_TIME', 60 * 60)
+    candidates = (get_popularity() if popularity is None else popularity).top(top_n, now=now)
+
+    warmed = 0
+    with rate_limit.lane(rate_limit.BATCH):
+        for _, actor1_id, actor1_name, actor2_id, actor2_name in candidates:
+            if warmed >= limit:
+                break
+            stored_at = cache_manager.get_stored_at(actor1_id, actor2_id)
+            if stored_at is not None and now - stored_at < refresh_after:
+                continue
+            try:
+                if warm_pair(actor1_name, actor2_name):
+                    warmed += 1
+            except (TMDBServiceError, rate_limit.RateLimitTimeout) as e:
+                # TMDB indisponible ou budget épuisé : on réessaiera au prochain passage.
+                logger.warning(f"Préchauffage interrompu sur la paire {actor1_name} / {actor2_name}: {e}")
+                break
+
+    if warmed:
+        logger.info(f"Préchauffage: {warmed} paire(s) recalculée(s)")
+    return warmed
+
+
+def run_cycle(interval, now=None):
+    """
+    Passage du thread de préchauffage d'un worker : publie sa popularité, puis
+    préchauffe depuis la popularité partagée s'il obtient le verrou de
+    l'intervalle. Renvoie le nombre de paires recalculées.
+    """
+    # ActorPair compté une fois par demi-vie pour tous les workers, et non à chaque démarrage de worker.
+    if cache.add(SEEDED_CACHE_KEY, os.getpid(), timeout=getattr(settings, 'PAIR_WARMING_HALF_LIFE', 60 * 60 * 6) or None):
+        seed_from_actor_pairs()
+    publish_popularity(now=now)
+    # Verrou jamais relâché : il expire à la fin de l'intervalle, un seul worker préchauffe d'ici là.
+    if not singleflight.acquire_shared_lock(WARMING_LOCK, timeout=interval):
+        return 0
+    return warm_once(now=now, popularity=get_shared_popularity())
+
+
+def _warm_loop(interval):
+    while True:
+        try:
+            run_cycle(interval)
+        except Exception:
+            logger.exception("Erreur pendant le préchauffage du cache des paires")
+        finally:
+            connections.close_all()
+        time.sleep(interval)
+
+
+def start():
+    """Démarre le thread de préchauffage du processus (une fois par PID ; sans effet si désactivé)."""
+    global _warmer_pid
+    interval = getattr(settings, 'PAIR_WARMING_INTERVAL', 300)
+    if not getattr(settings, 'PAIR_WARMING_ENABLED', True) or not interval:
+        return
+    with _popularity_lock:
+        if _warmer_pid == os.getpid():
+            return
+        _warmer_pid = os.getpid()
+    thread = threading.Thread(target=_warm_loop, args=(interval,), name='pair-cache-warmer', daemon=True)
+    thread.start()
+
+
+def _restart_after_fork():
+    global _popularity, _popularity_lock
+    _popularity_lock = threading.Lock()
+    _popularity = None
+    # Workers forkés par gunicorn --preload : le thread du maître ne voit pas leurs requêtes.
+    if _warmer_pid is not None:
+        start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)